@@ -0,0 +1,29 @@
+from core.models import Activity, TimelineEntry
+
+
+# Activities in a page of the feed.
+PAGE_SIZE = 20
+
+
+def timeline(user, before=None, size=PAGE_SIZE):
+    """
+    Activities of the users followed by `user`, newest first, with ids
+    lower than `before`, and whether there are more.
+
+    The feed is the merge of two ordered id lists: the timeline entries
+    fanned out to `user` on write, and the activities of followed users
+    with too many followers, pulled on read through their partial index.
+    Each list reads at most `size` + 1 ids, so a page is three queries
+    whatever the number of followings.
+    """
+    entries = TimelineEntry.objects.filter(owner=user)
+    pulled = Activity.objects.filter(fanned_out=False, user__following__user=user)
+    if before is not None:
+        entries = entries.filter(activity__lt=before)
+        pulled = pulled.filter(pk__lt=before)
+    ids = set(entries.order_by('-activity').values_list('activity', flat=True)[:size + 1])
+    ids.update(pulled.order_by('-pk').values_list('pk', flat=True)[:size + 1])
+    ids = sorted(ids, reverse=True)
+    activities = Activity.objects.filter(pk__in=ids[:size]) \
+        .select_related('user__userprofile', 'book', 'review').order_by('-pk')
+    return list(activities), len(ids) > size
@@ -6,5 +6,5 @@ def is_following(user, profile):
     Check if a user is following a profile
     """
     if user.is_authenticated:
-        return user.userprofile.following.filter(id=profile.id).exists()
+        return UserProfile.following.through.objects.filter(userprofile__user=user, user=profile).exists()
     return False
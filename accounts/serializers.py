@@ -1,80 +1,65 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.db import models
+from django.db.models import Count, prefetch_related_objects
 
-from core.models import UserProfile, BookList
+from core.models import UserProfile, BookList, BookInteraction, Activity
 from book.serializers import BookSerializer, MinBookSerializer
 from booklist.serializers import BookListSerializer
-from accounts.functions import is_following
 
 
 class ProfileSerializer(serializers.ModelSerializer):
     """
     Serializer for UserProfile model
+    The profile card, the same for every viewer so views can cache it
+    (see ProfileView). Numbers are the counters of the profile.
     """
     username = serializers.CharField(source='user.username')
-    is_following = serializers.SerializerMethodField()
-    def get_is_following(self, obj):
-        user = self.context['request'].user
-        if user.is_authenticated:
-            return is_following(user, obj.user)
-        else:
-            return False
-
-    number_of_favorits = serializers.SerializerMethodField()
-    def get_number_of_favorits(self, obj):
-        return obj.favorite_books.count()
-    
-    number_of_likes = serializers.SerializerMethodField()
-    def get_number_of_likes(self, obj):
-        return obj.liked_books.count()
-    
-    number_of_reads = serializers.SerializerMethodField()
-    def get_number_of_reads(self, obj):
-        return obj.readed_books.count()
-
-    number_of_followings = serializers.SerializerMethodField()
-    def get_number_of_followings(self, obj):
-        return obj.following.count()
-    
-    number_of_read_later_books = serializers.SerializerMethodField()
-    def get_number_of_read_later_books(self, obj):
-        return obj.read_later_books.count()
+    number_of_favorits = serializers.IntegerField(source='favorites_count')
+    number_of_likes = serializers.IntegerField(source='likes_count')
+    number_of_reads = serializers.IntegerField(source='reads_count')
+    number_of_followings = serializers.IntegerField(source='followings_count')
+    number_of_followers = serializers.IntegerField(source='followers_count')
+    number_of_read_later_books = serializers.IntegerField(source='read_later_count')
+    number_of_lists = serializers.IntegerField(source='lists_count')
+
+    def last_books(self, obj, flag, date, count=2):
+        books = obj.shelf(flag).order_by(f'-interactions__{date}', '-pk')[:count]
+        return MinBookSerializer(books, many=True).data
 
     last_books_readed = serializers.SerializerMethodField()
     def get_last_books_readed(self, obj):
-        books = obj.readed_books.all()[:2]
-        return MinBookSerializer(books, many=True).data
+        return self.last_books(obj, 'is_read', 'date_readed')
 
     last_books_liked = serializers.SerializerMethodField()
     def get_last_books_liked(self, obj):
-        books = obj.liked_books.all()[:2]
-        return MinBookSerializer(books, many=True).data
+        return self.last_books(obj, 'is_liked', 'date_liked')
     
     favorit_books = serializers.SerializerMethodField()
     def get_favorit_books(self, obj):
-        books = obj.favorite_books.all()
-        return MinBookSerializer(books, many=True).data
+        return self.last_books(obj, 'is_favorite', 'date_favorite', count=None)
 
     last_created_lists = serializers.SerializerMethodField()
     def get_last_created_lists(self, obj):
-        created_lists = BookList.objects.filter(user=obj.user)[:2]
-        # remove empty lists from created_lists
-        created_lists = [x for x in created_lists if x.books.count() > 0]
+        # Non-empty lists only, counted in the same query.
+        created_lists = BookList.objects.filter(user=obj.user).annotate(
+            number_of_books=Count('books'),
+        ).filter(number_of_books__gt=0)[:2]
         return BookListSerializer(created_lists, many=True).data
 
     last_read_later_books = serializers.SerializerMethodField()
     def get_last_read_later_books(self, obj):
-        books = obj.read_later_books.all()[:2]
-        return MinBookSerializer(books, many=True).data
+        return self.last_books(obj, 'is_read_later', 'date_read_later')
 
 
     class Meta:
         model = UserProfile
         fields = (
             'id', 'username', 'name', 'birth_date', 'avatar', 'social_media_link',
-            'is_following', 'is_invited', 'bio',
-            'number_of_favorits', 'number_of_likes', 'number_of_reads', 'number_of_followings', 'number_of_read_later_books',
+            'is_invited', 'bio',
+            'number_of_favorits', 'number_of_likes', 'number_of_reads', 'number_of_followings', 'number_of_followers',
+            'number_of_read_later_books', 'number_of_lists',
             'last_books_readed', 'last_books_liked', 'favorit_books', 'last_created_lists', 'last_read_later_books'
         )
         read_only_fields = ('id', 'username',)
@@ -97,6 +82,9 @@ class UserForBookSerializer(serializers.ModelSerializer):
     def get_rate_to_book(self, obj):
         user = obj
         book = self.context['book']
+        if hasattr(user, 'rate_to_book'):
+            # Annotated by UserProfile.following_readers()
+            return user.rate_to_book if user.rate_to_book is not None else 0
         if user.is_authenticated:
             return user.userprofile.rate_of_book(book)
         else:
@@ -111,6 +99,26 @@ class UserForBookSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'username',)
 
 
+class MiniProfileListSerializer(serializers.ListSerializer):
+    """
+    Renders a page of users with a fixed number of queries: profiles are
+    prefetched and the read books of all users are counted at once,
+    unless the queryset already annotated `readed_count`.
+    """
+    def to_representation(self, data):
+        users = list(data.all() if isinstance(data, models.Manager) else data)
+        prefetch_related_objects([user for user in users if 'userprofile' not in user._state.fields_cache], 'userprofile')
+        missing = [user for user in users if not hasattr(user, 'readed_count')]
+        if missing:
+            counts = dict(
+                BookInteraction.objects.filter(user__in=missing, is_read=True)
+                .values_list('user').annotate(count=Count('pk')).order_by()
+            )
+            for user in missing:
+                user.readed_count = counts.get(user.pk, 0)
+        return super().to_representation(users)
+
+
 class MiniProfileSerializer(serializers.ModelSerializer):
     """
     Serializer for UserProfile model
@@ -118,8 +126,9 @@ class MiniProfileSerializer(serializers.ModelSerializer):
     username = serializers.CharField()
     readed_books = serializers.SerializerMethodField()
     def get_readed_books(self, obj):
-        print(obj.userprofile.readed_books.all().count())
-        return obj.userprofile.readed_books.all().count()
+        if hasattr(obj, 'readed_count'):
+            return obj.readed_count
+        return obj.userprofile.readed_books.count()
 
     avatar = serializers.SerializerMethodField()
     def get_avatar(self, obj):
@@ -133,4 +142,38 @@ class MiniProfileSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'username', 'avatar', 'readed_books',
         )
-        read_only_fields = ('id', 'username',)
\ No newline at end of file
+        read_only_fields = ('id', 'username',)
+        list_serializer_class = MiniProfileListSerializer
+
+
+class ActivitySerializer(serializers.ModelSerializer):
+    """
+    Serializer for Activity model
+    At the feed, renders from the user, profile, book and review loaded with it
+    """
+    username = serializers.CharField(source='user.username')
+    name = serializers.SerializerMethodField()
+    def get_name(self, obj):
+        profile = getattr(obj.user, 'userprofile', None)
+        return profile.name if profile else None
+
+    avatar = serializers.SerializerMethodField()
+    def get_avatar(self, obj):
+        try:
+            return settings.BASE_URL + obj.user.userprofile.avatar.url
+        except:
+            return 'https://api.nebigapp.com/media/defaults/avatar.png'
+
+    book = serializers.SerializerMethodField()
+    def get_book(self, obj):
+        book = obj.book
+        cover = book.cover.url if book.cover else '/media/covers/default.png'
+        return {'id': book.id, 'title': book.title, 'slug': book.slug, 'cover': settings.BASE_URL + cover}
+
+    review = serializers.CharField(source='review.text', default=None)
+
+    class Meta:
+        model = Activity
+        fields = (
+            'id', 'verb', 'username', 'name', 'avatar', 'book', 'rate', 'review', 'date_created',
+        )
@@ -0,0 +1,40 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from core.models import UserProfile, UserSearchTerm, BookList
+
+
+@receiver(post_save, sender=User)
+def index_saved_user(sender, instance, update_fields, **kwargs):
+    # Logins save last_login only.
+    if update_fields is None or 'username' in update_fields:
+        UserSearchTerm.index([instance])
+
+
+@receiver(post_save, sender=UserProfile)
+def index_saved_profile(sender, instance, update_fields, **kwargs):
+    if update_fields is None or 'name' in update_fields:
+        instance.user.userprofile = instance
+        UserSearchTerm.index([instance.user])
+
+
+@receiver(post_save, sender=BookList)
+def count_created_list(sender, instance, created, **kwargs):
+    if created:
+        UserProfile.change_counters(instance.user_id, lists_count=1)
+    else:
+        cache.delete(UserProfile.card_key(instance.user_id))
+
+
+@receiver(post_delete, sender=BookList)
+def count_deleted_list(sender, instance, **kwargs):
+    UserProfile.change_counters(instance.user_id, lists_count=-1)
+
+
+@receiver(m2m_changed, sender=BookList.books.through)
+def expire_list_owner_card(sender, instance, action, reverse, **kwargs):
+    # Profile cards show the last non-empty lists of their user.
+    if action.startswith('post_') and not reverse:
+        cache.delete(UserProfile.card_key(instance.user_id))
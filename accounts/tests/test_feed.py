@@ -0,0 +1,90 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import UserProfile, Book, Review, Activity, TimelineEntry
+from accounts import feed
+
+
+@override_settings(FEED_FANOUT_LIMIT=2)
+class FeedTest(TestCase):
+    """Test the activity feed"""
+
+    def profile(self, username):
+        return UserProfile.objects.create(user=User.objects.create(username=username))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.me = self.profile('me')
+        self.friend = self.profile('friend')
+        self.star = self.profile('star')
+        self.stranger = self.profile('stranger')
+        self.me.follow(self.friend)
+        for profile in (self.me, self.profile('fan1'), self.profile('fan2')):
+            profile.follow(self.star)
+        self.books = [Book.objects.create(title=f'Book {i}') for i in range(5)]
+        self.client.force_authenticate(self.me.user)
+
+    def feed(self, **params):
+        response = self.client.get(reverse('feed'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def items(self, **params):
+        return [(row['username'], row['verb'], row['book']['title']) for row in self.feed(**params)['results']]
+
+    def test_fan_out_on_write_and_read(self):
+        """Test normal users are fanned out on write, followed stars are pulled on read"""
+        self.friend.read_book(self.books[0])
+        self.star.rate_book(self.books[1], 4)
+        self.stranger.read_book(self.books[2])
+        self.assertEqual(self.items(), [
+            ('star', 'rate', 'Book 1'), ('star', 'read', 'Book 1'), ('friend', 'read', 'Book 0'),
+        ])
+        self.assertEqual(self.feed()['results'][0]['rate'], 4)
+        self.assertFalse(Activity.objects.filter(user=self.star.user).first().fanned_out)
+        self.assertEqual(TimelineEntry.objects.filter(activity__user=self.star.user).count(), 0)
+
+    def test_undo(self):
+        """Test undone actions and unfollowed users leave the feed"""
+        self.friend.like_book(self.books[0])
+        self.friend.rate_book(self.books[1], 2)
+        self.friend.rate_book(self.books[1], 5)
+        self.friend.unlike_book(self.books[0])
+        self.assertEqual(self.items(), [
+            ('friend', 'rate', 'Book 1'), ('friend', 'read', 'Book 1'), ('friend', 'read', 'Book 0'),
+        ])
+        self.friend.unread_book(self.books[0])
+        self.assertEqual(len(self.items()), 2)
+        self.me.unfollow(self.friend)
+        self.assertEqual(self.items(), [])
+        self.me.follow(self.friend)
+        self.assertEqual(len(self.items()), 2)
+
+    def test_reviews_after_approval(self):
+        """Test reviews reach the feed once active"""
+        self.friend.add_review(self.books[0], 'Great')
+        self.assertEqual(self.items(), [])
+        review = Review.objects.get()
+        review.is_active = True
+        review.save()
+        self.assertEqual(self.feed()['results'][0]['review'], 'Great')
+        review.is_active = False
+        review.save()
+        self.assertEqual(self.items(), [])
+
+    def test_cursor_pages(self):
+        """Test pages follow the cursor in constant queries"""
+        self.friend.read_books(self.books[:3])
+        self.star.read_books(self.books[3:])
+        with self.assertNumQueries(3):
+            activities, more = feed.timeline(self.me.user, size=2)
+        self.assertTrue(more)
+        self.assertEqual([activity.book.title for activity in activities], ['Book 4', 'Book 3'])
+        data = self.feed()
+        self.assertIsNone(data['next'])
+        self.assertEqual(len(data['results']), 5)
+        before = data['results'][1]['id']
+        self.assertEqual(len(self.feed(before=before)['results']), 3)
+        self.assertEqual(self.client.get(reverse('feed'), {'before': 'x'}).status_code, 400)
@@ -0,0 +1,94 @@
+from importlib import import_module
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import UserProfile, Book, BookList
+
+COUNTERS = (
+    'reads_count', 'likes_count', 'favorites_count', 'read_later_count',
+    'followings_count', 'followers_count', 'lists_count',
+)
+
+
+class ProfileCardTest(TestCase):
+    """Test the cached profile card and its counters"""
+
+    def profile(self, username):
+        return UserProfile.objects.create(user=User.objects.create(username=username))
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.reader = self.profile('reader')
+        self.viewer = self.profile('viewer')
+        self.books = [Book.objects.create(title=f'Book {i}') for i in range(4)]
+        self.reader.like_book(self.books[0])
+        self.reader.add_favorite_book(self.books[1])
+        self.reader.read_books(self.books[2:])
+        self.reader.add_read_later_book(self.books[3])
+        self.viewer.follow(self.reader)
+        book_list = BookList.objects.create(user=self.reader.user, name='List')
+        book_list.books.add(self.books[0])
+        BookList.objects.create(user=self.reader.user, name='Empty')
+        self.client.force_authenticate(self.viewer.user)
+
+    def counters(self, profile):
+        profile.refresh_from_db()
+        return {field: getattr(profile, field) for field in COUNTERS}
+
+    def card(self):
+        response = self.client.get(reverse('profile', kwargs={'username': 'reader'}))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_counters(self):
+        """Test the actions keep the counters equal to a rebuild"""
+        self.reader.unread_book(self.books[2])
+        self.viewer.unfollow(self.reader)
+        self.reader.follow(self.viewer)
+        BookList.objects.get(name='Empty').delete()
+        counters = {profile.pk: self.counters(profile) for profile in (self.reader, self.viewer)}
+        self.assertEqual(counters[self.reader.pk], {
+            'reads_count': 3, 'likes_count': 1, 'favorites_count': 1, 'read_later_count': 1,
+            'followings_count': 1, 'followers_count': 0, 'lists_count': 1,
+        })
+        UserProfile.objects.update(**{field: 0 for field in COUNTERS})
+        UserProfile.rebuild_counters()
+        self.assertEqual({profile.pk: self.counters(profile) for profile in (self.reader, self.viewer)}, counters)
+
+    def test_migration_fills_counters(self):
+        """Test the migration adding the counters computes them for existing profiles"""
+        counters = {profile.pk: self.counters(profile) for profile in (self.reader, self.viewer)}
+        UserProfile.objects.update(**{field: 0 for field in COUNTERS})
+        migration = import_module('core.migrations.0043_userprofile_counters')
+        apps = MigrationLoader(connection).project_state(('core', '0043_userprofile_counters')).apps
+        migration.fill_counters(apps, None)
+        self.assertEqual({profile.pk: self.counters(profile) for profile in (self.reader, self.viewer)}, counters)
+
+    def test_cached_card(self):
+        """Test a cached card costs two queries and actions expire it"""
+        card = self.card()
+        self.assertEqual(card['number_of_reads'], 4)
+        self.assertEqual(card['number_of_followers'], 1)
+        self.assertEqual([book_list['name'] for book_list in card['last_created_lists']], ['List'])
+        self.assertTrue(card['is_following'])
+        with self.assertNumQueries(2):
+            self.assertEqual(self.card(), card)
+        self.reader.like_book(self.books[1])
+        self.assertEqual(self.card()['number_of_likes'], 2)
+        self.assertEqual(self.card()['last_books_liked'][0]['title'], 'Book 1')
+        self.viewer.unfollow(self.reader)
+        card = self.card()
+        self.assertFalse(card['is_following'])
+        self.assertEqual(card['number_of_followers'], 0)
+        BookList.objects.get(name='Empty').books.add(self.books[2])
+        self.assertEqual(len(self.card()['last_created_lists']), 2)
+        self.reader.name = 'Reader'
+        self.reader.save()
+        self.assertEqual(self.card()['name'], 'Reader')
@@ -0,0 +1,49 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import UserProfile, Book
+
+
+class ProfileShelfTest(TestCase):
+    """Test the books of the profile shelves"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.profile = UserProfile.objects.create(user=User.objects.create(username='reader'))
+        self.client.force_authenticate(self.profile.user)
+        self.books = [Book.objects.create(title=f'Book {i}') for i in range(5)]
+        for book in (self.books[3], self.books[0], self.books[4], self.books[1]):
+            self.profile.read_book(book)
+        self.profile.like_book(self.books[2])
+
+    def shelf(self, name, **params):
+        return self.client.get(reverse('profile-books-read-later', kwargs={'username': 'reader', 'list': name}), params)
+
+    def test_pages_by_date_added(self):
+        """Test shelves are paginated newest added first"""
+        response = self.shelf('reads', page_size=2)
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual([book['title'] for book in response.data['results']], ['Book 2', 'Book 1'])
+        response = self.shelf('reads', page_size=2, page=3)
+        self.assertEqual([book['title'] for book in response.data['results']], ['Book 3'])
+        response = self.shelf('liked', cursor='')
+        self.assertEqual([book['title'] for book in response.data['results']], ['Book 2'])
+        self.assertEqual(self.shelf('favorites').status_code, 404)
+        self.assertEqual(self.shelf('unknown').status_code, 404)
+
+    def test_count(self):
+        """Test the count of a shelf follows the actions changing it"""
+        self.assertEqual(self.shelf('reads').data['count'], 5)
+        self.profile.add_read_later_book(self.books[0])
+        with self.assertNumQueries(4):
+            self.assertEqual(self.shelf('reads').data['count'], 5)
+        self.profile.unread_book(self.books[0])
+        self.assertEqual(self.shelf('reads').data['count'], 4)
+        self.profile.rate_book(Book.objects.create(title='Rated'), 4)
+        self.assertEqual(self.shelf('reads').data['count'], 5)
+        self.profile.read_books(self.books)
+        self.assertEqual(self.shelf('reads').data['count'], 6)
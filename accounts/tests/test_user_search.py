@@ -0,0 +1,93 @@
+from importlib import import_module
+
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import TestCase
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+
+from core.models import UserProfile, Book, UserSearchTerm
+
+
+class UserSearchTest(TestCase):
+    """Test the user search API"""
+
+    url = '/accounts/'
+
+    def profile(self, username, name=''):
+        return UserProfile.objects.create(user=User.objects.create(username=username), name=name)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.me = self.profile('me')
+        self.ali = self.profile('ali_rezaei', 'علی رضایی')
+        self.alireza = self.profile('alireza', 'عليرضا')
+        self.popular = self.profile('ali_popular')
+        for i in range(3):
+            self.profile(f'fan{i}').follow(self.popular)
+        self.profile('bookworm').follow(self.ali)
+        self.me.follow(self.profile('friend'))
+        User.objects.get(username='friend').userprofile.follow(self.alireza)
+
+    def usernames(self, query):
+        response = self.client.get(self.url, {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [row['username'] for row in response.data['results']]
+
+    def test_matches_words_and_parts(self):
+        """Test users are found by any word start of name and any part of username"""
+        self.assertEqual(self.usernames('رضایی'), ['ali_rezaei'])
+        self.assertEqual(self.usernames('علیرض'), ['alireza'])
+        self.assertEqual(self.usernames('reza'), ['ali_rezaei', 'alireza'])
+        self.assertEqual(self.usernames('علی رضای'), ['ali_rezaei'])
+        self.assertEqual(self.usernames('nobody'), [])
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+
+    def test_ranking(self):
+        """Test exact usernames, then mutual follows, then followers rank first"""
+        self.assertEqual(self.usernames('ali'), ['ali_popular', 'ali_rezaei', 'alireza'])
+        self.client.force_authenticate(self.me.user)
+        self.assertEqual(self.usernames('ali'), ['alireza', 'ali_popular', 'ali_rezaei'])
+        self.assertEqual(self.usernames('ali_rezaei'), ['ali_rezaei'])
+        self.assertEqual(self.usernames('alireza')[0], 'alireza')
+
+    def test_ranked_before_limit(self):
+        """Test the best matches are kept when a prefix matches more users than are ranked"""
+        for i in range(10):
+            self.profile(f'ali{i}')
+        self.assertEqual(UserSearchTerm.search('ali', 2), [self.popular.user_id, self.ali.user_id])
+        self.assertEqual(UserSearchTerm.search('ali', 1, self.me.user), [self.alireza.user_id])
+        exact = self.profile('Ali')
+        self.assertEqual(UserSearchTerm.search('ali', 1, self.me.user), [exact.user_id])
+
+    def test_renamed_profile(self):
+        """Test the index follows username and name changes"""
+        self.ali.name = 'حسین'
+        self.ali.save()
+        self.assertEqual(self.usernames('رضایی'), [])
+        self.assertEqual(self.usernames('حسین'), ['ali_rezaei'])
+        UserSearchTerm.objects.all().delete()
+        UserSearchTerm.rebuild()
+        self.assertEqual(self.usernames('حسین'), ['ali_rezaei'])
+
+    def test_migration_indexes_users(self):
+        """Test the migration creating the index fills it for existing users"""
+        UserSearchTerm.objects.all().delete()
+        migration = import_module('core.migrations.0039_usersearchterm')
+        migration.index_users(MigrationLoader(connection).project_state(('core', '0039_usersearchterm')).apps, None)
+        self.assertEqual(self.usernames('رضایی'), ['ali_rezaei'])
+        self.assertEqual(self.usernames('reza'), ['ali_rezaei', 'alireza'])
+
+    def test_constant_queries(self):
+        """Test a search page renders with the same queries for any number of users"""
+        book = Book.objects.create(title='Book')
+        self.ali.read_book(book)
+        response = self.client.get(self.url, {'search': 'ali'})
+        self.assertEqual({row['username']: row['readed_books'] for row in response.data['results']}['ali_rezaei'], 1)
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {'search': 'ali'})
+        for i in range(10):
+            self.profile(f'ali{i}')
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'search': 'ali'})
+        self.assertEqual(response.data['count'], 13)
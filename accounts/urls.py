@@ -1,6 +1,6 @@
 from django.urls import path
 
-from accounts.views import ProfileView, ProfileBookListView, BookListViewSet, ProfileFollowingsView, SearchViewSet
+from accounts.views import ProfileView, ProfileBookListView, BookListViewSet, ProfileFollowingsView, SearchViewSet, FeedView
 
 
 urlpatterns = [
@@ -8,6 +8,8 @@ urlpatterns = [
     path('profile/<str:username>/books/<str:list>/', ProfileBookListView.as_view(), name='profile-books-read-later'),
     path('profile/<str:username>/followings/', ProfileFollowingsView.as_view({'get': 'list'}), name='profile-followings'),
     path('profile/<str:username>/lists/', BookListViewSet.as_view({'get': 'list'}), name='profile-books-read-later-page'),
+    # Activities of the followed users
+    path('feed/', FeedView.as_view(), name='feed'),
     # Search username
     path('', SearchViewSet.as_view(), name='search'),
     # Follow and Unfollow
@@ -8,28 +8,43 @@ from rest_framework import status, viewsets
 from rest_framework import filters
 from django.utils.translation import gettext as _
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, Q, F
+from django.urls import reverse
+from urllib.parse import urlencode
 
-from core.models import UserProfile, BookList
+from core.models import UserProfile, BookList, UserSearchTerm
 from book.serializers import MinBookSerializer
 from book.paginations import SmallPagesPagination
+from book.viewer import ViewerContext
 from booklist.serializers import BookListSerializer
-from accounts.serializers import ProfileSerializer, MiniProfileSerializer
+from accounts.serializers import ProfileSerializer, MiniProfileSerializer, ActivitySerializer
+from accounts.feed import timeline
+from accounts.functions import is_following
 from book import permissions as book_permissions
 from utils.functions import report
 
 
 class ProfileView(generics.RetrieveAPIView):
+    """
+    The profile card of a user. The card is cached until the profile
+    changes (see UserProfile.change_counters), only whether the viewer
+    follows the user is read on every request.
+    """
     serializer_class = ProfileSerializer
     permission_classes = (IsAuthenticated,)
     authentication_classes = (TokenAuthentication,)
 
     def get_object(self, username):
-        try:
-            user = User.objects.get(username=username)
-            profile = UserProfile.objects.get(user=user)
-            return profile
-        except User.DoesNotExist:
-            return None
+        return UserProfile.objects.select_related('user').filter(user__username=username).first()
+
+    def card(self, profile):
+        key = UserProfile.card_key(profile.user_id)
+        data = cache.get(key)
+        if data is None:
+            data = dict(self.serializer_class(profile, context={'request': self.request}).data)
+            cache.set(key, data, UserProfile.CARD_TIMEOUT)
+        return data
     
     def get(self, request, username=None):
         if username is None:
@@ -37,8 +52,9 @@ class ProfileView(generics.RetrieveAPIView):
 
         profile = self.get_object(username)
         if profile:
-            serializer = self.serializer_class(profile, context={'request': self.request})
-            return Response(serializer.data)
+            data = self.card(profile)
+            data['is_following'] = is_following(request.user, profile.user)
+            return Response(data)
         else:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
@@ -67,43 +83,46 @@ class ProfileView(generics.RetrieveAPIView):
 
 
 class ProfileBookListView(APIView):
+    """
+    Books of a shelf of a profile, most recently added first.
+    Only the requested page is read and serialized, the number of books
+    of the shelf is cached (see UserProfile.shelf_count). Like the other
+    large lists, `cursor` switches to keyset pages without a count.
+    """
     serializer_class = MinBookSerializer
     pagination_class = SmallPagesPagination
     permission_classes = (IsAuthenticated,)
     authentication_classes = (TokenAuthentication,)
-
-    def get_queryset(self, username, list):
-        try:
-            user = User.objects.get(username=username)
-            profile = UserProfile.objects.get(user=user)
-            kind_list = ['liked_books', 'readed_books', 'favorite_books', 'read_later_books', 'rated_books',]
-            list_choice = {
-                'liked': 'liked_books',
-                'reads': 'readed_books',
-                'favorites': 'favorite_books',
-                'read-later': 'read_later_books',
-            }
-            if list in list_choice.keys():
-                getter = getattr(profile, list_choice[list])
-                return getter.all()
-            return None
-        except User.DoesNotExist:
-            return None
+    cursor_fields = ('date_added', 'pk')
+    # Shelf of the url: BookInteraction flag and the date it was set.
+    shelves = {
+        'liked': ('is_liked', 'date_liked'),
+        'reads': ('is_read', 'date_readed'),
+        'favorites': ('is_favorite', 'date_favorite'),
+        'read-later': ('is_read_later', 'date_read_later'),
+    }
+
+    def get_queryset(self, profile, list):
+        flag, date = self.shelves[list]
+        return profile.shelf(flag).annotate(date_added=F(f'interactions__{date}')).order_by('-date_added', '-pk')
 
     def get(self, request, username=None, list='reads'):
         if username is None:
             username = request.user.username
-        books = self.get_queryset(username, list)
-
-        if books:
+        profile = UserProfile.objects.select_related('user').filter(user__username=username).first()
+        page = None
+        if profile is not None and list in self.shelves:
+            flag = self.shelves[list][0]
+            self.count_rows = lambda: profile.shelf_count(flag)
             paginator = self.pagination_class()
-            # get the requested page username: slug
-            page_user = User.objects.get(username=username)
-            serializer = self.serializer_class(books, many=True, context={
-                'request': self.request,
-                'page_user': page_user,
-            })
-            page = paginator.paginate_queryset(serializer.data, request)
+            page = paginator.paginate_queryset(self.get_queryset(profile, list), request, view=self)
+
+        if page:
+            context = {'request': self.request, 'page_user': profile.user}
+            if profile.user_id == request.user.pk:
+                # Own shelf: the rates of the page user are the viewer's.
+                context['viewer'] = context['page_viewer'] = ViewerContext(request.user)
+            serializer = self.serializer_class(page, many=True, context=context)
             return paginator.get_paginated_response(serializer.data)
         else:
             msg = "هیچ کتابی پیدا نشد"
@@ -122,8 +141,9 @@ class BookListViewSet(viewsets.ModelViewSet):
             # get username slug from url
             username = self.kwargs['username']
             user = User.objects.get(username=username)
-            qs = [x for x in BookList.objects.filter(user=user) if x.books.count() > 0]
-            return qs
+            return BookList.objects.filter(user=user).annotate(
+                number_of_books=Count('books'),
+            ).filter(number_of_books__gt=0).order_by('id')
         except User.DoesNotExist:
             return None
 
@@ -132,6 +152,8 @@ class ProfileFollowingsView(viewsets.ModelViewSet):
     serializer_class = MiniProfileSerializer
     permission_classes = (IsAuthenticated,)
     pagination_class = SmallPagesPagination
+    # Followings have no follow date, user ids are served by the relation index.
+    cursor_fields = ('pk',)
     authentication_classes = (TokenAuthentication,)
 
     def get_queryset(self):
@@ -148,28 +170,52 @@ class ProfileFollowingsView(viewsets.ModelViewSet):
 class SearchViewSet(generics.ListAPIView):
     """
     API endpoint that list Search results.
+    Users are found by the start of any word of their username or name
+    (or any part of the username), and ranked by how many of the people
+    the viewer follows follow them, then by their followers.
     """
     queryset = User.objects.all()
     permission_classes = (book_permissions.IsAuthenticatedOrReadOnly,)
     authentication_classes = (TokenAuthentication,)
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['title']
+    pagination_class = SmallPagesPagination
     Method_Allowed = ['GET']
+    # Matches ranked per query, the rest are not reachable.
+    max_results = 500
 
     def get(self, request):
         query = request.GET.get('search')
         if query:
-            users = User.objects.filter(username__icontains=query.lower())[:10]
-            user_r = []
-            for user in users:
-                try:
-                    user.userprofile
-                    user_r.append(user)
-                except:
-                    continue
-
-            serializer = MiniProfileSerializer(user_r, many=True)
-            return Response(serializer.data)
+            ids = self.paginate_queryset(UserSearchTerm.search(query, self.max_results, request.user))
+            users = User.objects.filter(pk__in=ids).select_related('userprofile').annotate(
+                readed_count=Count('book_interactions', filter=Q(book_interactions__is_read=True)),
+            ).in_bulk()
+            users = [users[pk] for pk in ids if pk in users]
+            serializer = MiniProfileSerializer(users, many=True)
+            return self.get_paginated_response(serializer.data)
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST, data={'error': 'درخواست نامعتبر است'})
-        
\ No newline at end of file
+        
+
+
+class FeedView(APIView):
+    """
+    What the followed users read, liked, rated and reviewed, newest first.
+    Pages are linked by cursor: `next` passes the id of the last activity
+    as `before`, so new activities never shift the following pages.
+    """
+    serializer_class = ActivitySerializer
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = (TokenAuthentication,)
+
+    def get(self, request):
+        before = request.query_params.get('before')
+        if before is not None and not before.isdigit():
+            return Response(status=status.HTTP_400_BAD_REQUEST, data={'message': 'before must be an activity id'})
+        activities, more = timeline(request.user, int(before) if before else None)
+        next_url = None
+        if more:
+            next_url = request.build_absolute_uri(
+                reverse('feed') + '?' + urlencode({'before': activities[-1].pk})
+            )
+        serializer = self.serializer_class(activities, many=True)
+        return Response({'next': next_url, 'results': serializer.data})
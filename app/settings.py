@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -237,6 +239,28 @@ DATABASES = {
     }
 }
 
+# One cache for every process of the host (web workers, celery and
+# management commands): changes expire cached results by bumping version
+# keys (book.search, main.cache) and every process must see the bump.
+# The default LocMemCache is private to each process.
+# A full file cache deletes a third of its files at random, the version
+# counters live apart in 'versions', which holds a few keys and never
+# fills up: a lost counter would start again at 1 and bring back old
+# responses.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'nebig-cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'nebig-cache-versions'),
+    },
+}
+
 
 
 # Password validation
@@ -313,3 +337,7 @@ REST_FRAMEWORK = {
 }
 
 BASE_URL = 'https://api.nebigapp.com'
+
+# Activities of users with more followers than this are not copied to every
+# follower's timeline, followers read them when they load their feed.
+FEED_FANOUT_LIMIT = 1000
@@ -0,0 +1,242 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+
+from core.models import Book, Author, FacetCount
+from utils.text import search_tokens
+
+
+# Keys of a title: the whole title and what follows its 2nd and 3rd word,
+# so "کور" completes "بوف کور".
+MAX_KEYS = 3
+# Prefixes of more entries than this have their best items ranked when
+# the index is built, those of fewer are ranked when asked.
+SCAN_LIMIT = 200
+# Items kept for a ranked prefix, the most suggest() may return.
+TOP_K = 20
+# A worker reloads its index in the background after this many seconds
+# to pick up books saved by other processes.
+MAX_AGE = 60 * 60
+# Typos are corrected with the most common characters of the index only.
+ALPHABET_SIZE = 48
+
+
+def keys_of(text):
+    tokens = search_tokens(text)
+    return [' '.join(tokens[i:]) for i in range(min(len(tokens), MAX_KEYS))]
+
+
+class AutocompleteIndex:
+    """
+    In-process prefix index of book titles and author names.
+
+    `entries` is a sorted list of (key, id) where key is normalized text
+    (see utils.text) and id is a book id, or minus an author id. A prefix
+    is found with a binary search. Prefixes of more than SCAN_LIMIT
+    entries, short ones mostly, have their TOP_K best items in `top`, so
+    the heaviest matches are found without reading every entry.
+    Saving a book updates the index of the process in place
+    (book.signals), other processes catch up on their next reload.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = []
+        self.items = {}
+        self.keys = {}
+        self.top = {}
+        self.alphabet = ''
+        self.loaded_at = None
+        self.reloading = False
+
+    def load(self):
+        """ Build the index from the database and swap it in. """
+        books = Book.objects.filter(is_active=True).values_list('pk', 'title', 'slug', 'stats__readers_count')
+        counts = dict(FacetCount.objects.filter(dimension=FacetCount.AUTHOR).values_list('value', 'count'))
+        authors = (
+            (pk, name, counts.get(str(pk), 0)) for pk, name in Author.objects.values_list('pk', 'name').iterator()
+        )
+        self.fill(books.iterator(), authors)
+
+    def fill(self, books, authors):
+        """
+        Replace the index by `books`, (id, title, slug, readers) tuples, and
+        `authors`, (id, name, books) tuples.
+        """
+        entries, items, keys = [], {}, {}
+        for pk, title, slug, readers in books:
+            items[pk] = {'type': 'book', 'text': title, 'slug': slug, 'weight': readers or 0}
+            keys[pk] = keys_of(title)
+        for pk, name, count in authors:
+            items[-pk] = {'type': 'author', 'text': name, 'id': pk, 'weight': count}
+            keys[-pk] = keys_of(name)
+        for pk, item_keys in keys.items():
+            entries += [(key, pk) for key in item_keys]
+        entries.sort()
+        top = {}
+        self.rank_range(entries, items, keys, top, '', 0, len(entries))
+        chars = Counter()
+        for item_keys in keys.values():
+            if item_keys:
+                chars.update(item_keys[0])
+        chars.pop(' ', None)
+        alphabet = ''.join(char for char, count in chars.most_common(ALPHABET_SIZE))
+        with self.lock:
+            self.entries, self.items, self.keys, self.top, self.alphabet = entries, items, keys, top, alphabet
+            self.loaded_at = time.monotonic()
+            self.reloading = False
+
+    @staticmethod
+    def rank(candidates, items):
+        """ The TOP_K best of `candidates`, a dict of id to whether the match is at the start of the text. """
+        best = sorted(
+            (pk for pk in candidates if pk in items),
+            key=lambda pk: (-items[pk]['weight'], not candidates[pk], len(items[pk]['text']), pk),
+        )[:TOP_K]
+        return [(pk, candidates[pk]) for pk in best]
+
+    def rank_range(self, entries, items, keys, top, prefix, lo, hi):
+        """
+        The best items of `entries[lo:hi]`, whose keys all start with
+        `prefix`, filling `top` for the prefixes of more than SCAN_LIMIT
+        entries. Children are ranked first, a prefix merges their best.
+        """
+        candidates = {}
+        if hi - lo <= SCAN_LIMIT:
+            for key, pk in entries[lo:hi]:
+                candidates[pk] = candidates.get(pk) or key == keys[pk][0]
+            return self.rank(candidates, items)
+        depth = len(prefix)
+        i = lo
+        while i < hi:
+            key = entries[i][0]
+            if len(key) == depth:
+                j = i + 1
+                candidates[entries[i][1]] = candidates.get(entries[i][1]) or key == keys[entries[i][1]][0]
+            else:
+                child = key[:depth + 1]
+                j = bisect_left(entries, (child[:-1] + chr(ord(child[-1]) + 1),), i, hi)
+                for pk, start in self.rank_range(entries, items, keys, top, child, i, j):
+                    candidates[pk] = candidates.get(pk) or start
+            i = j
+        top[prefix] = self.rank(candidates, items)
+        return top[prefix]
+
+    def ensure_loaded(self):
+        if self.loaded_at is None:
+            self.load()
+        elif time.monotonic() - self.loaded_at > MAX_AGE and not self.reloading:
+            self.reloading = True
+            threading.Thread(target=self.reload, daemon=True).start()
+
+    def reload(self):
+        try:
+            self.load()
+        finally:
+            self.reloading = False
+
+    def put(self, pk, item, text):
+        """ Add or replace item `pk`, a book id or minus an author id. """
+        if self.loaded_at is None:
+            return
+        with self.lock:
+            self._remove(pk)
+            self.items[pk] = item
+            self.keys[pk] = keys_of(text)
+            for key in self.keys[pk]:
+                insort(self.entries, (key, pk))
+                # Ranked prefixes take the item in, they are rebuilt on reload.
+                for length in range(len(key) + 1):
+                    best = self.top.get(key[:length])
+                    if best is not None:
+                        candidates = dict(best)
+                        candidates[pk] = candidates.get(pk) or key == self.keys[pk][0]
+                        self.top[key[:length]] = self.rank(candidates, self.items)
+
+    def remove(self, pk):
+        if self.loaded_at is None:
+            return
+        with self.lock:
+            self._remove(pk)
+
+    def _remove(self, pk):
+        for key in self.keys.pop(pk, []):
+            i = bisect_left(self.entries, (key, pk))
+            if i < len(self.entries) and self.entries[i] == (key, pk):
+                del self.entries[i]
+            for length in range(len(key) + 1):
+                best = self.top.get(key[:length])
+                if best is not None:
+                    self.top[key[:length]] = [(other, start) for other, start in best if other != pk]
+        self.items.pop(pk, None)
+
+    def weight(self, pk):
+        """ Weights are refreshed by reloads, saving a book keeps the current one. """
+        return self.items.get(pk, {}).get('weight', 0)
+
+    def put_book(self, book):
+        if not book.is_active:
+            return self.remove(book.pk)
+        item = {'type': 'book', 'text': book.title, 'slug': book.slug, 'weight': self.weight(book.pk)}
+        self.put(book.pk, item, book.title)
+
+    def put_author(self, author):
+        item = {'type': 'author', 'text': author.name, 'id': author.pk, 'weight': self.weight(-author.pk)}
+        self.put(-author.pk, item, author.name)
+
+    def prefix(self, prefix, found):
+        """
+        Add the ids of the best items having a key starting with `prefix`
+        to `found`, mapped to whether the match is at the start of the text.
+        """
+        best = self.top.get(prefix)
+        if best is not None:
+            for pk, start in best:
+                found[pk] = found.get(pk) or start
+            return
+        entries = self.entries
+        i = bisect_left(entries, (prefix,))
+        for key, pk in entries[i:]:
+            if not key.startswith(prefix):
+                break
+            found[pk] = found.get(pk) or key == self.keys.get(pk, [None])[0]
+
+    def edits(self, word):
+        """ Strings one deletion, substitution, insertion or transposition away from `word`. """
+        splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+        for left, right in splits:
+            if right:
+                yield left + right[1:]
+                if len(right) > 1:
+                    yield left + right[1] + right[0] + right[2:]
+                for char in self.alphabet:
+                    if char != right[0]:
+                        yield left + char + right[1:]
+            for char in self.alphabet:
+                yield left + char + right
+
+    def suggest(self, query, k=10):
+        """
+        The `k` best titles and author names starting with `query`, or
+        one edit away from it when nothing starts with it. The most read
+        books and authors with the most books come first, then texts
+        starting with the query, shorter ones first.
+        """
+        self.ensure_loaded()
+        prefix = ' '.join(search_tokens(query))
+        if not prefix:
+            return []
+        found = {}
+        self.prefix(prefix, found)
+        if not found and len(prefix) > 2:
+            for variant in set(self.edits(prefix)):
+                self.prefix(variant, found)
+        items = self.items
+        ranked = sorted(
+            (pk for pk in found if pk in items),
+            key=lambda pk: (-items[pk]['weight'], not found[pk], len(items[pk]['text']), pk),
+        )[:k]
+        return [{name: value for name, value in items[pk].items() if name != 'weight'} for pk in ranked]
+
+index = AutocompleteIndex()
@@ -0,0 +1,91 @@
+from django.db import transaction
+from django.db.models import Count
+
+from core.models import Book, Author, Translator, Publisher, FacetCount, ImportJob
+from book import search
+from utils.text import search_tokens
+
+
+# Facet dimension of each model, its books are related by `books`.
+DIMENSIONS = {
+    Author: FacetCount.AUTHOR,
+    Translator: FacetCount.TRANSLATOR,
+    Publisher: FacetCount.PUBLISHER,
+}
+
+
+def name_key(name):
+    """
+    Key of the spelling variants of a name: Arabic or Persian letters,
+    ZWNJ or space, diacritics, case and punctuation don't matter.
+    """
+    return ' '.join(search_tokens(name))
+
+
+def clusters(model):
+    """
+    Rows of `model` sharing a name key, as (kept, duplicates) lists of
+    (id, name) with the row with the most books kept, then the oldest.
+    """
+    groups = {}
+    for pk, name, books in model.objects.annotate(count=Count('books')).values_list('pk', 'name', 'count').order_by('pk'):
+        key = name_key(name)
+        if key:
+            groups.setdefault(key, []).append((pk, name, books))
+    for rows in groups.values():
+        if len(rows) > 1:
+            rows.sort(key=lambda row: (-row[2], row[0]))
+            yield rows[0][:2], [row[:2] for row in rows[1:]]
+
+
+def merge(model, kept, duplicates):
+    """
+    Point the books of the `duplicates` ids of `model` to `kept` and
+    delete them, in one transaction. Publishers also hand over their
+    import jobs, visibility and logo. Returns the ids of the books moved.
+    """
+    dimension = DIMENSIONS[model]
+    with transaction.atomic():
+        if model is Publisher:
+            books = list(Book.objects.filter(publisher__in=duplicates).values_list('pk', flat=True))
+            Book.objects.filter(pk__in=books).update(publisher=kept)
+            ImportJob.objects.filter(publisher__in=duplicates).update(publisher=kept)
+            # The kept row is shown if any variant was, with its own logo or the first a variant has.
+            publisher = Publisher.objects.get(pk=kept)
+            variants = Publisher.objects.filter(pk__in=duplicates).order_by('pk')
+            publisher.is_show = publisher.is_show or variants.filter(is_show=True).exists()
+            if not publisher.logo:
+                publisher.logo = variants.exclude(logo='').exclude(logo=None).values_list('logo', flat=True).first()
+            publisher.save(update_fields=['is_show', 'logo'])
+        else:
+            through = getattr(Book, f'{dimension}s').through
+            field = f'{dimension}_id'
+            rows = list(through.objects.filter(**{f'{field}__in': duplicates}).values_list('pk', 'book_id'))
+            # A book keeps one row, none if it was already related to `kept`.
+            related = set(through.objects.filter(**{field: kept}).values_list('book_id', flat=True))
+            moved, dropped = {}, []
+            for pk, book in rows:
+                if book in related or book in moved:
+                    dropped.append(pk)
+                else:
+                    moved[book] = pk
+            through.objects.filter(pk__in=dropped).delete()
+            through.objects.filter(pk__in=moved.values()).update(**{field: kept})
+            books = [book for pk, book in rows]
+        model.objects.filter(pk__in=duplicates).delete()
+
+        FacetCount.objects.filter(dimension=dimension, value__in=[str(pk) for pk in duplicates]).delete()
+        count = model.objects.get(pk=kept).books.count()
+        FacetCount.objects.update_or_create(dimension=dimension, value=str(kept), defaults={'count': count})
+        search.index_books(set(books))
+    return set(books)
+
+
+def dedupe(model, dry_run=False):
+    """
+    Merge the rows of `model` whose names only differ in spelling.
+    Yields (kept, duplicates, books moved) for each cluster.
+    """
+    for kept, duplicates in list(clusters(model)):
+        books = set() if dry_run else merge(model, kept[0], [pk for pk, name in duplicates])
+        yield kept, duplicates, books
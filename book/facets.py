@@ -0,0 +1,130 @@
+from django.db.models import Count, Q
+from rest_framework.exceptions import ValidationError
+
+from core.models import Book, Author, Translator, Publisher, Size, CoverType, FacetCount
+
+
+# Values returned for each facet, most common first.
+FACET_SIZE = 10
+# Matched books counted for the facets of a filtered result, the first
+# ones in the result order. Larger results are faceted by a sample so a
+# filter matching most of the catalogue doesn't group all of it.
+FACET_SCAN_LIMIT = 1000
+MODELS = {
+    FacetCount.AUTHOR: Author,
+    FacetCount.TRANSLATOR: Translator,
+    FacetCount.PUBLISHER: Publisher,
+    FacetCount.SIZE: Size,
+    FacetCount.COVER_TYPE: CoverType,
+}
+
+
+def number(params, name, kind):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return kind(value)
+    except ValueError:
+        raise ValidationError({'error': f'{name} must be a number'})
+
+
+def parse_filters(params):
+    """
+    Filters of the query string: author, translator, publisher, size and
+    cover_type ids, language and label (any of repeated values), and
+    pages_min, pages_max, rate_min, rate_max ranges.
+    """
+    filters = {}
+    for dimension in MODELS:
+        values = [value for value in params.getlist(dimension) if value]
+        if values:
+            if not all(value.isdigit() for value in values):
+                raise ValidationError({'error': f'{dimension} must be an id'})
+            filters[f'{dimension}s__in' if dimension in (FacetCount.AUTHOR, FacetCount.TRANSLATOR) else f'{dimension}__in'] = values
+    for dimension in (FacetCount.LANGUAGE, FacetCount.LABEL):
+        values = [value for value in params.getlist(dimension) if value]
+        if values:
+            filters[f'{dimension}__in'] = values
+    ranges = (
+        ('pages_min', 'pages__gte', int), ('pages_max', 'pages__lte', int),
+        ('rate_min', 'rate__gte', float), ('rate_max', 'rate__lte', float),
+    )
+    for name, lookup, kind in ranges:
+        value = number(params, name, kind)
+        if value is not None:
+            filters[lookup] = value
+    return filters
+
+
+def filter_books(books, filters):
+    for lookup, value in filters.items():
+        # One filter() per lookup so two authors mean "any of them".
+        books = books.filter(**{lookup: value})
+    if any(lookup.startswith(('authors', 'translators')) for lookup in filters):
+        books = books.distinct()
+    return books
+
+
+def facet_rows(dimension, counts):
+    """ [{'value', 'name', 'count'}] for (value, count) pairs of a dimension. """
+    counts = [(str(value), count) for value, count in counts if count]
+    names = {}
+    if dimension in MODELS:
+        objects = MODELS[dimension].objects.in_bulk([int(value) for value, count in counts])
+        names = {str(pk): obj.name for pk, obj in objects.items()}
+    return [{'value': value, 'name': names.get(value, value), 'count': count} for value, count in counts]
+
+
+def catalogue_facets():
+    """ Facets of the whole catalogue, read from the precomputed counts. """
+    facets = {}
+    for dimension in (*MODELS, FacetCount.LANGUAGE, FacetCount.LABEL, FacetCount.PAGES, FacetCount.RATE):
+        counts = FacetCount.objects.filter(dimension=dimension, count__gt=0).order_by('-count')
+        if dimension in (FacetCount.PAGES, FacetCount.RATE):
+            counts = counts.order_by('value')
+        facets[dimension] = facet_rows(dimension, counts.values_list('value', 'count')[:FACET_SIZE])
+    return facets
+
+
+def result_facets(books):
+    """
+    Facets of the matched `books`. Counts are grouped over the first
+    FACET_SCAN_LIMIT matched rows only, which the filter indexes (or the
+    search ranking) find without reading the rest of the catalogue.
+    """
+    ids = books.values('pk')[:FACET_SCAN_LIMIT]
+    facets = {}
+    for dimension in (FacetCount.AUTHOR, FacetCount.TRANSLATOR):
+        through = getattr(Book, f'{dimension}s').through
+        counts = through.objects.filter(book_id__in=ids).values_list(f'{dimension}_id') \
+            .annotate(count=Count('pk')).order_by('-count')[:FACET_SIZE]
+        facets[dimension] = facet_rows(dimension, counts)
+    for dimension, field in FacetCount.FIELDS.items():
+        books = Book.objects.filter(pk__in=ids).exclude(**{f'{field}__isnull': True})
+        if dimension in (FacetCount.LANGUAGE, FacetCount.LABEL):
+            books = books.exclude(**{field: ''})
+        counts = books.values_list(field).annotate(count=Count('pk')).order_by('-count')[:FACET_SIZE]
+        facets[dimension] = facet_rows(dimension, counts)
+    aggregates = {}
+    for first, last in FacetCount.PAGES_BUCKETS:
+        if not first:
+            q = Q(pages__lte=last) | Q(pages__isnull=True)
+        elif last is None:
+            q = Q(pages__gte=first)
+        else:
+            q = Q(pages__gte=first, pages__lte=last)
+        aggregates[f'{FacetCount.PAGES}:{FacetCount.pages_bucket(first)}'] = Count('pk', filter=q)
+    for star in range(5):
+        if not star:
+            q = Q(rate__lt=1) | Q(rate__isnull=True)
+        elif star == 4:
+            q = Q(rate__gte=star)
+        else:
+            q = Q(rate__gte=star, rate__lt=star + 1)
+        aggregates[f'{FacetCount.RATE}:{star}'] = Count('pk', filter=q)
+    totals = Book.objects.filter(pk__in=ids).aggregate(**aggregates)
+    for dimension in (FacetCount.PAGES, FacetCount.RATE):
+        counts = [(key.split(':', 1)[1], count) for key, count in totals.items() if key.startswith(dimension + ':')]
+        facets[dimension] = facet_rows(dimension, counts)
+    return facets
@@ -0,0 +1,234 @@
+from collections import Counter
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from core.models import Book, Author, Translator, Publisher, Size, CoverType, BookRawData, FacetCount
+from book import search, autocomplete
+
+
+# Book fields a record may set as they are.
+FIELDS = ('title', 'subtitle', 'isbn', 'pages', 'language', 'label', 'description', 'source', 'source_link', 'raw_data')
+# Records written per transaction.
+BATCH_SIZE = 500
+# Relations a record names, by model.
+PEOPLE = {Author: 'authors', Translator: 'translators'}
+SINGLE = {Publisher: 'publisher', Size: 'size', CoverType: 'cover_type'}
+
+
+class NameCache:
+    """
+    Ids of the rows of `model` by name, read or created a batch of names
+    at a time. Names held by several rows map to the oldest one.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.ids = {}
+        self.created = []
+
+    def resolve(self, names):
+        """ Make sure every name of `names` has an id, creating the missing rows. """
+        missing = {name for name in names if name not in self.ids}
+        if not missing:
+            return
+        self.load(missing)
+        new = [self.model(name=name) for name in missing if name not in self.ids]
+        if new:
+            self.model.objects.bulk_create(new)
+            self.created += self.load({row.name for row in new})
+
+    def load(self, names):
+        rows = list(self.model.objects.filter(name__in=names).order_by('-pk'))
+        for row in rows:
+            self.ids[row.name] = row.pk
+        return rows
+
+    def __getitem__(self, name):
+        return self.ids[name]
+
+
+class CatalogueWriter:
+    """
+    Writes parsed books in batches: a few queries per batch instead of
+    saving every book, author and relation one by one.
+
+    A record is a dict of FIELDS plus `authors` and `translators` (lists
+    of names), `publisher`, `size` and `cover_type` (names, or a
+    publisher instance) and `cover`, a (file name, bytes) pair. add()
+    returns the book, its pk is set once the batch is written. update()
+    writes a record over an existing book.
+    Since bulk_create sends no signals, the search index, facet counts
+    and autocomplete are updated here for the whole batch.
+
+    Use it as a context manager, or call flush() after the last record.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.names = {model: NameCache(model) for model in (Author, Translator, Publisher, Size, CoverType)}
+        self.records = []
+        self.raw = []
+        self.updates = {}
+        self.written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def add(self, record):
+        book = Book(**{field: record[field] for field in FIELDS if record.get(field) not in (None, '')})
+        book.pages = clean_pages(book.pages)
+        if record.get('cover'):
+            name, content = record['cover']
+            book.cover = ContentFile(content, name=name)
+        elif record.get('cover') == '':
+            # Waiting for a cover, see web.views.choose_photos.
+            book.cover = ''
+        self.records.append((book, record))
+        if len(self.records) >= self.batch_size:
+            self.flush()
+        return book
+
+    def update(self, pk, record):
+        """
+        Queue new values for the book `pk`: what `record` has replaces
+        what the book has, its people included. Covers are kept.
+        """
+        self.updates[pk] = record
+        if len(self.updates) >= self.batch_size:
+            self.flush()
+
+    def add_raw(self, data):
+        """ Queue an unreviewed record for BookRawData. """
+        self.raw.append(BookRawData(data=data))
+        if len(self.raw) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """ Write the queued records, returns the books created. """
+        records, self.records = self.records, []
+        raw, self.raw = self.raw, []
+        updates, self.updates = self.updates, {}
+        updated = []
+        with transaction.atomic():
+            BookRawData.objects.bulk_create(raw)
+            if records:
+                self.write(records)
+            if updates:
+                updated = self.rewrite(updates)
+        if raw:
+            BookRawData.change_remaining(len(raw))
+        for book in [book for book, record in records] + updated:
+            autocomplete.index.put_book(book)
+        for author in self.names[Author].created:
+            autocomplete.index.put_author(author)
+        for cache in self.names.values():
+            cache.created = []
+        self.written += len(records)
+        return [book for book, record in records]
+
+    def resolve(self, records):
+        """ Make sure the names of every record of `records` have ids. """
+        records = list(records)
+        for model, key in {**PEOPLE, **SINGLE}.items():
+            self.names[model].resolve(name for record in records for name in names_of(record, key))
+
+    def assign(self, book, record):
+        """ Set the single valued relations of `book` named in `record`, returns the fields set. """
+        fields = []
+        for model, key in SINGLE.items():
+            value = record.get(key)
+            if isinstance(value, Publisher):
+                setattr(book, f'{key}_id', value.pk)
+            elif names_of(record, key):
+                setattr(book, f'{key}_id', self.names[model][names_of(record, key)[0]])
+            else:
+                continue
+            fields.append(key)
+        return fields
+
+    def write(self, records):
+        self.resolve(record for book, record in records)
+        for book, record in records:
+            self.assign(book, record)
+            if book.cover:
+                book.resize_cover()
+        books = [book for book, record in records]
+        for book, slug in zip(books, Book.new_slugs(len(books))):
+            book.slug = slug
+        Book.objects.bulk_create(books)
+        # SQLite doesn't return the ids of inserted rows, the slugs find them.
+        ids = dict(Book.objects.filter(slug__in=[book.slug for book in books]).values_list('slug', 'pk'))
+        for book in books:
+            book.pk = ids[book.slug]
+
+        facets = Counter()
+        for model, key in PEOPLE.items():
+            dimension = FacetCount.AUTHOR if model is Author else FacetCount.TRANSLATOR
+            through = getattr(Book, key).through
+            rows = {
+                (book.pk, self.names[model][name]) for book, record in records for name in names_of(record, key)
+            }
+            through.objects.bulk_create([through(book_id=book, **{f'{dimension}_id': person}) for book, person in rows])
+            facets.update((dimension, str(person)) for book, person in rows)
+        for book in books:
+            facets.update(FacetCount.book_values(book))
+        FacetCount.change_many(facets)
+        search.index_books(books)
+
+    def rewrite(self, updates):
+        """ Write the `updates` records over their books, returns the books. """
+        self.resolve(updates.values())
+        books = list(Book.objects.filter(pk__in=updates))
+        facets = Counter()
+        fields = set()
+        for book in books:
+            record = updates[book.pk]
+            facets.subtract(FacetCount.book_values(book))
+            for field in FIELDS:
+                if record.get(field) not in (None, ''):
+                    setattr(book, field, record[field])
+                    fields.add(field)
+            book.pages = clean_pages(book.pages)
+            fields.update(self.assign(book, record))
+            facets.update(FacetCount.book_values(book))
+        if fields:
+            Book.objects.bulk_update(books, fields, batch_size=BATCH_SIZE)
+
+        for model, key in PEOPLE.items():
+            dimension = FacetCount.AUTHOR if model is Author else FacetCount.TRANSLATOR
+            through = getattr(Book, key).through
+            ids = [book.pk for book in books if names_of(updates[book.pk], key)]
+            rows = through.objects.filter(book_id__in=ids).values_list('pk', 'book_id', f'{dimension}_id')
+            current = {(book, person): pk for pk, book, person in rows}
+            wanted = {(pk, self.names[model][name]) for pk in ids for name in names_of(updates[pk], key)}
+            removed = set(current) - wanted
+            added = wanted - set(current)
+            through.objects.filter(pk__in=[current[pair] for pair in removed]).delete()
+            through.objects.bulk_create([through(book_id=book, **{f'{dimension}_id': person}) for book, person in added])
+            facets.subtract((dimension, str(person)) for book, person in removed)
+            facets.update((dimension, str(person)) for book, person in added)
+        FacetCount.change_many(facets)
+        search.index_books(books)
+        return books
+
+
+def names_of(record, key):
+    """ Cleaned names of `key` in `record`, which may be one name or a list. """
+    value = record.get(key)
+    if value is None or isinstance(value, Publisher):
+        return []
+    if isinstance(value, str):
+        value = [value]
+    return list(dict.fromkeys(name.strip() for name in value if name and name.strip()))
+
+
+def clean_pages(pages):
+    try:
+        return int(pages)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,44 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from book.autocomplete import AutocompleteIndex
+from book.management.commands.bench_search import vocabulary
+from utils.benchmark import measure, summary
+
+
+class Command(BaseCommand):
+    help = 'Measure autocomplete latency on in-memory indexes of growing synthetic catalogues'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000, 1000000])
+        parser.add_argument('--repeat', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rand = random.Random(0)
+        words = vocabulary(rand)
+        weights = [1 / rank for rank in range(1, len(words) + 1)]
+
+        def title():
+            return ' '.join(rand.choices(words, weights, k=rand.randint(1, 5)))
+
+        def typo(text):
+            i = rand.randrange(len(text))
+            return text[:i] + text[i + 1:]
+
+        for size in sorted(options['sizes']):
+            index = AutocompleteIndex()
+            books = [(pk, title(), str(pk), rand.randint(0, 1000)) for pk in range(1, size + 1)]
+            authors = [(pk, title(), rand.randint(0, 100)) for pk in range(1, size // 10 + 1)]
+            index.fill(books, authors)
+            texts = [rand.choice(books)[1] for _ in range(options['repeat'])]
+            self.stdout.write(self.style.SUCCESS(f'{size} books, {len(index.entries)} keys'))
+            queries = {
+                '2 letters': [(text[:2],) for text in texts],
+                '5 letters': [(text[:5],) for text in texts],
+                'whole title': [(text,) for text in texts],
+                'one typo': [(typo(text[:8]),) for text in texts],
+                'no match': [('qqqqqqqq',) for text in texts],
+            }
+            for name, calls in queries.items():
+                self.stdout.write(f'  {name:<12} {summary(measure(index.suggest, calls))}')
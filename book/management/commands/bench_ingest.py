@@ -0,0 +1,66 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Book, Author, Translator, Publisher, Size
+from book.ingest import CatalogueWriter
+from book.management.commands.bench_search import vocabulary
+from utils.benchmark import Rollback
+
+
+def save_one_by_one(records):
+    """ What importers did before the writer: a save per book and per relation. """
+    for record in records:
+        book = Book.objects.create(title=record['title'], isbn=record['isbn'], pages=record['pages'])
+        for name in record['authors']:
+            book.authors.add(Author.objects.get_or_create(name=name)[0])
+        for name in record['translators']:
+            book.translators.add(Translator.objects.get_or_create(name=name)[0])
+        book.publisher = Publisher.objects.get_or_create(name=record['publisher'])[0]
+        book.size = Size.objects.get_or_create(name=record['size'])[0]
+        book.save()
+
+
+def write_in_batches(records):
+    with CatalogueWriter() as writer:
+        for record in records:
+            writer.add(record)
+
+
+class Command(BaseCommand):
+    help = 'Measure books written per second by the catalogue writer and by saving each book (nothing is kept)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['books'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def records(self, rand, words, count):
+        # A few thousand people and publishers shared by the books, as in a real catalogue.
+        return [{
+            'title': ' '.join(rand.choices(words, k=rand.randint(1, 4))),
+            'isbn': str(rand.randrange(10 ** 12, 10 ** 13)),
+            'pages': rand.randint(40, 900),
+            'authors': [f'Author {rand.randrange(count // 3 + 1)}' for _ in range(rand.choice((1, 1, 2)))],
+            'translators': [f'Translator {rand.randrange(count // 10 + 1)}'] if rand.random() < 0.4 else [],
+            'publisher': f'Publisher {rand.randrange(200)}',
+            'size': rand.choice(('رقعی', 'وزیری', 'جیبی')),
+        } for _ in range(count)]
+
+    def run(self, count):
+        rand = random.Random(0)
+        words = vocabulary(rand)
+        for name, write in (('one by one', save_one_by_one), ('writer', write_in_batches)):
+            records = self.records(rand, words, count)
+            start = time.perf_counter()
+            write(records)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'  {name:<12} {count} books in {elapsed:6.2f}s  {count / elapsed:8.0f} books/s')
@@ -0,0 +1,86 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Book
+from book import search
+from utils.benchmark import Rollback, measure, summary
+
+
+SYLLABLES = (
+    'با', 'ر', 'ده', 'من', 'سا', 'نو', 'گل', 'تا', 'ری', 'زا', 'کو', 'شی', 'مه', 'دا', 'لا', 'پو',
+    'خا', 'نه', 'فر', 'جو', 'سو', 'را', 'هو', 'بی', 'چه', 'یا', 'وا', 'تن', 'کا', 'دل',
+)
+
+
+def vocabulary(rand, size=5000):
+    """ Made up words, most common first. """
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rand.choice(SYLLABLES) for _ in range(rand.randint(2, 3))))
+    return sorted(words, key=lambda word: rand.random())
+
+
+class Command(BaseCommand):
+    help = 'Measure ranked search latency (count and first page, uncached) while the catalogue grows (nothing is kept)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000, 1000000])
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if not search.has_fts():
+            self.stdout.write(self.style.WARNING('Full-text search needs SQLite FTS5'))
+            return
+        try:
+            with transaction.atomic():
+                self.run(options['sizes'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def grow(self, size, rand, words, weights):
+        def title():
+            return ' '.join(rand.choices(words, weights, k=rand.randint(1, 5)))
+
+        missing = size - Book.objects.count()
+        last = Book.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        for start in range(0, missing, 10000):
+            Book.objects.bulk_create(
+                [Book(title=title(), subtitle=title()) for i in range(min(10000, missing - start))],
+                batch_size=10000,
+            )
+        search.index_books(Book.objects.filter(pk__gt=last).values_list('pk', flat=True))
+
+    def run(self, sizes, repeat):
+        rand = random.Random(0)
+        # Word frequencies of titles follow Zipf's law.
+        words = vocabulary(rand)
+        weights = [1 / rank for rank in range(1, len(words) + 1)]
+
+        def page(query):
+            results = search.search_books(query)
+            results.count()
+            return results[0:20]
+
+        def cold_page(query):
+            search.expire_results()
+            return page(query)
+
+        for size in sorted(sizes):
+            self.grow(size, rand, words, weights)
+            self.stdout.write(self.style.SUCCESS(f'{size} books'))
+            queries = {
+                'one word': [(rand.choice(words),) for _ in range(repeat)],
+                'two words': [(f'{rand.choice(words)} {rand.choice(words)}',) for _ in range(repeat)],
+                'prefix': [(rand.choice(words)[:3],) for _ in range(repeat)],
+                'top 10 words': [(rand.choice(words[:10]),) for _ in range(repeat)],
+                'no match': [('ناموجود',) for _ in range(repeat)],
+            }
+            for name, calls in queries.items():
+                self.stdout.write(f'  {name:<12} {summary(measure(cold_page, calls))}')
+            pages = [(query, rand.randint(0, 5)) for (query,) in queries['top 10 words']]
+            for query, n in pages:
+                search.search_books(query).count()
+            self.stdout.write(f'  {"cached":<12} {summary(measure(lambda query, n: search.search_books(query)[n * 20:n * 20 + 20], pages))}')
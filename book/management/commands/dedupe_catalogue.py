@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Author, Translator, Publisher
+from book.dedupe import dedupe
+
+
+MODELS = {
+    'authors': Author,
+    'translators': Translator,
+    'publishers': Publisher,
+}
+
+
+class Command(BaseCommand):
+    help = 'Merge authors, translators and publishers whose names only differ in spelling'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help='Some of ' + ', '.join(MODELS) + ' (all by default)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be merged')
+
+    def handle(self, *args, **options):
+        unknown = set(options['models']) - set(MODELS)
+        if unknown:
+            raise CommandError(f'Unknown models: {", ".join(sorted(unknown))}')
+        for name in options['models'] or MODELS:
+            merged = books = 0
+            for kept, duplicates, moved in dedupe(MODELS[name], dry_run=options['dry_run']):
+                self.stdout.write(f'{kept[1]} ({kept[0]}) <- ' + ', '.join(f'{dup} ({pk})' for pk, dup in duplicates))
+                merged += len(duplicates)
+                books += len(moved)
+            verb = 'Would merge' if options['dry_run'] else 'Merged'
+            self.stdout.write(self.style.SUCCESS(f'{verb} {merged} {name}, {books} books updated'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from book import search
+
+
+class Command(BaseCommand):
+    help = 'Index title, subtitle, authors, translators, publisher and ISBN of all books for search'
+
+    def handle(self, *args, **options):
+        if not search.has_fts():
+            self.stdout.write(self.style.WARNING('Full-text search needs SQLite FTS5, nothing to index'))
+            return
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} books'))
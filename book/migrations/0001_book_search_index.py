@@ -0,0 +1,29 @@
+from django.db import migrations
+
+from book import search
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    search.create_index(schema_editor)
+    search.rebuild_index(apps.get_model('core', 'Book'))
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('core', '0037_remove_legacy_reading_relations'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
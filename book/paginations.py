@@ -1,5 +1,107 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from functools import partial
+
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CountedPaginator(Paginator):
+    """ A Paginator asking `count` for the number of rows instead of counting them. """
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.counter = count
+
+    @cached_property
+    def count(self):
+        if self.counter is None:
+            return super().count
+        return self.counter()
+
+
+class SmallPagesPagination(PageNumberPagination):
+    """
+    Page numbers, or keyset pages when the client sends `cursor` (empty
+    for the first page) to a view declaring `cursor_fields`.
 
-class SmallPagesPagination(PageNumberPagination):  
+    `cursor_fields` are the names of indexed columns ordering the rows
+    newest first, the last one unique, e.g. ('date_created', 'pk').
+    A keyset page filters on the values of the last row of the previous
+    page instead of counting and skipping rows, so every page costs the
+    same and there is no count; `next` links the following page.
+
+    Page numbers use `view.count_rows()` as the total when the view has
+    it, e.g. a count kept in cache.
+    """
     page_size = 20
     page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_fields = getattr(view, 'cursor_fields', None)
+        if not self.cursor_fields or self.cursor_query_param not in request.query_params:
+            self.cursor_fields = None
+            count = getattr(view, 'count_rows', None)
+            if count is not None:
+                self.django_paginator_class = partial(CountedPaginator, count=count)
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*(f'-{field}' for field in self.cursor_fields))
+        cursor = self.decode_cursor(request.query_params[self.cursor_query_param])
+        if cursor is not None:
+            queryset = queryset.filter(self.after(cursor))
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def after(self, values):
+        """ Rows ordered after the row with `values` of the cursor fields. """
+        fields = self.cursor_fields
+        q = Q(**{f'{fields[-1]}__lt': values[-1]})
+        for field, value in zip(reversed(fields[:-1]), reversed(values[:-1])):
+            q = Q(**{f'{field}__lt': value}) | Q(**{field: value}) & q
+        return q
+
+    def encode_cursor(self, row):
+        # Dates keep their microseconds, the filter needs exact values.
+        values = [getattr(row, field) for field in self.cursor_fields]
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+        return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode()))
+        except (DecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.cursor_fields) or None in values:
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def get_next_link(self):
+        if self.cursor_fields is None:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        if self.cursor_fields is None:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
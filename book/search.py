@@ -0,0 +1,202 @@
+import hashlib
+
+from django.core.cache import cache, caches
+from django.db import connection
+from django.db.models import Q, Case, When, IntegerField
+
+from core.models import Book
+from utils.text import normalize_search_text, search_tokens
+
+
+TABLE = 'book_search'
+# bm25 weight of each column, title matches rank first.
+COLUMNS = (
+    ('title', 10.0),
+    ('subtitle', 4.0),
+    ('people', 3.0),
+    ('publisher', 2.0),
+    ('isbn', 1.0),
+)
+BATCH_SIZE = 1000
+# Results past this many are not counted or paged (50 pages of 20).
+MAX_RESULTS = 1000
+RANK_CANDIDATES = 10000
+CACHE_TIMEOUT = 60 * 5
+# Bumped by expire_results() when the index changes. Every process must
+# see the bump, so it is kept in the shared 'versions' cache of
+# settings.CACHES, which never culls it, or other workers keep serving
+# old results.
+VERSION_KEY = 'book-search-version'
+
+
+def has_fts():
+    """ The full-text index only exists on SQLite (FTS5). """
+    return connection.vendor == 'sqlite'
+
+
+def create_index(schema_editor):
+    columns = ', '.join(name for name, weight in COLUMNS)
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5({columns}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+
+
+def drop_index(schema_editor):
+    schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def document(book):
+    """ Normalized text of every indexed field of `book`. """
+    people = [author.name for author in book.authors.all()] + [translator.name for translator in book.translators.all()]
+    return (
+        normalize_search_text(book.title),
+        normalize_search_text(book.subtitle),
+        normalize_search_text(' '.join(name for name in people if name)),
+        normalize_search_text(book.publisher.name if book.publisher else ''),
+        normalize_search_text(book.isbn),
+    )
+
+
+def index_books(books, model=Book):
+    """
+    (Re)index `books`, a queryset or a list of instances or ids.
+    `model` is swapped for the historical Book model in migrations.
+    """
+    if not has_fts():
+        return 0
+    ids = [getattr(book, 'pk', book) for book in books]
+    count = 0
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = ids[start:start + BATCH_SIZE]
+        rows = [
+            (book.pk,) + document(book)
+            for book in model.objects.filter(pk__in=batch).select_related('publisher').prefetch_related('authors', 'translators')
+        ]
+        remove_books(batch)
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {TABLE} (rowid, title, subtitle, people, publisher, isbn) VALUES (%s, %s, %s, %s, %s, %s)', rows)
+        count += len(rows)
+    expire_results()
+    return count
+
+
+def expire_results():
+    """ Forget cached rankings, the index has changed. """
+    try:
+        caches['versions'].incr(VERSION_KEY)
+    except ValueError:
+        pass
+
+
+def remove_books(books):
+    if not has_fts():
+        return
+    ids = [getattr(book, 'pk', book) for book in books]
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), BATCH_SIZE):
+            batch = ids[start:start + BATCH_SIZE]
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({", ".join(["%s"] * len(batch))})', batch)
+    expire_results()
+
+
+def rebuild_index(model=Book):
+    """ Drop every indexed row and index all books again. """
+    if not has_fts():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    expire_results()
+    return index_books(model.objects.order_by('pk').values_list('pk', flat=True), model=model)
+
+
+def match_expression(query):
+    """
+    FTS5 query for `query`: every word must match, the last one as a
+    prefix so results show up while the user is typing.
+    """
+    tokens = search_tokens(query)
+    if not tokens:
+        return None
+    words = [f'"{token}"' for token in tokens]
+    words[-1] += '*'
+    return ' '.join(words)
+
+
+class SearchResults:
+    """
+    Ranked books matching a query, sliced lazily like a queryset so it can
+    be handed to a paginator.
+    The ids of the best MAX_RESULTS matches are ranked with one query and
+    cached until the index changes, so the count and every page of the
+    same query after that only load the books of the page.
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.match = match_expression(query)
+        self._ids = None
+
+    def ids(self):
+        if self._ids is None:
+            if self.match is None:
+                self._ids = []
+            elif not has_fts():
+                self._ids = list(self.fallback().values_list('pk', flat=True)[:MAX_RESULTS])
+            else:
+                key = 'book-search:' + hashlib.md5(self.match.encode()).hexdigest()
+                version = caches['versions'].get_or_set(VERSION_KEY, 1, None)
+                self._ids = cache.get(key, version=version)
+                if self._ids is None:
+                    self._ids = self.rank()
+                    cache.set(key, self._ids, CACHE_TIMEOUT, version=version)
+        return self._ids
+
+    def within(self, books):
+        """ The results that are also in the `books` queryset, still ranked. """
+        results = SearchResults(self.query)
+        allowed = set(books.filter(pk__in=self.ids()).values_list('pk', flat=True))
+        results._ids = [pk for pk in self.ids() if pk in allowed]
+        return results
+
+    def rank(self):
+        """
+        Order matches by bm25. Only the newest RANK_CANDIDATES matches are
+        scored, which bounds the cost of near stop word queries (matching
+        a good part of the catalogue) and changes nothing for the others.
+        """
+        weights = ', '.join(str(weight) for name, weight in COLUMNS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM ('
+                f'SELECT rowid, bm25({TABLE}, {weights}) AS score FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY rowid DESC LIMIT %s'
+                f') ORDER BY score, rowid LIMIT %s',
+                [self.match, RANK_CANDIDATES, MAX_RESULTS],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def count(self):
+        return len(self.ids())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if isinstance(item, int):
+            return self[item:item + 1][0]
+        ids = self.ids()[item]
+        books = Book.objects.in_bulk(ids)
+        return [books[pk] for pk in ids if pk in books]
+
+    def fallback(self):
+        """ Unindexed search for databases without FTS5, title prefix matches first. """
+        query = self.query.strip()
+        return Book.objects.filter(
+            Q(title__icontains=query) | Q(subtitle__icontains=query) | Q(authors__name__icontains=query)
+            | Q(translators__name__icontains=query) | Q(publisher__name__icontains=query) | Q(isbn__icontains=query)
+        ).annotate(
+            prefix=Case(When(title__istartswith=query, then=0), default=1, output_field=IntegerField()),
+        ).order_by('prefix', 'pk').distinct()
+
+
+def search_books(query):
+    return SearchResults(query)
@@ -1,11 +1,23 @@
 import jdatetime
 
 from django.conf import settings
+from django.db import models
+from django.db.models import OuterRef, Subquery, prefetch_related_objects
 from rest_framework import serializers
 
-from core.models import Book, Author, Publisher, Review, PersonRate, Readers
+from core.models import Book, Author, Publisher, Review, BookInteraction, BookStats
+from book.viewer import ViewerContext
 
 
+def with_rate_to_book(reviews):
+    """
+    Annotate reviews with the rate their writer gave to the reviewed book.
+    """
+    rate = BookInteraction.objects.filter(
+        user=OuterRef('user'), book=OuterRef('book'),
+    ).values('rate')[:1]
+    return reviews.annotate(user_rate_to_book=Subquery(rate))
+
 
 class ReviewSerializer(serializers.ModelSerializer):
     book = serializers.CharField(source='book.title', read_only=True)
@@ -20,6 +32,9 @@ class ReviewSerializer(serializers.ModelSerializer):
 
     rate_to_book = serializers.SerializerMethodField()
     def get_rate_to_book(self, obj):
+        # Annotated by with_rate_to_book(), saves a query per review.
+        if hasattr(obj, 'user_rate_to_book'):
+            return obj.user_rate_to_book or 0
 
         user = obj.user
         book = obj.book
@@ -61,45 +76,29 @@ class BookSerializer(serializers.ModelSerializer):
 
     three_comments = serializers.SerializerMethodField()
     def get_three_comments(self, obj):
-        reviews = obj.reviews.all()[:3]
+        reviews = with_rate_to_book(obj.reviews.select_related('user__userprofile', 'book'))[:3]
         return ReviewSerializer(reviews, many=True).data
 
 
     related_friend_count = serializers.SerializerMethodField()
     def get_related_friend_count(self, obj):
-        # count = 0
-        
-        try:
-            user = self.context['request'].user
-            """
-            for friend in user.userprofile.following.all():
-                if obj in friend.userprofile.readed_books.all():
-                    count += 1
-            """
-            books = user.userprofile.related_following_to_book(obj)
-            return len(books)
-        except:
-            return 0
+        count, users = ViewerContext.from_context(self.context).friends_who_read(obj)
+        return count
 
 
     three_friends = serializers.SerializerMethodField()
     def get_three_friends(self, obj):
+        viewer = ViewerContext.from_context(self.context)
+        base_url = settings.BASE_URL
         related_frinds = []
-        try:
-            user = self.context['request'].user            
-            if user.is_authenticated:
-                res = user.userprofile.related_following_to_book(obj)
-                base_url = settings.BASE_URL
-                for user in res:
-                    rate = PersonRate.objects.get(user=user, book=obj).person_rate
-                    u = {
-                        'username': user.username,
-                        'avatar': base_url + user.userprofile.avatar.url,
-                        'rate': float(rate),
-                    }
-                    related_frinds.append(u)
-        except:
-            pass
+        count, users = viewer.friends_who_read(obj)
+        for user in users:
+            rate = user.rate_to_book
+            related_frinds.append({
+                'username': user.username,
+                'avatar': base_url + user.userprofile.avatar.url,
+                'rate': float(rate) if rate is not None else 0.0,
+            })
         return related_frinds
     
     # Add current site to cover image
@@ -114,44 +113,42 @@ class BookSerializer(serializers.ModelSerializer):
         
     rate = serializers.SerializerMethodField()
     def get_rate(self, obj):
-        return 0.0
+        # Average rate, kept up to date by BookStats.
+        return obj.rate or 0.0
+
+    stats = serializers.SerializerMethodField()
+    def get_stats(self, obj):
+        try:
+            stats = obj.stats
+        except BookStats.DoesNotExist:
+            stats = BookStats(book=obj)
+        return {
+            'rate_count': stats.rate_count,
+            'rate_histogram': stats.rate_histogram,
+            'readers_count': stats.readers_count,
+            'likes_count': stats.likes_count,
+            'reviews_count': stats.reviews_count,
+        }
 
     user_rate = serializers.SerializerMethodField()
     def get_user_rate(self, obj):
-        try:
-            user = self.context['request'].user
-            rate = PersonRate.objects.get(user=user, book=obj).person_rate
-            return float(rate)
-        except:
-            return None
+        return ViewerContext.from_context(self.context).rate(obj)
 
     is_readed = serializers.SerializerMethodField()
     def get_is_readed(self, obj):
-        # Check if book's in readed_books many to many field
-        try:
-            user = self.context['request'].user
-            user.userprofile.readed_books.get(id=obj.id)
-            return True
-        except:
-            return False
+        return ViewerContext.from_context(self.context).has_read(obj)
+
     is_read_later = serializers.SerializerMethodField()
     def get_is_read_later(self, obj):
-        try:
-            user = self.context['request'].user
-            user.userprofile.read_later_books.get(id=obj.id)
-            return True
-        except:
-            return False
+        return ViewerContext.from_context(self.context).has_read_later(obj)
 
     date_readed = serializers.SerializerMethodField()
     def get_date_readed(self, obj):
-        try:
-            user = self.context['request'].user
-            readed_book = Readers.objects.get(user=user, book=obj)
-            jdate = jdatetime.datetime.fromgregorian(date=readed_book.date_readed.date())
-            return jdate.strftime('%Y-%m-%d')
-        except:
+        date_readed = ViewerContext.from_context(self.context).date_readed(obj)
+        if date_readed is None:
             return None
+        jdate = jdatetime.datetime.fromgregorian(date=date_readed.date())
+        return jdate.strftime('%Y-%m-%d')
 
     class Meta:
         model = Book
@@ -172,6 +169,7 @@ class BookSerializer(serializers.ModelSerializer):
             'cover_type',
             'size',
             'rate',
+            'stats',
             'user_rate',
             'is_readed',
             'is_read_later',
@@ -213,6 +211,20 @@ class ReviewDetailSerializer(serializers.ModelSerializer):
         return instance
 
 
+class MinBookListSerializer(serializers.ListSerializer):
+    """
+    Renders a whole page of MinBookSerializer with a fixed number of queries.
+    Authors are prefetched and the rates of both the viewer and the page
+    user are loaded for every book of the page at once.
+    """
+    def to_representation(self, data):
+        books = list(data.all() if isinstance(data, models.Manager) else data)
+        prefetch_related_objects(books, 'authors')
+        ViewerContext.from_context(self.context).load(books)
+        ViewerContext.from_context(self.context, key='page_viewer', user_key='page_user').load(books)
+        return super().to_representation(books)
+
+
 class MinBookSerializer(serializers.ModelSerializer):
     """Min Book Serializer is Book Serializer with less fields."""
     cover = serializers.SerializerMethodField()
@@ -227,13 +239,12 @@ class MinBookSerializer(serializers.ModelSerializer):
 
     rate = serializers.SerializerMethodField()
     def get_rate(self, obj):
-        try:
-            user = self.context['page_user']
-            rate = PersonRate.objects.get(user=user, book=obj).person_rate
-            return float(rate)
-        except:
-            pass
-        return 0.0
+        page_viewer = ViewerContext.from_context(self.context, key='page_viewer', user_key='page_user')
+        rate = page_viewer.rate(obj)
+        return rate if rate is not None else 0.0
+
+    # Average of all users, `rate` is the one of the page user.
+    average_rate = serializers.FloatField(source='rate', read_only=True)
 
     authors = serializers.SerializerMethodField()
     def get_authors(self, obj):
@@ -241,13 +252,9 @@ class MinBookSerializer(serializers.ModelSerializer):
 
     user_rate = serializers.SerializerMethodField()
     def get_user_rate(self, obj):
-        try:
-            user = self.context['request'].user
-            rate = PersonRate.objects.get(user=user, book=obj).person_rate
-            return float(rate)
-        except:
-            return None
+        return ViewerContext.from_context(self.context).rate(obj)
 
     class Meta:
         model = Book
-        fields = ('id', 'title', 'authors', 'rate', 'user_rate', 'cover', 'slug',)
+        fields = ('id', 'title', 'authors', 'rate', 'average_rate', 'user_rate', 'cover', 'slug',)
+        list_serializer_class = MinBookListSerializer
@@ -0,0 +1,113 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from core.models import Book, Author, Translator, Publisher, FacetCount
+from book import search, autocomplete
+
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, **kwargs):
+    search.index_books([instance])
+
+
+@receiver(post_delete, sender=Book)
+def remove_deleted_book(sender, instance, **kwargs):
+    search.remove_books([instance])
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.translators.through)
+def index_book_people(sender, instance, action, reverse, pk_set, **kwargs):
+    """ Reindex books whose authors or translators changed, from either side. """
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            search.index_books([instance])
+    elif action == 'pre_clear':
+        instance._search_books = list(instance.books.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        search.index_books(getattr(instance, '_search_books', []))
+    elif action in ('post_add', 'post_remove'):
+        search.index_books(pk_set)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Translator)
+@receiver(post_save, sender=Publisher)
+def index_renamed_books(sender, instance, created, **kwargs):
+    if not created:
+        search.index_books(instance.books.values_list('pk', flat=True))
+
+
+@receiver(pre_save, sender=Book)
+def remember_facets(sender, instance, **kwargs):
+    old = Book.objects.filter(pk=instance.pk).first() if instance.pk else None
+    instance._facet_values = FacetCount.book_values(old) if old else set()
+
+
+@receiver(post_save, sender=Book)
+def count_saved_facets(sender, instance, **kwargs):
+    old = getattr(instance, '_facet_values', set())
+    new = FacetCount.book_values(instance)
+    FacetCount.change(old - new, -1)
+    FacetCount.change(new - old, 1)
+    instance._facet_values = new
+
+
+@receiver(pre_delete, sender=Book)
+def remember_deleted_facets(sender, instance, **kwargs):
+    instance._facet_values = FacetCount.book_values(instance) | {
+        (FacetCount.AUTHOR, str(pk)) for pk in instance.authors.values_list('pk', flat=True)
+    } | {
+        (FacetCount.TRANSLATOR, str(pk)) for pk in instance.translators.values_list('pk', flat=True)
+    }
+
+
+@receiver(post_delete, sender=Book)
+def count_deleted_facets(sender, instance, **kwargs):
+    FacetCount.change(getattr(instance, '_facet_values', set()), -1)
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.translators.through)
+def count_people_facets(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Count books of authors and translators. Removed and cleared rows are
+    looked up before the change since pk_set may hold ids that were not
+    related at all.
+    """
+    dimension = FacetCount.AUTHOR if sender is Book.authors.through else FacetCount.TRANSLATOR
+    person = f'{dimension}_id'
+    rows = sender.objects.filter(**{person: instance.pk} if reverse else {'book_id': instance.pk})
+    if action in ('pre_remove', 'pre_clear'):
+        if pk_set is not None:
+            rows = rows.filter(**{'book_id__in' if reverse else f'{person}__in': pk_set})
+        instance._facet_people = list(rows.values_list(person, flat=True))
+    elif action in ('post_remove', 'post_clear'):
+        removed = getattr(instance, '_facet_people', [])
+        for pk in set(removed):
+            FacetCount.change([(dimension, str(pk))], -removed.count(pk))
+    elif action == 'post_add':
+        if reverse:
+            FacetCount.change([(dimension, str(instance.pk))], len(pk_set))
+        else:
+            FacetCount.change({(dimension, str(pk)) for pk in pk_set}, 1)
+
+
+@receiver(post_save, sender=Book)
+def autocomplete_saved_book(sender, instance, **kwargs):
+    autocomplete.index.put_book(instance)
+
+
+@receiver(post_delete, sender=Book)
+def autocomplete_deleted_book(sender, instance, **kwargs):
+    autocomplete.index.remove(instance.pk)
+
+
+@receiver(post_save, sender=Author)
+def autocomplete_saved_author(sender, instance, **kwargs):
+    autocomplete.index.put_author(instance)
+
+
+@receiver(post_delete, sender=Author)
+def autocomplete_deleted_author(sender, instance, **kwargs):
+    autocomplete.index.remove(-instance.pk)
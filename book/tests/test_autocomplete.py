@@ -0,0 +1,92 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Book, Author
+from book import autocomplete
+
+
+class AutocompleteTest(TestCase):
+    """Test the autocomplete prefix index"""
+
+    def setUp(self):
+        autocomplete.index = autocomplete.AutocompleteIndex()
+        self.book = Book.objects.create(title='بوف کور')
+        Book.objects.create(title='The Great Gatsby')
+        Book.objects.create(title='Great Expectations')
+        self.author = Author.objects.create(name='صادق هدایت')
+        self.client = APIClient()
+
+    def tearDown(self):
+        autocomplete.index = autocomplete.AutocompleteIndex()
+
+    def texts(self, query, k=10):
+        return [item['text'] for item in autocomplete.index.suggest(query, k)]
+
+    def test_prefix(self):
+        """Test titles and authors complete from the start of any of their first words"""
+        self.assertEqual(self.texts('بو'), ['بوف کور'])
+        self.assertEqual(self.texts('کو'), ['بوف کور'])
+        self.assertEqual(self.texts('صادق ه'), ['صادق هدایت'])
+        self.assertEqual(sorted(self.texts('great')), ['Great Expectations', 'The Great Gatsby'])
+        self.assertEqual(self.texts('great', k=1), ['Great Expectations'])
+        self.assertEqual(self.texts('  '), [])
+
+    def test_normalization(self):
+        """Test Arabic characters and case do not matter"""
+        self.assertEqual(self.texts('بوف ك'), ['بوف کور'])
+        self.assertEqual(self.texts('GATS'), ['The Great Gatsby'])
+
+    def test_one_typo(self):
+        """Test one edit away queries still complete, exact ones first"""
+        self.assertEqual(self.texts('gatbsy'), ['The Great Gatsby'])
+        self.assertEqual(self.texts('grat ex'), ['Great Expectations'])
+        self.assertEqual(self.texts('هدیات'), ['صادق هدایت'])
+        self.assertEqual(self.texts('بوق'), ['بوف کور'])
+        self.assertEqual(self.texts('gxxtsby'), [])
+
+    def test_follows_saved_books(self):
+        """Test saving and deleting books updates the loaded index in place"""
+        self.assertEqual(self.texts('شازده'), [])
+        book = Book.objects.create(title='شازده کوچولو')
+        self.assertEqual(self.texts('شازده'), ['شازده کوچولو'])
+        book.title = 'شازده احتجاب'
+        book.save()
+        self.assertEqual(self.texts('شازده'), ['شازده احتجاب'])
+        book.delete()
+        self.assertEqual(self.texts('شازده'), [])
+
+    def test_heaviest_of_large_prefixes(self):
+        """Test short prefixes of many entries still find the heaviest items"""
+        index = autocomplete.AutocompleteIndex()
+        books = [(pk, f'ba{pk:04d}', '', 0) for pk in range(500)] + [(1000, 'bz popular', '', 9)]
+        index.fill(books, [(1, 'bob', 5)])
+        index.loaded_at = float('inf')
+        texts = lambda query, k=3: [item['text'] for item in index.suggest(query, k)]
+        self.assertEqual(texts('b'), ['bz popular', 'bob', 'ba0000'])
+        self.assertEqual(texts('ba01', 2), ['ba0100', 'ba0101'])
+        self.assertIn('b', index.top)
+
+        # Items put or removed in place update the ranked prefixes.
+        index.put(2000, {'type': 'book', 'text': 'bb new', 'slug': '', 'weight': 7}, 'bb new')
+        self.assertEqual(texts('b'), ['bz popular', 'bb new', 'bob'])
+        index.remove(1000)
+        self.assertEqual(texts('b'), ['bb new', 'bob', 'ba0000'])
+
+    def test_failed_reload(self):
+        """Test a failed background reload lets the next request try again"""
+        index = autocomplete.AutocompleteIndex()
+        with mock.patch.object(index, 'load', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                index.reload()
+        self.assertFalse(index.reloading)
+
+    def test_endpoint(self):
+        """Test the autocomplete endpoint"""
+        response = self.client.get(reverse('book:autocomplete'), {'q': 'بوف'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{'type': 'book', 'text': 'بوف کور', 'slug': self.book.slug}])
+        self.assertEqual(self.client.get(reverse('book:autocomplete'), {'q': 'بوف', 'k': 'a'}).status_code, 400)
+        self.assertEqual(len(self.client.get(reverse('book:autocomplete'), {'q': 'great', 'k': '-5'}).data), 1)
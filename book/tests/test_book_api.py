@@ -1,10 +1,12 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase, client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from django.contrib.auth.models import User
 from core.models import (
-    UserProfile, Book, Author, Translator, Publisher, Readers,
-    PersonRate,
+    UserProfile, Book, Author, Translator, Publisher, BookInteraction,
 )
 from book.serializers import BookSerializer
 
@@ -72,4 +74,111 @@ class BookAPIPublic(TestCase):
         self.assertEqual(response.data['rate'], 3)
 
     def test_book_rate_reads(self):
-        pass
\ No newline at end of file
+        pass
+
+class BookDetailQueriesTest(TestCase):
+    """Test book detail costs the same queries however many friends read it"""
+
+    def setUp(self):
+        self.book = Book.objects.create(title='The Great Gatsby', publisher=Publisher.objects.create(name='Penguin'))
+        self.book.authors.add(Author.objects.create(name='F. Scott Fitzgerald'))
+        self.user = User.objects.create_user(username='test')
+        self.user_profile = UserProfile.objects.create(user=self.user)
+        self.user_profile.read_book(self.book)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('book:book_detail', kwargs={'slug': self.book.slug})
+
+    def add_friends(self, count):
+        for i in range(count):
+            friend = UserProfile.objects.create(user=User.objects.create(username=f'friend{i}-{count}'))
+            friend.rate_book(self.book, 4)
+            self.user_profile.follow(friend)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_queries_do_not_grow_with_friends(self):
+        self.add_friends(1)
+        few, _ = self.count_queries()
+        self.add_friends(10)
+        many, response = self.count_queries()
+
+        self.assertEqual(few, many)
+        self.assertEqual(response.data['related_friend_count'], 11)
+        self.assertEqual(len(response.data['three_friends']), 3)
+        self.assertTrue(response.data['is_readed'])
+        self.assertIsNotNone(response.data['date_readed'])
+
+    def test_friends_who_read(self):
+        """Test followed readers come best rates first, with their number, in one query"""
+        self.add_friends(2)
+        stranger = UserProfile.objects.create(user=User.objects.create(username='stranger'))
+        stranger.rate_book(self.book, 5)
+        best = UserProfile.objects.create(user=User.objects.create(username='best'))
+        best.rate_book(self.book, 5)
+        reader = UserProfile.objects.create(user=User.objects.create(username='reader'))
+        reader.read_book(self.book)
+        for profile in (best, reader):
+            self.user_profile.follow(profile)
+        with self.assertNumQueries(1):
+            users = UserProfile.following_readers(self.user, self.book, 3)
+        self.assertEqual([user.username for user in users], ['best', 'friend1-2', 'friend0-2'])
+        self.assertEqual(users[0].readers_count, 4)
+        url = reverse('book:friends_of_book', kwargs={'slug': self.book.slug})
+        response = self.client.get(url, {'n': 10})
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual([(user['username'], user['rate_to_book']) for user in response.data['results']][-1], ('reader', 0))
+        self.assertEqual(self.client.get(url, {'n': 'x'}).status_code, 400)
+        for n in (-1, 0):
+            response = self.client.get(url, {'n': n})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([user['username'] for user in response.data['results']], ['best'])
+
+
+class MinBookListQueriesTest(TestCase):
+    """Test list endpoints render a page in constant queries"""
+
+    def setUp(self):
+        cache.clear()
+        self.publisher = Publisher.objects.create(name='Penguin')
+        self.user = User.objects.create_user(username='test')
+        self.user_profile = UserProfile.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('book:publisher_books', kwargs={'name': self.publisher.name})
+
+    def add_books(self, count):
+        for i in range(count):
+            book = Book.objects.create(title=f'Book {count}-{i}', publisher=self.publisher)
+            book.authors.add(Author.objects.create(name=f'Author {count}-{i}'))
+            self.user_profile.rate_book(book, 3)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_publisher_books_queries(self):
+        self.add_books(2)
+        few, _ = self.count_queries()
+        self.add_books(15)
+        many, response = self.count_queries()
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.data['results']), 17)
+        self.assertEqual(response.data['results'][0]['user_rate'], 3)
+        self.assertEqual(len(response.data['results'][0]['authors']), 1)
+
+    def test_page_user_rates(self):
+        self.add_books(3)
+        url = reverse('profile-books-read-later', kwargs={'username': self.user.username, 'list': 'reads'})
+        # The shelf is counted by the profile counters.
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual([book['rate'] for book in response.data['results']], [3.0] * 3)
@@ -0,0 +1,70 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.models import Book, Author, Translator, Publisher, FacetCount, ImportJob
+from book.dedupe import name_key, merge
+from book.search import search_books
+from book.tests.test_facets import facet_counts
+
+
+class DedupeTest(TestCase):
+    """Test merging spelling variants of people and publishers"""
+
+    def setUp(self):
+        self.author = Author.objects.create(name='علی محمدی')
+        self.variant = Author.objects.create(name='علي محمدي')
+        self.spaced = Author.objects.create(name=' علی  محمدی.')
+        self.other = Author.objects.create(name='علی محمدیان')
+        self.publisher = Publisher.objects.create(name='نشر نی')
+        self.publisher_variant = Publisher.objects.create(name='نشر‌نی')
+        self.books = [Book.objects.create(title=f'Book {i}', publisher=self.publisher_variant) for i in range(4)]
+        self.books[0].authors.add(self.author)
+        self.books[1].authors.add(self.variant, self.spaced)
+        self.books[2].authors.add(self.variant, self.author)
+        self.books[3].authors.add(self.variant, self.other)
+        self.books[0].publisher = self.publisher
+        self.books[0].save()
+
+    def test_name_key(self):
+        self.assertEqual(name_key('علي محمدي'), name_key(' علی  محمدی.'))
+        self.assertEqual(name_key('نشر‌نی'), name_key('نشر نی'))
+        self.assertNotEqual(name_key('علی محمدی'), name_key('علی محمدیان'))
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command('dedupe_catalogue', '--dry-run', stdout=out)
+        self.assertIn('Would merge 2 authors', out.getvalue())
+        self.assertEqual(Author.objects.count(), 4)
+
+    def test_merge(self):
+        """Test books point to the kept row once and indexes follow"""
+        out = StringIO()
+        call_command('dedupe_catalogue', stdout=out)
+        # The variant has the most books and is kept.
+        self.assertEqual(set(Author.objects.values_list('pk', flat=True)), {self.variant.pk, self.other.pk})
+        for book in self.books:
+            self.assertIn(self.variant, book.authors.all())
+        self.assertEqual(Book.authors.through.objects.filter(author=self.variant).count(), 4)
+        self.assertEqual(Publisher.objects.get().pk, self.publisher_variant.pk)
+        self.assertEqual(Book.objects.filter(publisher=self.publisher_variant).count(), 4)
+        self.assertIn('Merged 2 authors, 3 books updated', out.getvalue())
+        self.assertIn('Merged 1 publishers, 1 books updated', out.getvalue())
+
+        counts = facet_counts()
+        FacetCount.rebuild()
+        self.assertEqual(counts, facet_counts())
+        self.assertEqual(len(search_books('نشر نی')), 4)
+
+        call_command('dedupe_catalogue', 'translators', stdout=out)
+        self.assertIn('Merged 0 translators', out.getvalue())
+
+    def test_merge_publisher_details(self):
+        """Test the kept publisher takes the import jobs, visibility and logo of its variants"""
+        Publisher.objects.filter(pk=self.publisher.pk).update(is_show=True, logo='publishers/ney.png')
+        job = ImportJob.objects.create(file='imports/catalogue.xlsx', publisher=self.publisher)
+        merge(Publisher, self.publisher_variant.pk, [self.publisher.pk])
+        publisher = Publisher.objects.get()
+        self.assertEqual((publisher.pk, publisher.is_show, publisher.logo.name), (self.publisher_variant.pk, True, 'publishers/ney.png'))
+        self.assertEqual(ImportJob.objects.get(pk=job.pk).publisher, publisher)
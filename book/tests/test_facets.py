@@ -0,0 +1,141 @@
+from importlib import import_module
+from unittest import mock
+
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Book, Author, Translator, Publisher, Size, UserProfile, FacetCount
+
+
+def facet_counts():
+    return {(obj.dimension, obj.value): obj.count for obj in FacetCount.objects.filter(count__gt=0)}
+
+
+class FacetCountTest(TestCase):
+    """Test facet counts are maintained incrementally"""
+
+    def setUp(self):
+        self.publisher = Publisher.objects.create(name='نی')
+        self.author = Author.objects.create(name='Author')
+        self.translator = Translator.objects.create(name='Translator')
+        self.book = Book.objects.create(title='Book', publisher=self.publisher, language='فارسی', pages=120)
+        self.book.authors.add(self.author)
+        self.book.translators.add(self.translator)
+        Book.objects.create(title='Other', language='فارسی', pages=520, label='new')
+
+    def assertCountsRebuilt(self):
+        counts = facet_counts()
+        FacetCount.rebuild()
+        self.assertEqual(counts, facet_counts())
+
+    def test_incremental_counts(self):
+        """Test saving, relating and deleting books keeps counts exact"""
+        counts = facet_counts()
+        self.assertEqual(counts[(FacetCount.LANGUAGE, 'فارسی')], 2)
+        self.assertEqual(counts[(FacetCount.PAGES, '100-199')], 1)
+        self.assertEqual(counts[(FacetCount.AUTHOR, str(self.author.pk))], 1)
+        self.assertCountsRebuilt()
+
+        self.book.pages = 250
+        self.book.publisher = None
+        self.book.save()
+        self.author.books.add(Book.objects.get(title='Other'))
+        self.book.translators.remove(self.translator, Translator.objects.create(name='Unrelated'))
+        self.assertCountsRebuilt()
+
+        self.author.books.clear()
+        Book.objects.get(title='Other').delete()
+        self.assertCountsRebuilt()
+
+    def test_rate_bucket_follows_rates(self):
+        """Test rating a book moves it to another rate bucket"""
+        profile = UserProfile.objects.create(user=User.objects.create(username='rater'))
+        profile.rate_book(self.book, 4)
+        self.assertEqual(facet_counts()[(FacetCount.RATE, '4')], 1)
+        self.assertCountsRebuilt()
+
+    def test_migration_fills_counts(self):
+        """Test the migration adding the counts computes them for existing books"""
+        counts = facet_counts()
+        FacetCount.objects.all().delete()
+        migration = import_module('core.migrations.0038_facetcount')
+        apps = MigrationLoader(connection).project_state(('core', '0038_facetcount')).apps
+        migration.fill_counts(apps, None)
+        self.assertEqual(facet_counts(), counts)
+        self.assertEqual(counts[(FacetCount.AUTHOR, str(self.author.pk))], 1)
+
+
+class AdvSearchAPITest(TestCase):
+    """Test the faceted advanced search endpoint"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse('book:search_adv')
+        self.publisher = Publisher.objects.create(name='چشمه')
+        self.size = Size.objects.create(name='رقعی')
+        self.author = Author.objects.create(name='هوشنگ گلشیری')
+        for i in range(30):
+            book = Book.objects.create(
+                title=f'شازده احتجاب {i}', publisher=self.publisher if i % 2 else None,
+                size=self.size, pages=100 * (i % 6), language='فارسی',
+            )
+            if i < 5:
+                book.authors.add(self.author)
+        Book.objects.create(title='Other book', language='English', pages=50)
+
+    def facet(self, response, dimension):
+        return {row['value']: row['count'] for row in response.data['facets'][dimension]}
+
+    def test_filters(self):
+        """Test every filter narrows the paginated results"""
+        response = self.client.get(self.url, {'publisher': self.publisher.pk})
+        self.assertEqual(response.data['count'], 15)
+        self.assertEqual(len(response.data['results']), 15)
+        response = self.client.get(self.url, {'author': self.author.pk, 'pages_min': 100})
+        self.assertEqual(response.data['count'], 4)
+        response = self.client.get(self.url, {'language': ['English', 'فارسی'], 'pages_max': 99})
+        self.assertEqual(response.data['count'], 6)
+        response = self.client.get(self.url, {'search': 'احتجاب', 'size': self.size.pk, 'rate_max': 1})
+        self.assertEqual(response.data['count'], 30)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual(self.client.get(self.url, {'pages_min': 'many'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'author': 'x'}).status_code, 400)
+
+    def test_facets_of_results(self):
+        """Test facet counts describe the filtered results"""
+        response = self.client.get(self.url, {'search': 'احتجاب', 'author': self.author.pk})
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(self.facet(response, 'author'), {str(self.author.pk): 5})
+        self.assertEqual(self.facet(response, 'publisher'), {str(self.publisher.pk): 2})
+        self.assertEqual(self.facet(response, 'pages'), {'0-99': 1, '100-199': 1, '200-299': 1, '300-499': 2})
+        self.assertEqual(response.data['facets']['author'][0]['name'], 'هوشنگ گلشیری')
+        self.assertTrue(response.data['facets_complete'])
+
+    def test_facets_of_large_results(self):
+        """Test a result larger than the scan limit is faceted by its first books only"""
+        with mock.patch('book.facets.FACET_SCAN_LIMIT', 10):
+            response = self.client.get(self.url, {'language': 'فارسی'})
+            self.assertEqual(response.data['count'], 30)
+            self.assertEqual(self.facet(response, 'language'), {'فارسی': 10})
+            self.assertFalse(response.data['facets_complete'])
+            response = self.client.get(self.url, {'search': 'احتجاب'})
+            self.assertEqual(self.facet(response, 'size'), {str(self.size.pk): 10})
+            self.assertFalse(response.data['facets_complete'])
+            self.assertTrue(self.client.get(self.url).data['facets_complete'])
+
+    def test_catalogue_facets_are_precomputed(self):
+        """Test the unfiltered facets are read from FacetCount, not grouped over books"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 31)
+        self.assertEqual(self.facet(response, 'language'), {'فارسی': 30, 'English': 1})
+        self.assertEqual(self.facet(response, 'size'), {str(self.size.pk): 30})
+        grouped = [query['sql'] for query in queries if 'GROUP BY' in query['sql']]
+        self.assertEqual(grouped, [])
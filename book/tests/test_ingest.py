@@ -0,0 +1,94 @@
+from io import BytesIO
+
+import shutil
+import tempfile
+
+from PIL import Image
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Book, Author, Translator, Publisher, Size, BookRawData, FacetCount
+from book import autocomplete
+from book.ingest import CatalogueWriter
+from book.search import search_books
+from book.tests.test_facets import facet_counts
+
+
+class CatalogueWriterTest(TestCase):
+    """Test books written in batches"""
+
+    def setUp(self):
+        self.publisher = Publisher.objects.create(name='نی')
+        self.author = Author.objects.create(name='صادق هدایت')
+        autocomplete.index.fill([], [])
+
+    def records(self, count, start=0):
+        return [{
+            'title': f'کتاب {i}',
+            'authors': ['صادق هدایت', f'Author {i % 3}'],
+            'translators': 'Translator' if i % 2 else None,
+            'publisher': 'نی' if i % 2 else 'چشمه',
+            'size': 'رقعی',
+            'pages': str(50 * i),
+            'isbn': f'978{i}',
+        } for i in range(start, start + count)]
+
+    def test_write(self):
+        """Test books, people and relations are created once and looked up by name"""
+        with CatalogueWriter() as writer:
+            books = [writer.add(record) for record in self.records(6)]
+        self.assertEqual(writer.written, 6)
+        self.assertTrue(all(book.pk and book.slug for book in books))
+        self.assertEqual(Author.objects.filter(name='صادق هدایت').count(), 1)
+        self.assertEqual(Author.objects.count(), 4)
+        self.assertEqual(Translator.objects.count(), 1)
+        self.assertEqual(Size.objects.count(), 1)
+        book = Book.objects.get(title='کتاب 3')
+        self.assertEqual(sorted(book.authors.values_list('name', flat=True)), ['Author 0', 'صادق هدایت'])
+        self.assertEqual(book.publisher, self.publisher)
+        self.assertEqual((book.pages, book.isbn, book.size.name), (150, '9783', 'رقعی'))
+        self.assertEqual(self.author.books.count(), 6)
+
+    def test_queries_per_batch(self):
+        """Test the queries of a batch don't grow with its size"""
+        with CaptureQueriesContext(connection) as small:
+            with CatalogueWriter() as writer:
+                for record in self.records(5):
+                    writer.add(record)
+        with CaptureQueriesContext(connection) as large:
+            with CatalogueWriter() as writer:
+                for record in self.records(100, start=5):
+                    writer.add(record)
+        self.assertLess(len(small), 30)
+        self.assertLessEqual(len(large), len(small))
+
+    def test_indexes_updated(self):
+        """Test search, facet counts and autocomplete see the new books"""
+        with CatalogueWriter(batch_size=4) as writer:
+            for record in self.records(10):
+                writer.add(record)
+        self.assertEqual(len(search_books('کتاب')), 10)
+        self.assertEqual(len(search_books('Translator')), 5)
+        counts = facet_counts()
+        FacetCount.rebuild()
+        self.assertEqual(counts, facet_counts())
+        self.assertEqual(counts[(FacetCount.AUTHOR, str(self.author.pk))], 10)
+        suggestions = autocomplete.index.suggest('کتاب', k=20)
+        self.assertEqual(len([item for item in suggestions if item['type'] == 'book']), 10)
+
+    def test_cover_and_raw_records(self):
+        """Test covers are stored resized and raw records are queued"""
+        image = BytesIO()
+        Image.new('RGB', (600, 900)).save(image, 'JPEG')
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        with override_settings(MEDIA_ROOT=media):
+            with CatalogueWriter() as writer:
+                book = writer.add({'title': 'Cover', 'cover': ('1.jpg', image.getvalue())})
+                writer.add({'title': 'Waiting', 'cover': ''})
+                writer.add_raw({'RAW': ['record']})
+            book.refresh_from_db()
+            self.assertEqual(book.cover.height, 300)
+        self.assertEqual(Book.objects.filter(cover='').get().title, 'Waiting')
+        self.assertEqual(BookRawData.objects.get().data, {'RAW': ['record']})
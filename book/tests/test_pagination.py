@@ -0,0 +1,69 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Book, Publisher, Review, UserProfile
+
+
+class CursorPaginationTest(TestCase):
+    """Test the opt-in keyset pages of the list endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.publisher = Publisher.objects.create(name='Penguin')
+        self.book = Book.objects.create(title='Book', publisher=self.publisher)
+        now = timezone.now()
+        for i in range(7):
+            # Same dates in pairs, the id breaks the tie.
+            Book.objects.create(title=f'Book {i}', publisher=self.publisher, date_created=now - timezone.timedelta(days=i // 2))
+        self.me = UserProfile.objects.create(user=User.objects.create(username='me'))
+        for i in range(5):
+            profile = UserProfile.objects.create(user=User.objects.create(username=f'reader{i}'))
+            profile.read_book(self.book)
+            Review.objects.create(user=profile.user, book=self.book, text=f'Review {i}', date_created=now)
+            self.me.follow(profile)
+
+    def walk(self, url, key, page_size=3):
+        """ Follow every `next` link, returns the keys of the rows and the queries of each page. """
+        response = self.client.get(url, {'cursor': '', 'page_size': page_size})
+        keys, queries = [], []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            keys += [row[key] for row in response.data['results']]
+            if not response.data['next']:
+                return keys, queries
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(response.data['next'])
+            queries.append([query['sql'] for query in captured])
+
+    def test_publisher_books(self):
+        """Test pages walk every book once, newest first, and cost the same"""
+        url = reverse('book:publisher_books', kwargs={'name': self.publisher.name})
+        titles, queries = self.walk(url, 'title')
+        expected = list(Book.objects.order_by('-date_created', '-pk').values_list('title', flat=True))
+        self.assertEqual(titles, expected)
+        self.assertEqual(len({len(page) for page in queries[:-1]}), 1)
+        self.assertFalse(any('OFFSET' in sql or 'COUNT(*)' in sql for page in queries for sql in page))
+        # Page numbers stay the default.
+        self.assertEqual(self.client.get(url).data['count'], 8)
+
+    def test_reviews_readers_and_followings(self):
+        """Test the other endpoints opting in"""
+        slug = self.book.slug
+        texts, _ = self.walk(reverse('book:reviews', kwargs={'slug': slug}), 'text', 2)
+        self.assertEqual(texts, [f'Review {i}' for i in reversed(range(5))])
+        readers, _ = self.walk(reverse('book:readers_of_book', kwargs={'slug': slug}), 'username', 2)
+        self.assertEqual(readers, [f'reader{i}' for i in reversed(range(5))])
+        self.client.force_authenticate(self.me.user)
+        followings, _ = self.walk(reverse('profile-followings', kwargs={'username': 'me'}), 'username', 2)
+        self.assertEqual(followings, [f'reader{i}' for i in reversed(range(5))])
+
+    def test_invalid_cursor(self):
+        """Test a cursor that doesn't decode is rejected"""
+        url = reverse('book:publisher_books', kwargs={'name': self.publisher.name})
+        self.assertEqual(self.client.get(url, {'cursor': 'nonsense'}).status_code, 404)
@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Book, Author, Translator, Publisher
+from book.search import search_books, match_expression
+
+
+class BookSearchTest(TestCase):
+    """Test the full-text book search"""
+
+    def setUp(self):
+        cache.clear()
+        self.publisher = Publisher.objects.create(name='ققنوس')
+        self.author = Author.objects.create(name='صادق هدایت')
+        self.translator = Translator.objects.create(name='John Doe')
+        self.book = Book.objects.create(
+            title='بوف کور', subtitle='رمان', isbn='978-964-311-123-4', publisher=self.publisher,
+        )
+        self.book.authors.add(self.author)
+        self.book.translators.add(self.translator)
+        self.other = Book.objects.create(title='سه قطره خون', subtitle='داستان‌های کوتاه بوف')
+        self.client = APIClient()
+
+    def titles(self, query):
+        return [book.title for book in search_books(query)[:20]]
+
+    def test_indexed_fields(self):
+        """Test books are found by title, people, publisher and ISBN"""
+        self.assertEqual(self.titles('هدایت'), ['بوف کور'])
+        self.assertEqual(self.titles('john'), ['بوف کور'])
+        self.assertEqual(self.titles('ققنوس'), ['بوف کور'])
+        self.assertEqual(self.titles('9789643111234'), ['بوف کور'])
+        self.assertEqual(self.titles('978-964-311-123-4'), ['بوف کور'])
+        self.assertEqual(self.titles('ناموجود'), [])
+
+    def test_persian_normalization(self):
+        """Test Arabic yeh/kaf, ZWNJ and diacritics match the Persian text"""
+        self.assertEqual(self.titles('بوف كور'), ['بوف کور'])
+        self.assertEqual(self.titles('بُوفِ'), ['بوف کور', 'سه قطره خون'])
+        self.assertEqual(self.titles('داستان های'), ['سه قطره خون'])
+        self.assertEqual(self.titles('صادق هدايت'), ['بوف کور'])
+
+    def test_title_ranks_first_and_prefix(self):
+        """Test title matches rank above subtitle matches and the last word is a prefix"""
+        self.assertEqual(self.titles('بو'), ['بوف کور', 'سه قطره خون'])
+        self.assertIsNone(match_expression('  ...  '))
+
+    def test_index_follows_changes(self):
+        """Test the index is updated when books, people and publishers change"""
+        author = Author.objects.create(name='Kafka')
+        self.other.authors.add(author)
+        self.assertEqual(self.titles('kafka'), ['سه قطره خون'])
+        author.books.clear()
+        self.assertEqual(self.titles('kafka'), [])
+        self.publisher.name = 'نشر چشمه'
+        self.publisher.save()
+        self.assertEqual(self.titles('چشمه'), ['بوف کور'])
+        self.book.delete()
+        self.assertEqual(self.titles('چشمه'), [])
+
+    def test_search_api_is_paginated(self):
+        """Test the search endpoint returns a ranked page"""
+        for i in range(25):
+            Book.objects.create(title=f'بوف {i}')
+        response = self.client.get(reverse('book:search'), {'search': 'بوف'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 27)
+        self.assertEqual(len(response.data['results']), 20)
+        response = self.client.get(reverse('book:search'), {'search': 'بوف', 'page': 2})
+        self.assertEqual(len(response.data['results']), 7)
+        self.assertEqual(self.client.get(reverse('book:search')).status_code, 400)
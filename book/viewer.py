@@ -0,0 +1,90 @@
+from django.contrib.auth.models import User
+
+from core.models import BookInteraction, UserProfile
+
+
+class ViewerContext:
+    """
+    Everything the requesting user has done with a batch of books.
+
+    Serializers used to ask the database once per field and per book
+    (is it read? rated? in read later?). Instead books of a page are
+    registered with load() and the first lookup fetches the viewer's
+    BookInteraction rows for all of them with a single query.
+    A context lives for one request.
+    """
+
+    def __init__(self, user=None):
+        if user is not None and not user.is_authenticated:
+            user = None
+        self.user = user
+        self.books = set()
+        self.fetched = set()
+        self.interactions = {}
+        self.friends = {}
+
+    @classmethod
+    def from_context(cls, context, key='viewer', user_key='request'):
+        """
+        Return the context stored in serializer context under `key`,
+        building it from `request.user` (or `page_user`) the first time.
+        """
+        viewer = context.get(key)
+        if viewer is None:
+            user = context.get(user_key)
+            if user_key == 'request':
+                user = getattr(user, 'user', None)
+            viewer = cls(user if isinstance(user, User) else None)
+            context[key] = viewer
+        return viewer
+
+    def load(self, books):
+        """
+        Register `books` (instances or ids) to be fetched together.
+        """
+        for book in books:
+            self.books.add(getattr(book, 'pk', book))
+        return self
+
+    def interaction(self, book):
+        """ The viewer's BookInteraction with `book` (instance or id), or None. """
+        pk = getattr(book, 'pk', book)
+        self.books.add(pk)
+        ids = self.books - self.fetched
+        if ids:
+            self.fetched |= ids
+            if self.user is not None:
+                for obj in BookInteraction.objects.filter(user=self.user, book_id__in=ids):
+                    self.interactions[obj.book_id] = obj
+        return self.interactions.get(pk)
+
+    def has_read(self, book):
+        interaction = self.interaction(book)
+        return interaction is not None and interaction.is_read
+
+    def has_read_later(self, book):
+        interaction = self.interaction(book)
+        return interaction is not None and interaction.is_read_later
+
+    def date_readed(self, book):
+        interaction = self.interaction(book)
+        return interaction.date_readed if interaction is not None and interaction.is_read else None
+
+    def rate(self, book):
+        interaction = self.interaction(book)
+        if interaction is None or interaction.rate is None:
+            return None
+        return float(interaction.rate)
+
+    def friends_who_read(self, book, limit=3):
+        """
+        The number of followed users who have read `book` and the first
+        `limit` of them, with their profile and their rate of the book,
+        in a single query (see UserProfile.following_readers).
+        """
+        if self.user is None:
+            return 0, []
+        if book.pk not in self.friends:
+            users = UserProfile.following_readers(self.user, book, limit)
+            self.friends[book.pk] = (users[0].readers_count if users else 0, users)
+        return self.friends[book.pk]
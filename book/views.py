@@ -8,13 +8,15 @@ from rest_framework.views import APIView
 from rest_framework.exceptions import ValidationError
 from rest_framework import filters
 
-from django.db.models import Q
+from django.db.models import Q, F
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.auth.models import User
 
 from book.paginations import SmallPagesPagination
+from book.search import search_books
+from book import facets, autocomplete
 from book import permissions as book_permissions
 from book import serializers
 from core.models import *
@@ -33,7 +35,8 @@ class BookViewSet(APIView):
         """
         Return a book instance.
         """
-        book = get_object_or_404(Book, slug=slug)
+        books = Book.objects.select_related('publisher', 'cover_type', 'size', 'stats').prefetch_related('authors', 'translators')
+        book = get_object_or_404(books, slug=slug)
         serializer = BookSerializer(book, context={'request': self.request})
         return Response(serializer.data)
 
@@ -47,12 +50,10 @@ class BookViewSet(APIView):
 
         if action == 'read':
             user.userprofile.read_book(book)
-            print(user.userprofile.readed_books.all())
             return Response(status=status.HTTP_200_OK, data={"message": "به لیست اضافه شد"})
 
         elif action == 'unread':
             user.userprofile.unread_book(book)
-            print(user.userprofile.readed_books.all())
             return Response(status=status.HTTP_200_OK , data={"message": "از لیست حذف شد"})
 
         elif action == 'report':
@@ -63,22 +64,18 @@ class BookViewSet(APIView):
             if user.userprofile.favorite_books.count() == 3:
                 raise ValidationError(_('You can only have up to 3 favorite books.'))
             user.userprofile.add_favorite_book(book)
-            print(user.userprofile.favorite_books.all())
             return Response(status=status.HTTP_200_OK, data={"message": "به لیست اضافه شد"})
 
         elif action == 'unfavorite':
             user.userprofile.remove_favorite_book(book)
-            print(user.userprofile.favorite_books.all())
             return Response(status=status.HTTP_200_OK , data={"message": "از لیست حذف شد"})
 
         elif action == 'add_read_later_book':
             user.userprofile.add_read_later_book(book)
-            print(user.userprofile.read_later_books.all())
             return Response(status=status.HTTP_200_OK, data={"message": "به لیست اضافه شد"})
 
         elif action == 'remove_read_later_book':
             user.userprofile.remove_read_later_book(book)
-            print(user.userprofile.read_later_books.all())
             return Response(status=status.HTTP_200_OK, data={"message": "از لیست حذف شد"})
 
         elif action == 'rate_book':
@@ -90,18 +87,14 @@ class BookViewSet(APIView):
                 }
                 raise ValidationError(error_dict)
             user.userprofile.rate_book(book, rate)
-            print(user.userprofile.rated_books.all())
-            print(rate)
             return Response(status=status.HTTP_200_OK, data={"message": "انجام شد"})
 
         elif action == 'like_book':
             user.userprofile.like_book(book)
-            print(user.userprofile.liked_books.all())
             return Response(status=status.HTTP_200_OK, data={"message": "انجام شد"})
 
         elif action == 'unlike_book':
             user.userprofile.unlike_book(book)
-            print(user.userprofile.liked_books.all())
             return Response(status=status.HTTP_200_OK, data={"message": "انجام شد"})
         
         elif action == 'change_date':
@@ -171,6 +164,7 @@ class BookReviewViewSet(generics.ListAPIView):
     # for further development in future remove this filter
     queryset = Review.objects.all().filter(user__userprofile__is_invited=True)
     pagination_class = SmallPagesPagination
+    cursor_fields = ('date_created', 'pk')
     ALLOWED_METHODS = ('GET', 'POST')
 
     def get(self, request, slug):
@@ -260,43 +254,67 @@ class SearchViewSet(generics.ListAPIView):
     queryset = Book.objects.all()
     permission_classes = (book_permissions.IsAuthenticatedOrReadOnly,)
     authentication_classes = (TokenAuthentication,)
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['title']
+    pagination_class = SmallPagesPagination
     Method_Allowed = ['GET']
 
     def get(self, request):
-        # Return all books
+        # Return a page of books ranked by relevance
         query = request.GET.get('search')
         if query:
-            # books = Book.objects.filter(title__icontains=query)[:10]
-            books = Book.objects.filter(Q(title__icontains=query) | Q(title__startswith=query))
-            serializer = MinBookSerializer(books, many=True)
-            return Response(serializer.data)
+            page = self.paginate_queryset(search_books(query))
+            serializer = MinBookSerializer(page, many=True, context=self.get_serializer_context())
+            return self.get_paginated_response(serializer.data)
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST, data={'error': 'درخواست نامعتبر است'})
 
 
 class AdvSearchViewSet(generics.ListAPIView):
     """
-    API endpoint that list Search results.
+    API endpoint that list Search results filtered by author, translator,
+    publisher, size, cover type, language, label, pages and rate, with
+    facet counts of each filter.
     """
     queryset = Book.objects.all()
     permission_classes = (book_permissions.IsAuthenticatedOrReadOnly,)
     authentication_classes = (TokenAuthentication,)
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['title']
+    pagination_class = SmallPagesPagination
     Method_Allowed = ['GET']
 
     def get(self, request):
-        # Return all books
-        query = request.GET.get('search')
+        query = request.GET.get('search', '').strip()
+        filters = facets.parse_filters(request.GET)
         if query:
-            # books = Book.objects.filter(title__icontains=query)[:10]
-            books = Book.objects.filter(Q(title__icontains=query) | Q(title__startswith=query))
-            serializer = MinBookSerializer(books, many=True)
-            return Response(serializer.data)
+            results = search_books(query)
+            if filters:
+                results = results.within(facets.filter_books(Book.objects.all(), filters))
+            page = self.paginate_queryset(results)
+            facet_counts = facets.result_facets(Book.objects.filter(pk__in=results.ids()[:facets.FACET_SCAN_LIMIT]))
         else:
-            return Response(status=status.HTTP_400_BAD_REQUEST, data={'error': 'درخواست نامعتبر است'})
+            books = facets.filter_books(Book.objects.all(), filters).order_by('-pk')
+            page = self.paginate_queryset(books)
+            facet_counts = facets.result_facets(books) if filters else facets.catalogue_facets()
+        serializer = MinBookSerializer(page, many=True, context=self.get_serializer_context())
+        response = self.get_paginated_response(serializer.data)
+        response.data['facets'] = facet_counts
+        # False when the facets count a sample of the results, see facets.FACET_SCAN_LIMIT.
+        response.data['facets_complete'] = not (query or filters) or response.data['count'] <= facets.FACET_SCAN_LIMIT
+        return response
+
+
+class AutocompleteView(APIView):
+    """
+    API endpoint that suggest book titles and authors while typing.
+    """
+    permission_classes = (book_permissions.IsAuthenticatedOrReadOnly,)
+    authentication_classes = (TokenAuthentication,)
+
+    def get(self, request):
+        query = request.GET.get('q', '')
+        try:
+            k = max(1, min(int(request.GET.get('k', 10)), autocomplete.TOP_K))
+        except ValueError:
+            raise ValidationError({'error': _('k must be a number')})
+        return Response(autocomplete.index.suggest(query, k))
 
 
 class ReadersOfBook(generics.ListAPIView):
@@ -308,12 +326,14 @@ class ReadersOfBook(generics.ListAPIView):
     authentication_classes = (TokenAuthentication,)
     queryset = User.objects.all()
     pagination_class = SmallPagesPagination
+    # Most recent readers first.
+    cursor_fields = ('date_readed', 'pk')
     ALLOWED_METHODS = ('GET',)
 
     def get(self, request, slug):
         # Return all readers of a book
         book = get_object_or_404(Book, slug=slug)
-        readers = book.user_readers.all()
+        readers = book.user_readers.annotate(date_readed=F('book_interactions__date_readed'))
         serializer = UserForBookSerializer(readers, many=True, context={'book': book})
         # paginate
         page = self.paginate_queryset(readers)
@@ -322,6 +342,26 @@ class ReadersOfBook(generics.ListAPIView):
             return self.get_paginated_response(serializer.data)
 
 
+class FriendsOfBook(APIView):
+    """
+    API endpoint that list the followed users who read a book, best
+    rates first, with the number of them. `n` of them, at most 50.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = (TokenAuthentication,)
+    max_results = 50
+
+    def get(self, request, slug):
+        book = get_object_or_404(Book, slug=slug)
+        try:
+            limit = max(1, min(int(request.GET.get('n', 3)), self.max_results))
+        except ValueError:
+            raise ValidationError({'error': _('n must be a number')})
+        users = UserProfile.following_readers(request.user, book, limit)
+        serializer = UserForBookSerializer(users, many=True, context={'book': book})
+        return Response({'count': users[0].readers_count if users else 0, 'results': serializer.data})
+
+
 class PublisherBooks(generics.ListAPIView):
     """
     API endpoint that list books of a publisher.
@@ -329,6 +369,7 @@ class PublisherBooks(generics.ListAPIView):
     serializer_class = MinBookSerializer
     queryset = Book.objects.all()
     pagination_class = SmallPagesPagination
+    cursor_fields = ('date_created', 'pk')
     ALLOWED_METHODS = ('GET',)
 
     def get(self, request, name):
@@ -337,7 +378,7 @@ class PublisherBooks(generics.ListAPIView):
         books = Book.objects.filter(publisher=publisher)
         page = self.paginate_queryset(books)
         if page is not None:
-            serializer = self.serializer_class(page, many=True,)
+            serializer = self.serializer_class(page, many=True, context=self.get_serializer_context())
             return self.get_paginated_response(serializer.data)
 
 
@@ -356,5 +397,5 @@ class CategoryBooks(generics.ListAPIView):
         books = publisher.books.all()
         page = self.paginate_queryset(books)
         if page is not None:
-            serializer = self.serializer_class(page, many=True,)
+            serializer = self.serializer_class(page, many=True, context=self.get_serializer_context())
             return self.get_paginated_response(serializer.data)
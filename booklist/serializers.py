@@ -1,9 +1,25 @@
-from django.http import request
 from rest_framework import serializers
 from django.conf import settings
+from django.db import models
+from django.db.models import prefetch_related_objects
 
 from core.models import BookList, Book
 from book.serializers import MinBookSerializer
+from book.viewer import ViewerContext
+
+
+class BookListListSerializer(serializers.ListSerializer):
+    """
+    Prefetches owners and books of every list on the page, so nested
+    MinBookSerializer lists don't query per list.
+    """
+    def to_representation(self, data):
+        book_lists = list(data.all() if isinstance(data, models.Manager) else data)
+        prefetch_related_objects(book_lists, 'user__userprofile', 'books__authors')
+        books = [book for book_list in book_lists for book in book_list.books.all()]
+        ViewerContext.from_context(self.context).load(books)
+        return super().to_representation(book_lists)
+
 
 class BookListSerializer(serializers.ModelSerializer):
     """Serializer for BookList objects"""
@@ -18,7 +34,7 @@ class BookListSerializer(serializers.ModelSerializer):
     books = serializers.SerializerMethodField()
     def get_books(self, obj):
         """Get books from BookList"""
-        return MinBookSerializer(obj.books.all(), many=True, context={'request': request}).data
+        return MinBookSerializer(obj.books.all(), many=True, context=self.context).data
     # books = serializers.PrimaryKeyRelatedField(many=True, queryset=Book.objects.all())
     
     # Show date_created field as Y.M.D
@@ -27,6 +43,7 @@ class BookListSerializer(serializers.ModelSerializer):
         model = BookList
         fields = '__all__'
         read_only_fields = ('id', 'user', 'date_created', 'is_active', 'slug')
+        list_serializer_class = BookListListSerializer
 
 
     def update(self, instance, validated_data):
@@ -1,11 +1,10 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from core.models import *
 
 
 admin.site.register(CategoryPosts)
 admin.site.register(UserProfile)
 admin.site.register(Author)
-admin.site.register(BookList)
 admin.site.register(Publisher)
 admin.site.register(Translator)
 admin.site.register(Review)
@@ -14,10 +13,59 @@ class BookAdmin(admin.ModelAdmin):
     list_display = ('title', 'publisher', 'cover_type', 'size')
     list_filter = ('publisher', 'cover_type', 'size', 'authors__name', 'translators__name')
     search_fields = ('title', 'publisher', 'cover_type', 'size', 'authors__name', 'translators__name')
-    readonly_fields = ('user_liked', 'user_readers', 'reviews', 'raw_data', 'slug', 'date_created',)
+    readonly_fields = ('reviews', 'raw_data', 'slug', 'date_created',)
 admin.site.register(Size)
 admin.site.register(CoverType)
 admin.site.register(About)
 admin.site.register(Report)
 admin.site.register(ReportBook)
 admin.site.register(Baners)
+
+@admin.register(BookInteraction)
+class BookInteractionAdmin(admin.ModelAdmin):
+    list_display = ('user', 'book', 'is_read', 'is_liked', 'is_favorite', 'is_read_later', 'rate')
+    list_filter = ('is_read', 'is_liked', 'is_favorite', 'is_read_later')
+    raw_id_fields = ('user', 'book')
+
+@admin.register(BookStats)
+class BookStatsAdmin(admin.ModelAdmin):
+    list_display = ('book', 'rate_count', 'readers_count', 'likes_count', 'reviews_count')
+    readonly_fields = [field.name for field in BookStats._meta.fields]
+
+@admin.register(Activity)
+class ActivityAdmin(admin.ModelAdmin):
+    list_display = ('user', 'verb', 'book', 'fanned_out', 'date_created')
+    list_filter = ('verb', 'fanned_out')
+    raw_id_fields = ('user', 'book', 'review')
+
+@admin.register(CrawlURL)
+class CrawlURLAdmin(admin.ModelAdmin):
+    list_display = ('url', 'source', 'status', 'attempts', 'date_fetched')
+    list_filter = ('source', 'status')
+    search_fields = ('url',)
+    raw_id_fields = ('book',)
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('file', 'publisher', 'status', 'processed', 'created', 'duplicates', 'invalid', 'date_created')
+    list_filter = ('status',)
+    raw_id_fields = ('publisher', 'user')
+
+@admin.register(MainListSnapshot)
+class MainListSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'book_list', 'published_by', 'date_published')
+    readonly_fields = [field.name for field in MainListSnapshot._meta.fields]
+
+@admin.register(BookList)
+class BookListAdmin(admin.ModelAdmin):
+    list_display = ('name', 'user', 'date_created', 'is_active')
+    actions = ('publish_main_list',)
+
+    @admin.action(description='Publish as the main list')
+    def publish_main_list(self, request, queryset):
+        from main.snapshot import publish
+        if queryset.count() != 1:
+            self.message_user(request, 'Select a single list to publish.', level=messages.ERROR)
+            return
+        snapshot = publish(queryset.get(), user=request.user)
+        self.message_user(request, f'Published {len(snapshot.book_ids)} books as the main list.')
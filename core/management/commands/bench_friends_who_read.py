@@ -0,0 +1,55 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from core.models import Book, BookInteraction, UserProfile
+from utils.benchmark import Rollback, measure, summary
+
+
+class Command(BaseCommand):
+    help = 'Measure followed readers of a book for users following thousands of people (nothing is kept)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50000)
+        parser.add_argument('--followings', type=int, default=5000)
+        parser.add_argument('--viewers', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['users'], options['followings'], options['viewers'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, size, followings, viewers, repeat):
+        rand = random.Random(0)
+        User.objects.bulk_create([User(username=f'bench-reader-{i}') for i in range(size)], batch_size=10000)
+        users = list(User.objects.filter(username__startswith='bench-reader-').values_list('pk', flat=True))
+        UserProfile.objects.bulk_create([UserProfile(user_id=pk, avatar=None) for pk in users], batch_size=10000)
+        profiles = dict(UserProfile.objects.filter(user__in=users).values_list('user', 'pk'))
+        through = UserProfile.following.through
+        for viewer in users[:viewers]:
+            through.objects.bulk_create([
+                through(userprofile_id=profiles[viewer], user_id=pk) for pk in rand.sample(users, followings)
+            ], batch_size=10000)
+
+        # Books read by everybody down to a handful of readers.
+        books = {}
+        for readers in (size, size // 10, size // 100, 10):
+            book = Book.objects.create(title=f'Benchmark {readers} readers')
+            BookInteraction.objects.bulk_create([
+                BookInteraction(user_id=pk, book=book, is_read=True, rate=rand.choice([None, 1, 2, 3, 4, 5]))
+                for pk in rand.sample(users, readers)
+            ], batch_size=10000)
+            books[readers] = book
+
+        self.stdout.write(self.style.SUCCESS(f'{size} users, viewers follow {followings}'))
+        for readers, book in books.items():
+            calls = [(rand.choice(users[:viewers]), book, 3) for _ in range(repeat)]
+            self.stdout.write(f'  {readers:>7} readers  top 3   {summary(measure(UserProfile.following_readers, calls))}')
+            calls = [(user, book, 50) for user, book, limit in calls]
+            self.stdout.write(f'  {readers:>7} readers  top 50  {summary(measure(UserProfile.following_readers, calls))}')
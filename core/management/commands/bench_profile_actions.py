@@ -0,0 +1,59 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from core.models import Book, UserProfile
+from utils.benchmark import Rollback, measure, summary
+
+
+class Command(BaseCommand):
+    help = 'Measure UserProfile actions latency while the catalogue grows (nothing is kept)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000, 1000000])
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['sizes'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def grow(self, size):
+        missing = size - Book.objects.count()
+        for start in range(0, missing, 10000):
+            Book.objects.bulk_create(
+                [Book(title=f'Benchmark {start + i}') for i in range(min(10000, missing - start))],
+                batch_size=10000,
+            )
+
+    def run(self, sizes, repeat):
+        profile = UserProfile.objects.create(user=User.objects.create(username='bench-profile-actions'), avatar=None)
+        friends = [
+            UserProfile.objects.create(user=User.objects.create(username=f'bench-friend-{i}'), avatar=None)
+            for i in range(repeat)
+        ]
+        actions = (
+            ('read_book', 'unread_book'),
+            ('like_book', 'unlike_book'),
+            ('add_read_later_book', 'remove_read_later_book'),
+            ('add_favorite_book', 'remove_favorite_book'),
+        )
+        for size in sorted(sizes):
+            self.grow(size)
+            ids = list(Book.objects.values_list('pk', flat=True).order_by('?')[:repeat])
+            books = [(book,) for book in Book.objects.filter(pk__in=ids)]
+            self.stdout.write(self.style.SUCCESS(f'{size} books'))
+            for do, undo in actions:
+                self.stdout.write(f'  {do:<24} {summary(measure(getattr(profile, do), books))}')
+                self.stdout.write(f'  {undo:<24} {summary(measure(getattr(profile, undo), books))}')
+            rates = [(book, random.randint(1, 5)) for (book,) in books]
+            self.stdout.write(f'  {"rate_book":<24} {summary(measure(profile.rate_book, rates))}')
+            reviews = [(book, 'benchmark') for (book,) in books]
+            self.stdout.write(f'  {"add_review":<24} {summary(measure(profile.add_review, reviews))}')
+            self.stdout.write(f'  {"follow":<24} {summary(measure(profile.follow, [(f,) for f in friends]))}')
+            self.stdout.write(f'  {"unfollow":<24} {summary(measure(profile.unfollow, [(f,) for f in friends]))}')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.models import BookStats
+
+
+class Command(BaseCommand):
+    help = 'Recompute rates, readers, likes and reviews counters of all books'
+
+    def handle(self, *args, **options):
+        count = BookStats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats of {count} books'))
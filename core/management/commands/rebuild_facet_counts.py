@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.models import FacetCount
+
+
+class Command(BaseCommand):
+    help = 'Recompute the number of books of every advanced search facet value'
+
+    def handle(self, *args, **options):
+        count = FacetCount.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} facet counts'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Recompute shelf, follow and list counters of all profiles'
+
+    def handle(self, *args, **options):
+        count = UserProfile.rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counters of {count} profiles'))
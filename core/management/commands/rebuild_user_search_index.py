@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.models import UserSearchTerm
+
+
+class Command(BaseCommand):
+    help = 'Index usernames and profile names of all users for the user search'
+
+    def handle(self, *args, **options):
+        count = UserSearchTerm.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} users'))
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.15 on 2026-10-17 23:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_baners_slider'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookStats',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.book')),
+                ('rate_count', models.IntegerField(default=0)),
+                ('rate_sum', models.FloatField(default=0.0)),
+                ('rate_1', models.IntegerField(default=0)),
+                ('rate_2', models.IntegerField(default=0)),
+                ('rate_3', models.IntegerField(default=0)),
+                ('rate_4', models.IntegerField(default=0)),
+                ('rate_5', models.IntegerField(default=0)),
+                ('readers_count', models.IntegerField(default=0)),
+                ('likes_count', models.IntegerField(default=0)),
+                ('reviews_count', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
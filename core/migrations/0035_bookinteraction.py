@@ -0,0 +1,59 @@
+# Generated by Django 3.2.15 on 2026-10-17 23:17
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0034_bookstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookInteraction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_read', models.BooleanField(default=False)),
+                ('date_readed', models.DateTimeField(blank=True, null=True)),
+                ('is_liked', models.BooleanField(default=False)),
+                ('date_liked', models.DateTimeField(blank=True, null=True)),
+                ('is_favorite', models.BooleanField(default=False)),
+                ('date_favorite', models.DateTimeField(blank=True, null=True)),
+                ('is_read_later', models.BooleanField(default=False)),
+                ('date_read_later', models.DateTimeField(blank=True, null=True)),
+                ('rate', models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0.0), django.core.validators.MaxValueValidator(5.0)])),
+                ('date_rated', models.DateTimeField(blank=True, null=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interactions', to='core.book')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='book_interactions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='bookinteraction',
+            index=models.Index(fields=['book', 'is_read'], name='interaction_book_read'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinteraction',
+            index=models.Index(fields=['user', 'is_read', 'date_readed'], name='interaction_user_read'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinteraction',
+            index=models.Index(fields=['user', 'is_liked', 'date_liked'], name='interaction_user_liked'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinteraction',
+            index=models.Index(fields=['user', 'is_favorite', 'date_favorite'], name='interaction_user_favorite'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinteraction',
+            index=models.Index(fields=['user', 'is_read_later', 'date_read_later'], name='interaction_user_read_later'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookinteraction',
+            constraint=models.UniqueConstraint(fields=('user', 'book'), name='unique_user_book_interaction'),
+        ),
+    ]
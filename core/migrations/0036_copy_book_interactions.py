@@ -0,0 +1,124 @@
+from django.db import migrations
+from django.utils import timezone
+
+from core.models import rebuild_book_stats
+
+
+def copy_interactions(apps, schema_editor):
+    """
+    Merge readed/liked/favorite/read later books, Readers, Liked and
+    PersonRate rows into one BookInteraction row per (user, book).
+    """
+    UserProfile = apps.get_model('core', 'UserProfile')
+    Book = apps.get_model('core', 'Book')
+    Readers = apps.get_model('core', 'Readers')
+    Liked = apps.get_model('core', 'Liked')
+    PersonRate = apps.get_model('core', 'PersonRate')
+    BookInteraction = apps.get_model('core', 'BookInteraction')
+
+    now = timezone.now()
+    profiles = dict(UserProfile.objects.values_list('id', 'user_id'))
+    rows = {}
+
+    def row(user_id, book_id):
+        key = (user_id, book_id)
+        if key not in rows:
+            rows[key] = BookInteraction(user_id=user_id, book_id=book_id)
+        return rows[key]
+
+    def read(obj, date):
+        obj.is_read = True
+        obj.date_readed = min(obj.date_readed or date, date)
+
+    def like(obj, date):
+        obj.is_liked = True
+        obj.date_liked = min(obj.date_liked or date, date)
+
+    for profile_id, book_id in UserProfile.readed_books.through.objects.values_list('userprofile_id', 'book_id').iterator():
+        read(row(profiles[profile_id], book_id), now)
+    for user_id, book_id in Book.user_readers.through.objects.values_list('user_id', 'book_id').iterator():
+        read(row(user_id, book_id), now)
+    for user_id, book_id, date in Readers.objects.values_list('user_id', 'book_id', 'date_readed').iterator():
+        obj = row(user_id, book_id)
+        obj.is_read = True
+        # Readers holds the real (user editable) date of reading.
+        obj.date_readed = date
+
+    for profile_id, book_id in UserProfile.liked_books.through.objects.values_list('userprofile_id', 'book_id').iterator():
+        like(row(profiles[profile_id], book_id), now)
+    for user_id, book_id in Book.user_liked.through.objects.values_list('user_id', 'book_id').iterator():
+        like(row(user_id, book_id), now)
+    for user_id, book_id, date in Liked.objects.values_list('user_id', 'book_id', 'date_liked').iterator():
+        like(row(user_id, book_id), date)
+
+    for profile_id, book_id in UserProfile.favorite_books.through.objects.values_list('userprofile_id', 'book_id').iterator():
+        obj = row(profiles[profile_id], book_id)
+        obj.is_favorite = True
+        obj.date_favorite = now
+    for profile_id, book_id in UserProfile.read_later_books.through.objects.values_list('userprofile_id', 'book_id').iterator():
+        obj = row(profiles[profile_id], book_id)
+        obj.is_read_later = True
+        obj.date_read_later = now
+
+    # Latest rate wins when a user rated a book more than once.
+    for user_id, book_id, rate in PersonRate.objects.order_by('id').values_list('user_id', 'book_id', 'person_rate').iterator():
+        obj = row(user_id, book_id)
+        obj.rate = rate
+        obj.date_rated = now
+
+    BookInteraction.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+def restore_relations(apps, schema_editor):
+    """ Write BookInteraction rows back to the old relations. """
+    UserProfile = apps.get_model('core', 'UserProfile')
+    Book = apps.get_model('core', 'Book')
+    Readers = apps.get_model('core', 'Readers')
+    Liked = apps.get_model('core', 'Liked')
+    PersonRate = apps.get_model('core', 'PersonRate')
+    BookInteraction = apps.get_model('core', 'BookInteraction')
+
+    profiles = dict(UserProfile.objects.values_list('user_id', 'id'))
+    for obj in BookInteraction.objects.iterator():
+        profile_id = profiles.get(obj.user_id)
+        if obj.is_read:
+            Readers.objects.create(user_id=obj.user_id, book_id=obj.book_id, date_readed=obj.date_readed)
+            Book.user_readers.through.objects.create(user_id=obj.user_id, book_id=obj.book_id)
+            if profile_id:
+                UserProfile.readed_books.through.objects.create(userprofile_id=profile_id, book_id=obj.book_id)
+        if obj.is_liked:
+            Liked.objects.create(user_id=obj.user_id, book_id=obj.book_id, date_liked=obj.date_liked)
+            Book.user_liked.through.objects.create(user_id=obj.user_id, book_id=obj.book_id)
+            if profile_id:
+                UserProfile.liked_books.through.objects.create(userprofile_id=profile_id, book_id=obj.book_id)
+        if obj.is_favorite and profile_id:
+            UserProfile.favorite_books.through.objects.create(userprofile_id=profile_id, book_id=obj.book_id)
+        if obj.is_read_later and profile_id:
+            UserProfile.read_later_books.through.objects.create(userprofile_id=profile_id, book_id=obj.book_id)
+        if obj.rate is not None:
+            rate = PersonRate.objects.create(user_id=obj.user_id, book_id=obj.book_id, person_rate=obj.rate)
+            if profile_id:
+                UserProfile.rated_books.through.objects.create(userprofile_id=profile_id, personrate_id=rate.id)
+    BookInteraction.objects.all().delete()
+
+
+def fill_book_stats(apps, schema_editor):
+    """ Count the copied interactions into BookStats, created empty by 0034. """
+    rebuild_book_stats(
+        apps.get_model('core', 'BookStats'),
+        apps.get_model('core', 'Book'),
+        apps.get_model('core', 'BookInteraction'),
+        apps.get_model('core', 'Review'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0035_bookinteraction'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_interactions, restore_relations),
+        migrations.RunPython(fill_book_stats, migrations.RunPython.noop),
+    ]
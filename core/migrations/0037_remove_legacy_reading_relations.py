@@ -0,0 +1,66 @@
+# Generated by Django 3.2.15 on 2026-10-17 23:18
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0036_copy_book_interactions'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='personrate',
+            name='book',
+        ),
+        migrations.RemoveField(
+            model_name='personrate',
+            name='user',
+        ),
+        migrations.RemoveField(
+            model_name='readers',
+            name='book',
+        ),
+        migrations.RemoveField(
+            model_name='readers',
+            name='user',
+        ),
+        migrations.RemoveField(
+            model_name='book',
+            name='user_liked',
+        ),
+        migrations.RemoveField(
+            model_name='book',
+            name='user_readers',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='favorite_books',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='liked_books',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='rated_books',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='read_later_books',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='readed_books',
+        ),
+        migrations.DeleteModel(
+            name='Liked',
+        ),
+        migrations.DeleteModel(
+            name='PersonRate',
+        ),
+        migrations.DeleteModel(
+            name='Readers',
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.15 on 2026-10-18 00:07
+
+from django.db import migrations, models
+
+from core.models import rebuild_facet_counts
+
+
+def fill_counts(apps, schema_editor):
+    rebuild_facet_counts(apps.get_model('core', 'FacetCount'), apps.get_model('core', 'Book'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0037_remove_legacy_reading_relations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=20)),
+                ('value', models.CharField(max_length=255)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['language'], name='book_language'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['label'], name='book_label'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['pages'], name='book_pages'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['rate'], name='book_rate'),
+        ),
+        migrations.AddIndex(
+            model_name='facetcount',
+            index=models.Index(fields=['dimension', '-count'], name='facet_dimension_count'),
+        ),
+        migrations.AddConstraint(
+            model_name='facetcount',
+            constraint=models.UniqueConstraint(fields=('dimension', 'value'), name='unique_facet_value'),
+        ),
+        migrations.RunPython(fill_counts, migrations.RunPython.noop),
+    ]
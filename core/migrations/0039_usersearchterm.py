@@ -0,0 +1,35 @@
+# Generated by Django 3.2.15 on 2026-10-18 00:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from core.models import rebuild_user_search_terms
+
+
+def index_users(apps, schema_editor):
+    rebuild_user_search_terms(apps.get_model('core', 'UserSearchTerm'), apps.get_model(settings.AUTH_USER_MODEL))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0038_facetcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=150)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='usersearchterm',
+            index=models.Index(fields=['term', 'user'], name='user_search_term'),
+        ),
+        migrations.RunPython(index_users, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.15 on 2026-10-18 00:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0039_usersearchterm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MainListSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_ids', models.JSONField(blank=True, default=list)),
+                ('books', models.JSONField(blank=True, default=list)),
+                ('date_published', models.DateTimeField(default=django.utils.timezone.now)),
+                ('book_list', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='snapshots', to='core.booklist')),
+                ('published_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'get_latest_by': 'pk',
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.15 on 2026-10-18 00:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0040_mainlistsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Activity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verb', models.CharField(choices=[('read', 'Read'), ('like', 'Like'), ('rate', 'Rate'), ('review', 'Review')], max_length=10)),
+                ('rate', models.FloatField(blank=True, null=True)),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('fanned_out', models.BooleanField(default=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activities', to='core.book')),
+                ('review', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='activities', to='core.review')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activities', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='core.activity')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('owner', 'activity'), name='unique_timeline_activity'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['user', 'book'], name='activity_user_book'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(condition=models.Q(('fanned_out', False)), fields=['user', 'id'], name='activity_pulled'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.15 on 2026-10-18 00:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0041_activity_timelineentry'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bookinteraction',
+            name='interaction_book_read',
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['publisher', 'date_created', 'id'], name='book_publisher_date'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinteraction',
+            index=models.Index(fields=['book', 'is_read', 'date_readed'], name='interaction_book_readers'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['book', 'date_created', 'id'], name='review_book_date'),
+        ),
+    ]
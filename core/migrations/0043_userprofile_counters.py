@@ -0,0 +1,59 @@
+# Generated by Django 3.2.15 on 2026-10-18 00:33
+
+from django.db import migrations, models
+
+from core.models import rebuild_profile_counters
+
+
+def fill_counters(apps, schema_editor):
+    rebuild_profile_counters(
+        apps.get_model('core', 'UserProfile'),
+        apps.get_model('core', 'BookInteraction'),
+        apps.get_model('core', 'BookList'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0042_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='favorites_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='followers_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='followings_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='likes_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='lists_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='read_later_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='reads_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.15 on 2026-10-18 00:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0043_userprofile_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrawlURL',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=50)),
+                ('url', models.TextField(unique=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('fetched', 'Fetched'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('etag', models.CharField(blank=True, default='', max_length=255)),
+                ('last_modified', models.CharField(blank=True, default='', max_length=64)),
+                ('content_hash', models.CharField(blank=True, default='', max_length=64)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('date_fetched', models.DateTimeField(blank=True, null=True)),
+                ('book', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='crawl_urls', to='core.book')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='crawlurl',
+            index=models.Index(fields=['source', 'status', 'date_fetched'], name='crawlurl_frontier'),
+        ),
+    ]
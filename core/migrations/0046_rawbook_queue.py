@@ -0,0 +1,35 @@
+# Generated by Django 3.2.15 on 2026-10-18 01:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0045_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookrawdata',
+            name='book',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='raw_records', to='core.book'),
+        ),
+        migrations.AddField(
+            model_name='bookrawdata',
+            name='claimed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claimed_raw_books', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='bookrawdata',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='bookrawdata',
+            index=models.Index(fields=['is_active', 'id'], name='rawbook_queue'),
+        ),
+    ]
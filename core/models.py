@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, Sum, Q, F, Window, Case, When, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.mail import send_mail
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.template.defaultfilters import slugify
@@ -15,6 +18,42 @@ import string
 from io import BytesIO
 import sys
 
+from utils.text import search_tokens
+
+
+def book_ids(books):
+    """ Ids of a mix of Book instances and ids. """
+    return {getattr(book, 'pk', book) for book in books}
+
+
+def rebuild_profile_counters(profiles, interactions, lists, batch_size=1000):
+    """
+    Recompute the counters of every row of the UserProfile model
+    `profiles` from the BookInteraction and BookList models, which may be
+    the historical models of a migration.
+    """
+    counters = {}
+    groups = [
+        (field, interactions.objects.filter(**{flag: True}).values_list('user'))
+        for flag, field in UserProfile.SHELF_COUNTERS.items()
+    ]
+    groups += [
+        ('followings_count', profiles.following.through.objects.values_list('userprofile__user')),
+        ('followers_count', profiles.followers.through.objects.values_list('userprofile__user')),
+        ('lists_count', lists.objects.values_list('user')),
+    ]
+    for field, rows in groups:
+        for user_id, count in rows.annotate(count=Count('pk')).order_by():
+            counters.setdefault(user_id, {})[field] = count
+    fields = [field for field, rows in groups]
+    rows = []
+    for profile in profiles.objects.only('pk', 'user').iterator():
+        for field in fields:
+            setattr(profile, field, counters.get(profile.user_id, {}).get(field, 0))
+        rows.append(profile)
+    profiles.objects.bulk_update(rows, fields, batch_size=batch_size)
+    return len(rows)
+
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -39,124 +78,272 @@ class UserProfile(models.Model):
 
     reviews = models.ManyToManyField('Review', related_name='reviews', blank=True)
 
-    liked_books = models.ManyToManyField('Book', related_name='liked_books', blank=True)
-
-    readed_books = models.ManyToManyField('Book', related_name='readed_books', blank=True) 
-
-    favorite_books = models.ManyToManyField('Book', related_name='favorite_books', blank=True)
-
-    read_later_books = models.ManyToManyField('Book', related_name='read_later_books', blank=True)
-
-    rated_books = models.ManyToManyField('PersonRate', related_name='rated_books', blank=True)
+    # Counters of the profile card, kept up to date by the actions below
+    # and accounts.signals. `./manage.py rebuild_profile_counters` recomputes all.
+    reads_count = models.IntegerField(default=0)
+    likes_count = models.IntegerField(default=0)
+    favorites_count = models.IntegerField(default=0)
+    read_later_count = models.IntegerField(default=0)
+    followings_count = models.IntegerField(default=0)
+    followers_count = models.IntegerField(default=0)
+    lists_count = models.IntegerField(default=0)
+
+    # Counter of each shelf flag.
+    SHELF_COUNTERS = {
+        'is_read': 'reads_count',
+        'is_liked': 'likes_count',
+        'is_favorite': 'favorites_count',
+        'is_read_later': 'read_later_count',
+    }
+    # Seconds a rendered profile card stays cached, changes expire it.
+    CARD_TIMEOUT = 10 * 60
+
+    # Reading state lives in BookInteraction, one row per (user, book).
+    # Every action below is a single-row upsert of that row and checks
+    # membership with indexed queries, never by loading a relation.
+
+    def shelf(self, flag):
+        """ Books of the profile with `flag` set on their interaction. """
+        return Book.objects.filter(interactions__user=self.user_id, **{f'interactions__{flag}': True})
+
+    def shelf_count(self, flag):
+        """ Number of books of a shelf. """
+        return getattr(self, self.SHELF_COUNTERS[flag])
+
+    @staticmethod
+    def card_key(user_id):
+        return f'profile-card:{user_id}'
+
+    @classmethod
+    def change_counters(cls, user_id, **deltas):
+        """ Add `deltas` to the counters of the profile of `user_id` and expire its card. """
+        cls.objects.filter(user=user_id).update(**{field: F(field) + delta for field, delta in deltas.items()})
+        cache.delete(cls.card_key(user_id))
+
+    def count(self, **deltas):
+        """ change_counters() for this profile, keeping the instance in sync. """
+        UserProfile.change_counters(self.user_id, **deltas)
+        for field, delta in deltas.items():
+            setattr(self, field, getattr(self, field) + delta)
+
+    def count_shelf(self, flag, delta):
+        self.count(**{self.SHELF_COUNTERS[flag]: delta})
+
+    @classmethod
+    def rebuild_counters(cls, batch_size=1000):
+        """
+        Recompute the counters of every profile from scratch.
+        """
+        return rebuild_profile_counters(cls, BookInteraction, BookList, batch_size)
+
+    @property
+    def readed_books(self):
+        return self.shelf('is_read')
+
+    @property
+    def liked_books(self):
+        return self.shelf('is_liked')
+
+    @property
+    def favorite_books(self):
+        return self.shelf('is_favorite')
+
+    @property
+    def read_later_books(self):
+        return self.shelf('is_read_later')
+
+    @property
+    def interactions(self):
+        return BookInteraction.objects.filter(user=self.user_id)
+
+    def set_flag(self, book, flag, value, **fields):
+        """
+        Upsert the (user, book) row setting `flag` to `value` and `fields`.
+        Returns True if the flag changed. One UPDATE in the common case,
+        plus an INSERT the first time the user touches the book.
+        """
+        fields[flag] = value
+        if self.interactions.filter(book=book, **{flag: not value}).update(**fields):
+            self.count_shelf(flag, 1 if value else -1)
+            return True
+        if not value:
+            return False
+        try:
+            with transaction.atomic():
+                BookInteraction.objects.create(user_id=self.user_id, book=book, **fields)
+            self.count_shelf(flag, 1)
+            return True
+        except IntegrityError:
+            # The row exists and the flag was already set.
+            return False
 
     def add_read_later_book(self, book):
-        if book not in self.read_later_books.all():
-            self.read_later_books.add(book)
-            return True
-        return False
+        return self.set_flag(book, 'is_read_later', True, date_read_later=timezone.now())
+
+    def add_read_later_books(self, books):
+        """ Add many books to read later at once, returns the ids added. """
+        return self.set_flags(books, 'is_read_later', date_read_later=timezone.now())
 
     def remove_read_later_book(self, book):
-        if book in self.read_later_books.all():
-            self.read_later_books.remove(book)
-            return True
-        return False
+        return self.set_flag(book, 'is_read_later', False, date_read_later=None)
 
     def add_favorite_book(self, book):
-        if book not in self.favorite_books.all() and self.favorite_books.count() < 3:
-            self.favorite_books.add(book)
+        if self.interactions.filter(is_favorite=True).count() < 3 and \
+                self.set_flag(book, 'is_favorite', True, date_favorite=timezone.now()):
             self.read_book(book)
             return True
         return False
 
     def remove_favorite_book(self, book):
-        if book in self.favorite_books.all():
-            self.favorite_books.remove(book)
-            return True
-        return False
+        return self.set_flag(book, 'is_favorite', False, date_favorite=None)
 
     def follow(self, user):
-        if user not in self.following.all() and user.user != self.user:
+        if user.user_id != self.user_id and not self.following.filter(pk=user.user_id).exists():
             self.following.add(user.user)
             user.followers.add(self.user)
+            self.count(followings_count=1)
+            user.count(followers_count=1)
+            TimelineEntry.backfill(self.user_id, user.user_id)
             return True
         return False
 
     def unfollow(self, user):
-        if user.user in self.following.all() and user.user != self.user:
+        if user.user_id != self.user_id and self.following.filter(pk=user.user_id).exists():
             self.following.remove(user.user)
             user.followers.remove(self.user)
+            self.count(followings_count=-1)
+            user.count(followers_count=-1)
+            TimelineEntry.drop(self.user_id, user.user_id)
             return True
         return False
 
     def read_book(self, book):
-        # if books instance not in readed book add it.
-        if book not in self.readed_books.all():
-            self.readed_books.add(book)
-            Readers.objects.create(user=self.user, book=book)
-            book.user_readers.add(self.user)
+        if self.set_flag(book, 'is_read', True, date_readed=timezone.now()):
+            BookStats.change(book, readers_count=1)
+            Activity.publish(self.user_id, Activity.READ, [book])
             return True
         return False
 
+    def set_flags(self, books, flag, **fields):
+        """
+        Set `flag` for many books (instances or ids) with a fixed number
+        of queries, returns the ids that didn't have it before.
+        """
+        ids = set(Book.objects.filter(pk__in=book_ids(books)).values_list('pk', flat=True))
+        existing = dict(self.interactions.filter(book_id__in=ids).values_list('book_id', flag))
+        changed = {book_id for book_id, value in existing.items() if not value}
+        if changed:
+            self.interactions.filter(book_id__in=changed).update(**{flag: True}, **fields)
+        new = ids - set(existing)
+        BookInteraction.objects.bulk_create([
+            BookInteraction(user_id=self.user_id, book_id=book_id, **{flag: True}, **fields) for book_id in new
+        ])
+        if changed or new:
+            self.count_shelf(flag, len(changed | new))
+        return changed | new
+
+    def read_books(self, books):
+        """ Mark many books as read at once, returns the ids that weren't read. """
+        ids = self.set_flags(books, 'is_read', date_readed=timezone.now())
+        if ids:
+            BookStats.change_many(ids, readers_count=1)
+            Activity.publish(self.user_id, Activity.READ, ids)
+        return ids
+
     def unread_book(self, book):
-        # if books instance in readed book remove it.
-        if book in self.readed_books.all():
-            self.readed_books.remove(book)
-            Readers.objects.filter(user=self.user, book=book).delete()
-            book.user_readers.remove(self.user)
-            return True
-        return False
+        return bool(self.unread_books([book]))
+
+    def unread_books(self, books):
+        """ Opposite of read_books(), returns the ids that were read. """
+        read = self.interactions.filter(book_id__in=book_ids(books), is_read=True)
+        ids = set(read.values_list('book_id', flat=True))
+        if ids:
+            self.interactions.filter(book_id__in=ids).update(is_read=False, date_readed=None)
+            self.count_shelf('is_read', -len(ids))
+            BookStats.change_many(ids, readers_count=-1)
+            Activity.retract(self.user_id, Activity.READ, ids)
+        return ids
 
     # Change date of reading book
     def change_date_of_reading_book(self, book, date):
-        if book in self.readed_books.all():
-            Readers.objects.filter(user=self.user, book=book).update(date_readed=date)
-            return True
-        return False
+        return self.interactions.filter(book=book, is_read=True).update(date_readed=date) > 0
 
     def has_readed_book(self, book):
-        return book in self.readed_books.all()
+        return self.interactions.filter(book=book, is_read=True).exists()
 
     def related_following_to_book(self, book):
-        result = []
-        for u in self.following.all():
-            try:
-                if book in u.userprofile.readed_books.all():
-                    result.append(u)
-            except:
-                pass
-        return result
+        return self.following_readers(self.user_id, book)
+
+    @staticmethod
+    def following_readers(user, book, limit=None):
+        """
+        Users followed by `user` who have read `book` (instances or ids),
+        best rates first then the latest readers, up to `limit`. Each comes
+        with its profile, `rate_to_book` and `readers_count`, the number of
+        followed readers beyond the limit too, all from a single query.
+        The followed ids probe the (user, book) index of BookInteraction,
+        so the cost follows the number of followings, not of readers.
+        """
+        followed = UserProfile.following.through.objects.filter(userprofile__user=user).values('user')
+        interactions = BookInteraction.objects.filter(book=book, is_read=True, user__in=followed) \
+            .select_related('user__userprofile').annotate(readers_count=Window(Count('pk'))).order_by(
+                F('rate').desc(nulls_last=True), F('date_readed').desc(nulls_last=True), 'user',
+            )
+        users = []
+        for interaction in interactions[:limit]:
+            interaction.user.rate_to_book = interaction.rate
+            interaction.user.readers_count = interaction.readers_count
+            users.append(interaction.user)
+        return users
 
     def rate_book(self, book, rate):
-        if (book in Book.objects.all()) and 0<=rate<=5:
-            self_rate = PersonRate.objects.filter(user=self.user, book=book)
-            if self_rate.exists():                
-                self_rate.update(person_rate=rate)
-            else:
-                obj = PersonRate.objects.create(user=self.user, book=book, person_rate=rate)
-                self.rated_books.add(obj)
-                if book not in self.readed_books.all():
-                    self.read_book(book)
-            return True
-
-        return False
+        if not 0<=rate<=5:
+            return False
+        now = timezone.now()
+        rates = list(self.interactions.filter(book=book).values_list('rate', flat=True)[:1])
+        if not rates:
+            try:
+                # First touch of the book: rated and read in one insert.
+                with transaction.atomic():
+                    BookInteraction.objects.create(
+                        user_id=self.user_id, book=book, rate=rate, date_rated=now,
+                        is_read=True, date_readed=now,
+                    )
+                self.count_shelf('is_read', 1)
+                BookStats.change_rate(book, None, rate)
+                BookStats.change(book, readers_count=1)
+                Activity.publish(self.user_id, Activity.READ, [book])
+                Activity.publish(self.user_id, Activity.RATE, [book], rate=rate)
+                return True
+            except IntegrityError:
+                rates = list(self.interactions.filter(book=book).values_list('rate', flat=True)[:1])
+        previous = rates[0]
+        self.interactions.filter(book=book).update(rate=rate, date_rated=now)
+        BookStats.change_rate(book, previous, rate)
+        if previous is None:
+            self.read_book(book)
+        # A new rate replaces the previous one in the feeds.
+        Activity.retract(self.user_id, Activity.RATE, [book])
+        Activity.publish(self.user_id, Activity.RATE, [book], rate=rate)
+        return True
 
     def like_book(self, book):
-        if book not in self.liked_books.all() and book in Book.objects.all():
-            self.liked_books.add(book)
-            book.user_liked.add(self.user)
+        if self.set_flag(book, 'is_liked', True, date_liked=timezone.now()):
+            BookStats.change(book, likes_count=1)
+            Activity.publish(self.user_id, Activity.LIKE, [book])
             self.read_book(book)
             return True
         return False
     
     def unlike_book(self, book):
-        if book in self.liked_books.all() and book in Book.objects.all():
-            self.liked_books.remove(book)
-            book.user_liked.remove(self.user)
+        if self.set_flag(book, 'is_liked', False, date_liked=None):
+            BookStats.change(book, likes_count=-1)
+            Activity.retract(self.user_id, Activity.LIKE, [book])
             return True
         return False
     
     def add_review(self, book, review):
-        if book in Book.objects.all():
+        if Book.objects.filter(pk=book.pk).exists():
             review = Review.objects.create(user=self.user, book=book, text=review)
             self.reviews.add(review)
             book.reviews.add(review)
@@ -164,22 +351,21 @@ class UserProfile(models.Model):
         return False
 
     def remove_review(self, book, review):
-        if review in self.reviews.all():
-            Review.objects.filter(user=self.user, book=book, text=review).delete()
+        if self.reviews.filter(pk=review.pk).exists():
             self.reviews.remove(review)
             book.reviews.remove(review)
+            # Model delete, so deleting an active review updates BookStats.
+            review.delete()
             return True
         return False
     
     def rate_of_book(self, book):
-        if book in Book.objects.all():
-            rate = PersonRate.objects.filter(user=self.user, book=book)
-            if rate:
-                return rate[0].person_rate
-            return 0
+        rate = self.interactions.filter(book=book).values_list('rate', flat=True).first()
+        return rate if rate is not None else 0
 
     def save(self, *args, **kwargs):
         super(UserProfile, self).save(*args, **kwargs)
+        cache.delete(self.card_key(self.user_id))
         # Resize the image to a square
         if self.avatar:
             # resize the image to a square 300x300 pixels
@@ -203,15 +389,6 @@ class UserProfile(models.Model):
         return self.user.username
 
 
-class PersonRate(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    book = models.ForeignKey('Book', on_delete=models.CASCADE)
-    person_rate = models.FloatField(default=0.0, validators=[MinValueValidator(0.5), MaxValueValidator(5.00)],  blank=True, null=True)
-
-    def __str__(self):
-        return self.user.username + ' ' + self.book.title
-
-
 class ConfirmCode(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     code = models.CharField(
@@ -298,22 +475,138 @@ class Invitation(models.Model):
         )
 
 
-class Readers(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    book = models.ForeignKey('Book', on_delete=models.CASCADE)
-    date_readed = models.DateTimeField(default=timezone.now)
-
-    def __str__(self):
-        return self.user.username + ' read ' + self.book.title
+def rebuild_user_search_terms(terms, users, batch_size=1000):
+    """
+    Recompute the rows of the UserSearchTerm model `terms` for every row
+    of the User model `users`, which may be the historical models of a
+    migration. Returns the number of users indexed.
+    """
+    terms.objects.all().delete()
+    users = users.objects.select_related('userprofile').order_by('pk')
+    count = 0
+    for start in range(0, users.count(), batch_size):
+        batch = list(users[start:start + batch_size])
+        terms.objects.bulk_create(UserSearchTerm.rows(terms, batch), batch_size=1000)
+        count += len(batch)
+    return count
 
 
-class Liked(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    book = models.ForeignKey('Book', on_delete=models.CASCADE)
-    date_liked = models.DateTimeField(default=timezone.now)
+class UserSearchTerm(models.Model):
+    """
+    Normalized words of the username and profile name of a user, and of
+    every suffix of them, so a prefix lookup on `term` finds users by
+    the start of any word or by any part of their username.
+    Kept up to date by accounts.signals,
+    `./manage.py rebuild_user_search_index` recomputes all.
+    """
+    # Shortest suffix worth indexing.
+    MIN_SUFFIX = 3
+
+    user = models.ForeignKey(User, related_name='search_terms', on_delete=models.CASCADE)
+    term = models.CharField(max_length=150)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'user'], name='user_search_term'),
+        ]
+
+    @classmethod
+    def terms(cls, username, name):
+        terms = set()
+        for word in search_tokens(username) + search_tokens(name):
+            word = word[:150]
+            terms.add(word)
+            terms.update(word[i:] for i in range(1, len(word) - cls.MIN_SUFFIX + 1))
+        return terms
+
+    @classmethod
+    def rows(cls, model, users):
+        """ Rows of the term model `model` for `users` (instances with their profile). """
+        rows = []
+        for user in users:
+            profile = getattr(user, 'userprofile', None) if hasattr(user, 'userprofile') else None
+            rows += [model(user=user, term=term) for term in cls.terms(user.username, profile.name if profile else '')]
+        return rows
+
+    @classmethod
+    def index(cls, users):
+        """ Replace the terms of `users` (instances with their profile). """
+        rows = cls.rows(cls, users)
+        with transaction.atomic():
+            cls.objects.filter(user__in=users).delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        return rebuild_user_search_terms(cls, User, batch_size)
+
+    @staticmethod
+    def prefix(term):
+        """ Lookup of terms starting with `term`, as a range the index can serve. """
+        return Q(term__gte=term, term__lt=term + '\uffff')
+
+    @classmethod
+    def search(cls, query, limit, viewer=None):
+        """
+        Ids of up to `limit` users with a profile having a term starting
+        with every word of `query`, best first: an exact username, then
+        by how many of the people the `viewer` follows follow them, then
+        by their followers. Ranked in one query before the limit is applied.
+        """
+        words = search_tokens(query)
+        if not words:
+            return []
+        terms = cls.objects.filter(cls.prefix(words[0]))
+        for word in words[1:]:
+            terms = terms.filter(user__in=cls.objects.filter(cls.prefix(word)).values('user'))
+        users = User.objects.filter(pk__in=terms.values('user'), userprofile__isnull=False).annotate(
+            exact=Case(When(username__iexact=query.strip(), then=0), default=1, output_field=models.IntegerField()),
+        )
+        order = ['exact']
+        if viewer is not None and viewer.is_authenticated:
+            followings = UserProfile.following.through.objects.filter(userprofile__user=viewer).values('user')
+            mutuals = UserProfile.followers.through.objects.filter(
+                userprofile=OuterRef('userprofile'), user__in=followings,
+            ).order_by().values('userprofile').annotate(count=Count('pk')).values('count')
+            users = users.annotate(mutuals=Coalesce(Subquery(mutuals, output_field=models.IntegerField()), 0))
+            order.append('-mutuals')
+        order += ['-userprofile__followers_count', 'pk']
+        return list(users.order_by(*order).values_list('pk', flat=True)[:limit])
+
+
+class BookInteraction(models.Model):
+    """
+    Everything a user did with a book, one row per (user, book).
+    The single source of truth for reads, likes, favorites, read later and
+    rates; every profile action is an upsert of this row.
+    """
+    user = models.ForeignKey(User, related_name='book_interactions', on_delete=models.CASCADE)
+    book = models.ForeignKey('Book', related_name='interactions', on_delete=models.CASCADE)
+    is_read = models.BooleanField(default=False)
+    date_readed = models.DateTimeField(blank=True, null=True)
+    is_liked = models.BooleanField(default=False)
+    date_liked = models.DateTimeField(blank=True, null=True)
+    is_favorite = models.BooleanField(default=False)
+    date_favorite = models.DateTimeField(blank=True, null=True)
+    is_read_later = models.BooleanField(default=False)
+    date_read_later = models.DateTimeField(blank=True, null=True)
+    rate = models.FloatField(validators=[MinValueValidator(0.0), MaxValueValidator(5.0)], blank=True, null=True)
+    date_rated = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'book'], name='unique_user_book_interaction'),
+        ]
+        indexes = [
+            models.Index(fields=['book', 'is_read', 'date_readed'], name='interaction_book_readers'),
+            models.Index(fields=['user', 'is_read', 'date_readed'], name='interaction_user_read'),
+            models.Index(fields=['user', 'is_liked', 'date_liked'], name='interaction_user_liked'),
+            models.Index(fields=['user', 'is_favorite', 'date_favorite'], name='interaction_user_favorite'),
+            models.Index(fields=['user', 'is_read_later', 'date_read_later'], name='interaction_user_read_later'),
+        ]
 
     def __str__(self):
-        return self.user.username + ' liked ' + self.book.title
+        return self.user.username + ' - ' + self.book.title
 
 
 class Author(models.Model):
@@ -346,13 +639,241 @@ class Review(models.Model):
     date_created = models.DateTimeField(default=timezone.now)
     is_active = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['book', 'date_created', 'id'], name='review_book_date'),
+        ]
+
+    # is_active as stored in database, to count activations in BookStats.
+    saved_is_active = False
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'is_active' in field_names:
+            instance.saved_is_active = instance.is_active
+        return instance
+
+    def save(self, *args, **kwargs):
+        super(Review, self).save(*args, **kwargs)
+        if self.is_active != self.saved_is_active:
+            BookStats.change(self.book_id, reviews_count=1 if self.is_active else -1)
+            # Reviews reach the feeds once they are approved.
+            if self.is_active:
+                Activity.publish(self.user_id, Activity.REVIEW, [self.book_id], review=self)
+            else:
+                self.activities.all().delete()
+            self.saved_is_active = self.is_active
+
+    def delete(self, *args, **kwargs):
+        if self.saved_is_active:
+            BookStats.change(self.book_id, reviews_count=-1)
+        return super(Review, self).delete(*args, **kwargs)
+
     def __str__(self):
         return self.user.username + ' review ' + self.book.title
 
 
+class Activity(models.Model):
+    """
+    Something a user did with a book, written once when the UserProfile
+    action (or the activation of a review) happens and removed when it is
+    undone. Activities of users with up to FEED_FANOUT_LIMIT followers are
+    copied to the TimelineEntry rows of their followers when written;
+    those of more followed users are not (`fanned_out` False) and are read
+    from here when a follower reads the feed (see accounts.feed).
+    """
+    READ = 'read'
+    LIKE = 'like'
+    RATE = 'rate'
+    REVIEW = 'review'
+    VERB_CHOICES = (
+        (READ, 'Read'),
+        (LIKE, 'Like'),
+        (RATE, 'Rate'),
+        (REVIEW, 'Review'),
+    )
+
+    user = models.ForeignKey(User, related_name='activities', on_delete=models.CASCADE)
+    verb = models.CharField(max_length=10, choices=VERB_CHOICES)
+    book = models.ForeignKey('Book', related_name='activities', on_delete=models.CASCADE)
+    rate = models.FloatField(blank=True, null=True)
+    review = models.ForeignKey(Review, related_name='activities', on_delete=models.CASCADE, blank=True, null=True)
+    date_created = models.DateTimeField(default=timezone.now)
+    fanned_out = models.BooleanField(default=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'book'], name='activity_user_book'),
+            models.Index(fields=['user', 'id'], name='activity_pulled', condition=Q(fanned_out=False)),
+        ]
+
+    @classmethod
+    def publish(cls, user_id, verb, books, **fields):
+        """
+        Record that user `user_id` did `verb` with `books` (instances or
+        ids) and deliver it to the timelines of their followers.
+        """
+        ids = sorted(book_ids(books))
+        if not ids:
+            return
+        limit = settings.FEED_FANOUT_LIMIT
+        followers = list(
+            UserProfile.followers.through.objects.filter(userprofile__user=user_id)
+            .values_list('user_id', flat=True)[:limit + 1]
+        )
+        fanned_out = len(followers) <= limit
+        now = timezone.now()
+        with transaction.atomic():
+            cls.objects.bulk_create([
+                cls(user_id=user_id, verb=verb, book_id=pk, date_created=now, fanned_out=fanned_out, **fields)
+                for pk in ids
+            ])
+            if fanned_out and followers:
+                activities = cls.objects.filter(user=user_id, book__in=ids, verb=verb, date_created=now)
+                TimelineEntry.objects.bulk_create([
+                    TimelineEntry(owner_id=follower, activity_id=activity)
+                    for activity in activities.values_list('pk', flat=True) for follower in followers
+                ], batch_size=1000)
+
+    @classmethod
+    def retract(cls, user_id, verb, books):
+        """ Remove the `verb` activities of a user on `books`, and their timeline entries. """
+        cls.objects.filter(user=user_id, book__in=book_ids(books), verb=verb).delete()
+
+    def __str__(self):
+        return f'{self.user_id} {self.verb} {self.book_id}'
+
+
+class TimelineEntry(models.Model):
+    """
+    An activity delivered to the feed of `owner`, who follows its user.
+    Newer activities have bigger ids, so a feed is read newest first
+    with the (owner, activity) index.
+    """
+    # Recent activities of a user copied to a new follower's timeline.
+    BACKFILL = 20
+
+    owner = models.ForeignKey(User, related_name='timeline', on_delete=models.CASCADE)
+    activity = models.ForeignKey(Activity, related_name='entries', on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'activity'], name='unique_timeline_activity'),
+        ]
+
+    @classmethod
+    def backfill(cls, owner_id, user_id):
+        """ Deliver the latest activities of `user_id` to a new follower. """
+        activities = Activity.objects.filter(user=user_id, fanned_out=True).order_by('-pk')[:cls.BACKFILL]
+        cls.objects.bulk_create([
+            cls(owner_id=owner_id, activity_id=pk) for pk in activities.values_list('pk', flat=True)
+        ], ignore_conflicts=True)
+
+    @classmethod
+    def drop(cls, owner_id, user_id):
+        """ Remove the activities of `user_id` from the timeline of an unfollower. """
+        cls.objects.filter(owner=owner_id, activity__user=user_id).delete()
+
+
 class BookRawData(models.Model):
+    """
+    A parsed record waiting for review, active until an editor accepts it
+    as a book or rejects it (see web.views.create_book_obj_view).
+    Editors claim batches of records in id order so two of them don't
+    review the same ones, and move through their batch by id: every page
+    costs the same however many records are left. The number left is
+    cached for REMAINING_TIMEOUT seconds then counted again: the cache
+    may be local to each process, its changes don't reach the others.
+    """
+    CLAIM_SIZE = 50
+    CLAIM_TIMEOUT = timezone.timedelta(minutes=30)
+    REMAINING_KEY = 'raw-books-remaining'
+    REMAINING_TIMEOUT = 60
+
     data = models.JSONField(default=dict)
     is_active = models.BooleanField(default=True)
+    claimed_by = models.ForeignKey(User, related_name='claimed_raw_books', on_delete=models.SET_NULL, blank=True, null=True)
+    claimed_until = models.DateTimeField(blank=True, null=True)
+    book = models.ForeignKey('Book', related_name='raw_records', on_delete=models.SET_NULL, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', 'id'], name='rawbook_queue'),
+        ]
+
+    @classmethod
+    def remaining(cls):
+        """ Number of active records, counted at most once per REMAINING_TIMEOUT. """
+        return cache.get_or_set(
+            cls.REMAINING_KEY, lambda: cls.objects.filter(is_active=True).count(), cls.REMAINING_TIMEOUT,
+        )
+
+    @classmethod
+    def change_remaining(cls, delta):
+        """ Keep the count of this process right until it is counted again. """
+        try:
+            cache.incr(cls.REMAINING_KEY, delta)
+        except ValueError:
+            # Not counted yet, remaining() will.
+            pass
+
+    @classmethod
+    def claimed(cls, user):
+        """ Active records held by `user`, in id order. """
+        return cls.objects.filter(is_active=True, claimed_by=user, claimed_until__gte=timezone.now()).order_by('pk')
+
+    @classmethod
+    def claim(cls, user, size=None):
+        """
+        Hold the next `size` active records nobody holds for `user` during
+        CLAIM_TIMEOUT, returns how many were claimed.
+        """
+        now = timezone.now()
+        free = cls.objects.filter(Q(claimed_until=None) | Q(claimed_until__lt=now), is_active=True)
+        ids = list(free.order_by('pk').values_list('pk', flat=True)[:size or cls.CLAIM_SIZE])
+        # Filtered again, records another editor claimed meanwhile stay with that editor.
+        return free.filter(pk__in=ids).update(claimed_by=user, claimed_until=now + cls.CLAIM_TIMEOUT)
+
+    @classmethod
+    def next_for(cls, user, after=0):
+        """
+        The record held by `user` following the record id `after`, back
+        to the first one held after the last. A new batch is claimed when
+        `user` holds none. None when the queue is empty.
+        """
+        claimed = cls.claimed(user)
+        if not claimed.exists():
+            cls.claim(user)
+        return claimed.filter(pk__gt=after).first() or claimed.first()
+
+    def previous_for(self, user):
+        """ The record held by `user` before this one. """
+        return type(self).claimed(user).filter(pk__lt=self.pk).order_by('-pk').first()
+
+    def held_by_other(self, user):
+        return self.claimed_by_id not in (None, user.pk) and self.claimed_until >= timezone.now()
+
+    @classmethod
+    def accept(cls, books):
+        """ Take records out of the queue as the books made of them, `books` maps record ids to books. """
+        records = list(cls.objects.filter(pk__in=books, is_active=True))
+        for record in records:
+            record.is_active = False
+            record.book_id = getattr(books[record.pk], 'pk', books[record.pk])
+            record.claimed_by = record.claimed_until = None
+        cls.objects.bulk_update(records, ['is_active', 'book', 'claimed_by', 'claimed_until'], batch_size=500)
+        cls.change_remaining(-len(records))
+        return len(records)
+
+    @classmethod
+    def reject(cls, ids):
+        """ Take the records of `ids` out of the queue without a book. """
+        count = cls.objects.filter(pk__in=ids, is_active=True).update(
+            is_active=False, claimed_by=None, claimed_until=None,
+        )
+        cls.change_remaining(-count)
+        return count
 
 
 class Book(models.Model):
@@ -376,50 +897,86 @@ class Book(models.Model):
     date_created = models.DateTimeField(default=timezone.now)
     is_active = models.BooleanField(default=True)
     slug = models.SlugField(unique=True, blank=True, null=True, max_length=255)
-    user_readers = models.ManyToManyField(User, related_name='reders_books', blank=True)
-    user_liked = models.ManyToManyField(User, related_name='liked_books', blank=True)
     reviews = models.ManyToManyField(Review, related_name='books', blank=True)
     source = models.CharField(max_length=255, blank=True, null=True)
     source_link = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['publisher', 'date_created', 'id'], name='book_publisher_date'),
+            # Advanced search filters.
+            models.Index(fields=['language'], name='book_language'),
+            models.Index(fields=['label'], name='book_label'),
+            models.Index(fields=['pages'], name='book_pages'),
+            models.Index(fields=['rate'], name='book_rate'),
+        ]
+
+    @property
+    def user_readers(self):
+        return User.objects.filter(book_interactions__book=self, book_interactions__is_read=True)
+
+    @property
+    def user_liked(self):
+        return User.objects.filter(book_interactions__book=self, book_interactions__is_liked=True)
+
     def rate_book(self, user, rate):
-        if user in User.objects.all():
-            if not PersonRate.objects.filter(user=user, book=self).exists():
-                PersonRate.objects.create(user=user, book=self, person_rate=rate)
-            else:
-                pr = PersonRate.objects.get(user=user, book=self)
-                pr.person_rate = rate
-                pr.save()
+        return user.userprofile.rate_book(self, rate)
+
+    @staticmethod
+    def random_slug():
+        return ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(6))
+
+    @classmethod
+    def new_slugs(cls, count):
+        """ `count` random slugs no book has, for books created in bulk. """
+        slugs = set()
+        while len(slugs) < count:
+            slugs |= {cls.random_slug() for _ in range(count - len(slugs))}
+            slugs -= set(cls.objects.filter(slug__in=slugs).values_list('slug', flat=True))
+        return list(slugs)
+
+    def resize_cover(self):
+        """ Shrink a new cover to the book cover size under a random name. """
+        name = ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(12)) + '.' + self.cover.name.split('.')[-1]
+        # check not exist cover name
+        im = Image.open(self.cover)
+        output = BytesIO()
+        # Resize/modify the image to book cover size
+        im.thumbnail((1200, 300), Image.LANCZOS)
+        im.convert('RGB').save(output, format='JPEG', quality=100)
+        output.seek(0)
+        # change the imagefield value to be the newley modifed image value
+        self.cover = InMemoryUploadedFile(output, 'ImageField', "%s.jpg" % self.cover.name.split('.')[0], 'image/jpeg',
+                                        sys.getsizeof(output), None)
+
+        while Book.objects.filter(cover=name).exists():
+            name = ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(22)) + '.' + self.cover.name.split('.')[-1]
+        self.cover.name = name
 
     def save(self, *args, **kwargs):
 
         if not self.slug:  
             # Rename image to random name
             if self.cover:
-                name = ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(12)) + '.' + self.cover.name.split('.')[-1]
-                # check not exist cover name
-                im = Image.open(self.cover)
-                output = BytesIO()
-                # Resize/modify the image to book cover size
-                im.thumbnail((1200, 300), Image.ANTIALIAS)
-                im.convert('RGB').save(output, format='JPEG', quality=100)
-                output.seek(0)
-                # change the imagefield value to be the newley modifed image value
-                self.cover = InMemoryUploadedFile(output, 'ImageField', "%s.jpg" % self.cover.name.split('.')[0], 'image/jpeg',
-                                                sys.getsizeof(output), None)
-
-                while Book.objects.filter(cover=name).exists():
-                    name = ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(22)) + '.' + self.cover.name.split('.')[-1]
-                self.cover.name = name
+                self.resize_cover()
 
             # Slugify title
             # Random 6 char slug
-            slug = ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(6))
+            slug = self.random_slug()
             # check not exist slug
             while Book.objects.filter(slug=slug).exists():
-                slug = ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(6))
+                slug = self.random_slug()
             self.slug = slug
 
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # rate is the copy of BookStats.change_rate, this instance may hold an older one.
+            rates = list(Book.objects.filter(pk=self.pk).values_list('rate', flat=True)[:1])
+            if rates:
+                self.rate = rates[0]
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields if not field.primary_key and field.name != 'rate'
+                ]
+
         super(Book, self).save(*args, **kwargs)
 
     def get_absolute_url(self):
@@ -429,6 +986,286 @@ class Book(models.Model):
         return self.title
 
 
+def rebuild_book_stats(stats_model, books, interactions, reviews, batch_size=1000):
+    """
+    Recompute every row of the BookStats model `stats_model`, and the
+    Book.rate copies of the averages, from the BookInteraction and Review
+    models, which may be the historical models of a migration.
+    """
+    stats = {}
+
+    def row(book_id):
+        if book_id not in stats:
+            stats[book_id] = stats_model(book_id=book_id)
+        return stats[book_id]
+
+    rates = interactions.objects.exclude(rate=None).values('book').annotate(
+        count=Count('id'),
+        total=Sum('rate'),
+        rate_1=Count('id', filter=Q(rate__lt=1.5)),
+        rate_2=Count('id', filter=Q(rate__gte=1.5, rate__lt=2.5)),
+        rate_3=Count('id', filter=Q(rate__gte=2.5, rate__lt=3.5)),
+        rate_4=Count('id', filter=Q(rate__gte=3.5, rate__lt=4.5)),
+        rate_5=Count('id', filter=Q(rate__gte=4.5)),
+    ).order_by()
+    for rate in rates:
+        obj = row(rate['book'])
+        obj.rate_count = rate['count']
+        obj.rate_sum = rate['total']
+        for star in range(1, 6):
+            setattr(obj, f'rate_{star}', rate[f'rate_{star}'])
+
+    counters = (
+        ('readers_count', interactions.objects.filter(is_read=True)),
+        ('likes_count', interactions.objects.filter(is_liked=True)),
+        ('reviews_count', reviews.objects.filter(is_active=True)),
+    )
+    for field, queryset in counters:
+        for counter in queryset.values('book').annotate(count=Count('id')).order_by():
+            setattr(row(counter['book']), field, counter['count'])
+
+    with transaction.atomic():
+        stats_model.objects.all().delete()
+        stats_model.objects.bulk_create(stats.values(), batch_size=batch_size)
+        books.objects.update(rate=0.0)
+        rates = [books(pk=book_id, rate=round(obj.rate_sum / obj.rate_count, 2)) for book_id, obj in stats.items() if obj.rate_count]
+        books.objects.bulk_update(rates, ['rate'], batch_size=batch_size)
+    return len(stats)
+
+
+class BookStats(models.Model):
+    """
+    Aggregates of a book: rates, readers, likes and active reviews.
+    Kept up to date incrementally by UserProfile actions so pages never
+    aggregate over BookInteraction. The average rate is also
+    copied to Book.rate. `./manage.py rebuild_book_stats` recomputes all.
+    """
+    book = models.OneToOneField(Book, related_name='stats', on_delete=models.CASCADE, primary_key=True)
+    rate_count = models.IntegerField(default=0)
+    rate_sum = models.FloatField(default=0.0)
+    # Histogram, rates are rounded to the nearest star.
+    rate_1 = models.IntegerField(default=0)
+    rate_2 = models.IntegerField(default=0)
+    rate_3 = models.IntegerField(default=0)
+    rate_4 = models.IntegerField(default=0)
+    rate_5 = models.IntegerField(default=0)
+    readers_count = models.IntegerField(default=0)
+    likes_count = models.IntegerField(default=0)
+    reviews_count = models.IntegerField(default=0)
+
+    @property
+    def rate_average(self):
+        if not self.rate_count:
+            return 0.0
+        return round(self.rate_sum / self.rate_count, 2)
+
+    @property
+    def rate_histogram(self):
+        return {star: getattr(self, f'rate_{star}') for star in range(1, 6)}
+
+    @staticmethod
+    def star(rate):
+        """ Histogram column of a rate. """
+        return f'rate_{min(5, max(1, int(rate + 0.5)))}'
+
+    @classmethod
+    def change(cls, book, **deltas):
+        """
+        Add `deltas` to the counters of `book` (instance or id) with a
+        single UPDATE, creating the row on first use.
+        """
+        cls.change_many([book], **deltas)
+
+    @classmethod
+    def change_many(cls, books, **deltas):
+        """ Same as change() for many books at once. """
+        ids = book_ids(books)
+        values = {field: F(field) + delta for field, delta in deltas.items()}
+        if cls.objects.filter(book_id__in=ids).update(**values) < len(ids):
+            missing = ids - set(cls.objects.filter(book_id__in=ids).values_list('book_id', flat=True))
+            cls.objects.bulk_create([cls(book_id=book_id) for book_id in missing], ignore_conflicts=True)
+            cls.objects.filter(book_id__in=missing).update(**values)
+
+    @classmethod
+    def change_rate(cls, book, previous, rate):
+        """
+        Replace the `previous` rate of a user (None if new) by `rate`
+        and copy the new average to Book.rate.
+        """
+        deltas = {}
+        if previous is None:
+            deltas['rate_count'] = 1
+            deltas['rate_sum'] = rate
+        else:
+            deltas['rate_sum'] = rate - previous
+            deltas[cls.star(previous)] = -1
+        deltas[cls.star(rate)] = deltas.get(cls.star(rate), 0) + 1
+        cls.change(book, **deltas)
+
+        old_rate = Book.objects.filter(pk=book.pk).values_list('rate', flat=True).first()
+        book.rate = cls.objects.get(book=book).rate_average
+        Book.objects.filter(pk=book.pk).update(rate=book.rate)
+        if FacetCount.rate_bucket(old_rate) != FacetCount.rate_bucket(book.rate):
+            FacetCount.change([(FacetCount.RATE, FacetCount.rate_bucket(old_rate))], -1)
+            FacetCount.change([(FacetCount.RATE, FacetCount.rate_bucket(book.rate))], 1)
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        """
+        Recompute the stats of every book from scratch.
+        """
+        count = rebuild_book_stats(cls, Book, BookInteraction, Review, batch_size)
+        FacetCount.rebuild(FacetCount.RATE)
+        return count
+
+
+def rebuild_facet_counts(facets, books, *dimensions):
+    """
+    Recompute the rows of `dimensions` (all by default) of the FacetCount
+    model `facets` from the Book model `books`, which may be the
+    historical models of a migration.
+    """
+    dimensions = dimensions or (
+        FacetCount.AUTHOR, FacetCount.TRANSLATOR, FacetCount.PAGES, FacetCount.RATE, *FacetCount.FIELDS,
+    )
+    rows = []
+    for dimension in dimensions:
+        if dimension in FacetCount.FIELDS:
+            field = FacetCount.FIELDS[dimension]
+            matched = books.objects.exclude(**{f'{field}__isnull': True})
+            if dimension in (FacetCount.LANGUAGE, FacetCount.LABEL):
+                matched = matched.exclude(**{field: ''})
+            counts = matched.values_list(field).annotate(count=Count('pk')).order_by()
+        elif dimension in (FacetCount.AUTHOR, FacetCount.TRANSLATOR):
+            through = getattr(books, f'{dimension}s').through
+            counts = through.objects.values_list(f'{dimension}_id').annotate(count=Count('pk')).order_by()
+        else:
+            bucket = FacetCount.pages_bucket if dimension == FacetCount.PAGES else FacetCount.rate_bucket
+            totals = {}
+            for value, count in books.objects.values_list(dimension).annotate(count=Count('pk')).order_by():
+                totals[bucket(value)] = totals.get(bucket(value), 0) + count
+            counts = totals.items()
+        rows += [facets(dimension=dimension, value=str(value), count=count) for value, count in counts]
+    with transaction.atomic():
+        facets.objects.filter(dimension__in=dimensions).delete()
+        facets.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+class FacetCount(models.Model):
+    """
+    Number of books per value of each advanced search facet, e.g. books
+    of a publisher or with 200 to 300 pages. Kept up to date by
+    book.signals and BookStats.change_rate so unfiltered facet counts are
+    read from here instead of grouping the Book table.
+    `./manage.py rebuild_facet_counts` recomputes all.
+    """
+    AUTHOR = 'author'
+    TRANSLATOR = 'translator'
+    PUBLISHER = 'publisher'
+    SIZE = 'size'
+    COVER_TYPE = 'cover_type'
+    LANGUAGE = 'language'
+    LABEL = 'label'
+    PAGES = 'pages'
+    RATE = 'rate'
+    # Book field of the single valued facets.
+    FIELDS = {
+        PUBLISHER: 'publisher_id',
+        SIZE: 'size_id',
+        COVER_TYPE: 'cover_type_id',
+        LANGUAGE: 'language',
+        LABEL: 'label',
+    }
+    # (first, last) pages of each bucket, last is None for the open one.
+    PAGES_BUCKETS = ((0, 99), (100, 199), (200, 299), (300, 499), (500, None))
+
+    dimension = models.CharField(max_length=20)
+    value = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'value'], name='unique_facet_value'),
+        ]
+        indexes = [
+            models.Index(fields=['dimension', '-count'], name='facet_dimension_count'),
+        ]
+
+    def __str__(self):
+        return f'{self.dimension}={self.value} ({self.count})'
+
+    @classmethod
+    def pages_bucket(cls, pages):
+        pages = pages or 0
+        for first, last in cls.PAGES_BUCKETS:
+            if last is None or pages <= last:
+                return f'{first}-{last or ""}'
+
+    @staticmethod
+    def rate_bucket(rate):
+        """ Whole stars below the rate: '3' holds rates from 3 to 3.99. """
+        return str(min(4, int(rate or 0)))
+
+    @classmethod
+    def book_values(cls, book):
+        """ (dimension, value) pairs of the single valued facets of `book`. """
+        values = {
+            (dimension, str(getattr(book, field)))
+            for dimension, field in cls.FIELDS.items() if getattr(book, field) not in (None, '')
+        }
+        values.add((cls.PAGES, cls.pages_bucket(book.pages)))
+        values.add((cls.RATE, cls.rate_bucket(book.rate)))
+        return values
+
+    @classmethod
+    def change(cls, values, delta):
+        """
+        Add `delta` to the count of each (dimension, value) pair,
+        creating missing rows.
+        """
+        for dimension, value in values:
+            if cls.objects.filter(dimension=dimension, value=value).update(count=F('count') + delta):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(dimension=dimension, value=value, count=delta)
+            except IntegrityError:
+                cls.objects.filter(dimension=dimension, value=value).update(count=F('count') + delta)
+
+    @classmethod
+    def change_many(cls, deltas):
+        """
+        Same as change() with a delta per (dimension, value) pair of the
+        `deltas` dict, in a few queries whatever the number of pairs.
+        """
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        rows = cls.objects.filter(
+            dimension__in={dimension for dimension, value in deltas}, value__in={value for dimension, value in deltas},
+        )
+        rows = [row for row in rows if (row.dimension, row.value) in deltas]
+        for row in rows:
+            row.count = F('count') + deltas.pop((row.dimension, row.value))
+        cls.objects.bulk_update(rows, ['count'], batch_size=500)
+        try:
+            with transaction.atomic():
+                cls.objects.bulk_create([
+                    cls(dimension=dimension, value=value, count=delta) for (dimension, value), delta in deltas.items()
+                ], batch_size=500)
+        except IntegrityError:
+            for value, delta in deltas.items():
+                cls.change([value], delta)
+
+    @classmethod
+    def rebuild(cls, *dimensions):
+        """
+        Recompute the counts of `dimensions` (all by default) from scratch.
+        """
+        return rebuild_facet_counts(cls, Book, *dimensions)
+
+
 class BookList(models.Model):
     """
     List of books created by specific user.
@@ -455,6 +1292,190 @@ class BookList(models.Model):
         super(BookList, self).save(*args, **kwargs)
 
 
+class MainListSnapshot(models.Model):
+    """
+    A published version of the curated main book list: ordered book ids
+    and their MinBookSerializer payloads, rendered once when editors
+    publish (see main.snapshot). The newest snapshot is the current one.
+    """
+    book_list = models.ForeignKey(BookList, related_name='snapshots', on_delete=models.SET_NULL, blank=True, null=True)
+    book_ids = models.JSONField(default=list, blank=True)
+    books = models.JSONField(default=list, blank=True)
+    published_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
+    date_published = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        get_latest_by = 'pk'
+
+    def __str__(self):
+        return f'{len(self.book_ids)} books published {self.date_published:%Y-%m-%d %H:%M}'
+
+
+
+class CrawlURL(models.Model):
+    """
+    A page of a crawled site and what its last fetch found: a crawl
+    resumes where the previous one stopped, and a re-crawl asks for the
+    page with its validators and skips it when nothing changed (see
+    scrapers.thbook.crawl_books). Rows are saved in batches by the
+    crawler, call checkpoint() with the changed ones.
+    """
+    PENDING = 'pending'
+    FETCHED = 'fetched'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Pending'),
+        (FETCHED, 'Fetched'),
+        (FAILED, 'Failed'),
+    )
+    MAX_ATTEMPTS = 3
+    STATE_FIELDS = ('status', 'etag', 'last_modified', 'content_hash', 'attempts', 'date_fetched', 'book')
+
+    source = models.CharField(max_length=50)
+    url = models.TextField(unique=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    etag = models.CharField(max_length=255, blank=True, default='')
+    last_modified = models.CharField(max_length=64, blank=True, default='')
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    date_fetched = models.DateTimeField(blank=True, null=True)
+    book = models.ForeignKey(Book, related_name='crawl_urls', on_delete=models.SET_NULL, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['source', 'status', 'date_fetched'], name='crawlurl_frontier'),
+        ]
+
+    def __str__(self):
+        return f'{self.url} ({self.status})'
+
+    @classmethod
+    def enqueue(cls, source, urls):
+        """
+        Add the new `urls` of `source`, those of books already crawled
+        (their source_link) count as fetched. Known urls are kept as is.
+        """
+        books = dict(Book.objects.filter(source=source).exclude(source_link=None).values_list('source_link', 'pk'))
+        now = timezone.now()
+        cls.objects.bulk_create([
+            cls(source=source, url=url, book_id=books[url], status=cls.FETCHED, date_fetched=now)
+            if url in books else cls(source=source, url=url)
+            for url in dict.fromkeys(url.strip() for url in urls) if url
+        ], batch_size=500, ignore_conflicts=True)
+
+    @classmethod
+    def frontier(cls, source, refresh_before=None):
+        """
+        Urls of `source` to fetch: never fetched, failed fewer than
+        MAX_ATTEMPTS times, or fetched before `refresh_before`.
+        """
+        due = Q(status=cls.PENDING) | Q(status=cls.FAILED, attempts__lt=cls.MAX_ATTEMPTS)
+        if refresh_before is not None:
+            due |= Q(status=cls.FETCHED, date_fetched__lt=refresh_before)
+        return cls.objects.filter(due, source=source).order_by('pk')
+
+    @classmethod
+    def checkpoint(cls, rows):
+        """ Save the state of fetched `rows` in a few statements. """
+        cls.objects.bulk_update(rows, cls.STATE_FIELDS, batch_size=100)
+
+    def conditional_headers(self):
+        """ Headers asking for the page only if it changed since the last fetch. """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def fetched(self, response, content_hash=None):
+        """
+        Record a fetch answered with `response` (None when it failed),
+        `content_hash` being the hash of its body. Returns True when the
+        page is new or changed.
+        """
+        self.date_fetched = timezone.now()
+        if response is None or response.status_code not in (200, 304):
+            self.status = self.FAILED
+            self.attempts += 1
+            return False
+        self.status = self.FETCHED
+        self.attempts = 0
+        self.etag = response.headers.get('ETag', self.etag)[:255]
+        self.last_modified = response.headers.get('Last-Modified', self.last_modified)[:64]
+        if response.status_code == 304 or content_hash == self.content_hash:
+            return False
+        self.content_hash = content_hash
+        return True
+
+
+class ImportJob(models.Model):
+    """
+    An uploaded catalogue workbook imported in the background (see
+    web.functions.import_excel). Counts are saved after every batch of
+    rows so the upload page can show the progress.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    file = models.FileField(upload_to='imports/')
+    publisher = models.ForeignKey(Publisher, related_name='import_jobs', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='import_jobs', on_delete=models.SET_NULL, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    rows = models.PositiveIntegerField(blank=True, null=True)
+    processed = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    duplicates = models.PositiveIntegerField(default=0)
+    invalid = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_finished = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-date_created']
+
+    def __str__(self):
+        return f'{self.file.name} ({self.status})'
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    @property
+    def progress(self):
+        """ Percent of the rows processed, None while the number of rows is unknown. """
+        if not self.rows:
+            return 100 if self.status == self.DONE else None
+        return min(100, self.processed * 100 // self.rows)
+
+    def start(self, rows=None):
+        self.status = self.RUNNING
+        self.rows = rows
+        self.save(update_fields=['status', 'rows'])
+
+    def advance(self, processed, created=0, duplicates=0, invalid=0):
+        """ Add the counts of a batch of rows, in one statement. """
+        self.processed += processed
+        self.created += created
+        self.duplicates += duplicates
+        self.invalid += invalid
+        self.save(update_fields=['processed', 'created', 'duplicates', 'invalid'])
+
+    def finish(self, error=''):
+        self.status = self.FAILED if error else self.DONE
+        self.error = error
+        self.date_finished = timezone.now()
+        self.save(update_fields=['status', 'error', 'date_finished'])
+
+
 class Size(models.Model):
     """
     Size of book.
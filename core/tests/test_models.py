@@ -1,6 +1,11 @@
+from importlib import import_module
+
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.core.files import File
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test.utils import CaptureQueriesContext
 
 from core.models import *
 
@@ -184,3 +189,137 @@ class TestModels(TestCase):
             receiver=receiver,
         )
         self.assertNotEqual(invitation1.code, invitation2.code)
+
+
+class TestBookStats(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title='Test Book')
+        self.profiles = [
+            UserProfile.objects.create(user=User.objects.create_user(username=f'reader{i}'))
+            for i in range(3)
+        ]
+
+    def test_incremental_stats(self):
+        first, second, third = self.profiles
+        first.rate_book(self.book, 5)
+        second.rate_book(self.book, 2)
+        second.rate_book(self.book, 4)
+        third.like_book(self.book)
+        third.like_book(self.book)
+        first.add_review(self.book, 'Great')
+        review = Review.objects.get(user=first.user)
+        review.is_active = True
+        review.save()
+
+        stats = BookStats.objects.get(book=self.book)
+        self.assertEqual(stats.rate_count, 2)
+        self.assertEqual(stats.rate_average, 4.5)
+        self.assertEqual(stats.rate_histogram, {1: 0, 2: 0, 3: 0, 4: 1, 5: 1})
+        self.assertEqual(stats.readers_count, 3)
+        self.assertEqual(stats.likes_count, 1)
+        self.assertEqual(stats.reviews_count, 1)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rate, 4.5)
+
+        third.unlike_book(self.book)
+        third.unread_book(self.book)
+        review.delete()
+        stats.refresh_from_db()
+        self.assertEqual((stats.likes_count, stats.readers_count, stats.reviews_count), (0, 2, 0))
+
+    def test_rebuild_matches_incremental(self):
+        first, second, third = self.profiles
+        first.rate_book(self.book, 3)
+        second.rate_book(self.book, 1)
+        third.like_book(self.book)
+        fields = ['rate_count', 'rate_sum', 'rate_1', 'rate_3', 'readers_count', 'likes_count']
+        incremental = BookStats.objects.filter(book=self.book).values(*fields).get()
+
+        BookStats.objects.all().delete()
+        BookStats.rebuild()
+        self.assertEqual(BookStats.objects.filter(book=self.book).values(*fields).get(), incremental)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rate, 2.0)
+
+    def test_stale_book_keeps_rate(self):
+        stale = Book.objects.get(pk=self.book.pk)
+        self.profiles[0].rate_book(self.book, 4)
+        stale.title = 'Renamed'
+        stale.save()
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.title, self.book.rate), ('Renamed', 4.0))
+        self.assertEqual(FacetCount.objects.get(dimension=FacetCount.RATE, value='4').count, 1)
+        self.assertEqual(FacetCount.objects.get(dimension=FacetCount.RATE, value='0').count, 0)
+
+    def test_migration_fills_stats(self):
+        first, second, third = self.profiles
+        first.rate_book(self.book, 3)
+        second.rate_book(self.book, 1)
+        third.like_book(self.book)
+        BookStats.objects.all().delete()
+        Book.objects.update(rate=0.0)
+        migration = import_module('core.migrations.0036_copy_book_interactions')
+        apps = MigrationLoader(connection).project_state(('core', '0036_copy_book_interactions')).apps
+        migration.fill_book_stats(apps, None)
+        stats = BookStats.objects.get(book=self.book)
+        self.assertEqual((stats.rate_count, stats.rate_sum, stats.readers_count, stats.likes_count), (2, 4.0, 3, 1))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rate, 2.0)
+
+
+class TestProfileActions(TestCase):
+    def setUp(self):
+        self.profile = UserProfile.objects.create(user=User.objects.create_user(username='reader'))
+        self.books = [Book.objects.create(title=f'Book {i}') for i in range(3)]
+
+    def test_read_books_bulk(self):
+        self.assertTrue(self.profile.read_book(self.books[0]))
+        self.assertFalse(self.profile.read_book(self.books[0]))
+        added = self.profile.read_books(self.books)
+        self.assertEqual(added, {self.books[1].pk, self.books[2].pk})
+        self.assertEqual(self.profile.readed_books.count(), 3)
+        self.assertEqual(BookInteraction.objects.filter(user=self.profile.user, is_read=True).count(), 3)
+        self.assertEqual(self.books[1].user_readers.count(), 1)
+
+        self.assertEqual(self.profile.unread_books(self.books[:2]), {self.books[0].pk, self.books[1].pk})
+        self.assertFalse(self.profile.unread_book(self.books[0]))
+        self.assertEqual(BookStats.objects.get(book=self.books[0]).readers_count, 0)
+        self.assertEqual(BookStats.objects.get(book=self.books[2]).readers_count, 1)
+
+    def test_single_interaction_row(self):
+        book = self.books[0]
+        self.profile.add_read_later_book(book)
+        self.profile.like_book(book)
+        self.profile.add_favorite_book(book)
+        self.profile.rate_book(book, 4)
+        interaction = BookInteraction.objects.get(user=self.profile.user)
+        self.assertTrue(interaction.is_read and interaction.is_liked and interaction.is_favorite)
+        self.assertTrue(interaction.is_read_later)
+        self.assertEqual(interaction.rate, 4)
+        self.assertEqual(list(self.profile.favorite_books), [book])
+        self.assertEqual(list(book.user_liked), [self.profile.user])
+
+        # Flipping a flag of an existing row is a single UPDATE, plus the
+        # one of the profile counter.
+        with self.assertNumQueries(2):
+            self.assertTrue(self.profile.remove_read_later_book(book))
+
+    def test_action_queries_do_not_grow_with_catalogue(self):
+        def like_queries(book):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertTrue(self.profile.like_book(book))
+            return [query['sql'] for query in queries.captured_queries]
+
+        few = like_queries(self.books[0])
+        Book.objects.bulk_create([Book(title=f'More {i}') for i in range(50)])
+        many = like_queries(self.books[1])
+        self.assertEqual(len(few), len(many))
+        for sql in many:
+            self.assertNotIn('FROM "core_book" LIMIT', sql)
+
+    def test_remove_review(self):
+        book = self.books[0]
+        self.profile.add_review(book, 'Nice')
+        review = Review.objects.get(user=self.profile.user)
+        self.assertTrue(self.profile.remove_review(book, review))
+        self.assertEqual(Review.objects.count(), 0)
@@ -0,0 +1,77 @@
+import hashlib
+import json
+
+from django.core.cache import cache, caches
+from django.utils.cache import parse_etags, patch_cache_control, patch_vary_headers, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+VERSION_KEY = 'main-version'
+# Rates shown in book lists change without touching the admin, cached
+# pages live at most this many seconds.
+CACHE_TIMEOUT = 60 * 10
+
+
+def expire():
+    """ Forget every cached home screen response. """
+    try:
+        caches['versions'].incr(VERSION_KEY)
+    except ValueError:
+        pass
+
+
+def etag(data):
+    content = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return quote_etag(hashlib.sha1(content.encode()).hexdigest())
+
+
+class CachedListMixin:
+    """
+    Cache the rendered list of a home screen endpoint until editors change
+    something (see main.signals) and answer a matching If-None-Match with
+    304 Not Modified. Views setting `per_user` show viewer state: the
+    list is cached once for everybody and personalize() adds the state
+    of the viewer to it on every request, so it is never stale.
+    """
+    per_user = False
+
+    def cache_scope(self):
+        """ Extra part of the cache key, a view can return what its content depends on. """
+        return ''
+
+    def cache_key(self, request):
+        version = caches['versions'].get_or_set(VERSION_KEY, 1, None)
+        query = hashlib.md5(request.GET.urlencode().encode()).hexdigest()
+        return f'main:{type(self).__name__}:{version}:{self.cache_scope()}:{query}'
+
+    def personalize(self, request, data):
+        """ The cached `data` with the state of the viewer, for `per_user` views. """
+        return data
+
+    def list_data(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs).data
+
+    def list(self, request, *args, **kwargs):
+        key = self.cache_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            data = self.list_data(request, *args, **kwargs)
+            cached = (data, etag(data))
+            cache.set(key, cached, CACHE_TIMEOUT)
+        data, tag = cached
+        if self.per_user:
+            data = self.personalize(request, data)
+            tag = etag(data)
+        if tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')) or \
+                request.META.get('HTTP_IF_NONE_MATCH', '').strip() == '*':
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = tag
+        if self.per_user:
+            patch_vary_headers(response, ['Authorization'])
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, no_cache=True)
+        return response
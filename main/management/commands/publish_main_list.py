@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import BookList
+from main.snapshot import publish, MAIN_LIST_NAME
+
+
+class Command(BaseCommand):
+    help = 'Render a book list and make it the main list of the home screen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slug', help=f'Slug of the list to publish, the list named "{MAIN_LIST_NAME}" by default')
+
+    def handle(self, *args, **options):
+        book_list = None
+        if options['slug']:
+            book_list = BookList.objects.filter(slug=options['slug']).first()
+            if book_list is None:
+                raise CommandError(f'No list with slug {options["slug"]}')
+        snapshot = publish(book_list)
+        self.stdout.write(self.style.SUCCESS(f'Published {len(snapshot.book_ids)} books as the main list'))
@@ -52,7 +52,7 @@ class BannersSerailzer(serializers.ModelSerializer):
     def get_related_list(self, obj):
         # url = reverse('booklist:book-detail', kwargs={'slug': obj.related_list.slug})
         # base = settings.BASE_URL
-        return obj.related_list.slug # base + url
+        return obj.related_list.slug if obj.related_list else None # base + url
     
     # Slider is choices=(('slider1', 'slider1'), ('slider2', 'slider2'))
     slider = serializers.SerializerMethodField()
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from core.models import CategoryPosts, Publisher, BookList, Baners
+from main import cache
+
+
+@receiver(post_save, sender=CategoryPosts)
+@receiver(post_save, sender=Publisher)
+@receiver(post_save, sender=BookList)
+@receiver(post_save, sender=Baners)
+@receiver(post_delete, sender=CategoryPosts)
+@receiver(post_delete, sender=Publisher)
+@receiver(post_delete, sender=BookList)
+@receiver(post_delete, sender=Baners)
+@receiver(m2m_changed, sender=BookList.books.through)
+def expire_home_screen(sender, **kwargs):
+    cache.expire()
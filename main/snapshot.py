@@ -0,0 +1,47 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from core.models import Book, BookList, MainListSnapshot
+from book.serializers import MinBookSerializer
+from main import cache as main_cache
+
+
+CACHE_KEY = 'main-list-snapshot'
+MAIN_LIST_NAME = 'main'
+
+
+def publish(book_list=None, user=None):
+    """
+    Render `book_list` (the list named "main" by default) and make it the
+    current main list. Readers switch to it as soon as the transaction
+    commits, never seeing half of it.
+    """
+    if book_list is None:
+        book_list = BookList.objects.filter(name=MAIN_LIST_NAME).order_by('pk').first()
+    ids = []
+    if book_list is not None:
+        ids = list(
+            BookList.books.through.objects.filter(booklist=book_list).order_by('pk').values_list('book_id', flat=True)
+        )
+    books = Book.objects.in_bulk(ids)
+    ids = [pk for pk in ids if pk in books]
+    payloads = [dict(row) for row in MinBookSerializer([books[pk] for pk in ids], many=True, context={}).data]
+    with transaction.atomic():
+        snapshot = MainListSnapshot.objects.create(book_list=book_list, book_ids=ids, books=payloads, published_by=user)
+        transaction.on_commit(main_cache.expire)
+    return snapshot
+
+
+def current():
+    """
+    (snapshot id, book payloads) of the newest snapshot. Payloads are
+    cached, only the id of the newest snapshot is read per call.
+    """
+    latest = MainListSnapshot.objects.order_by('-pk').values_list('pk', flat=True).first()
+    if latest is None:
+        latest = publish().pk
+    cached = cache.get(CACHE_KEY)
+    if cached is None or cached[0] != latest:
+        cached = (latest, MainListSnapshot.objects.get(pk=latest).books)
+        cache.set(CACHE_KEY, cached, None)
+    return cached
@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from core.models import CategoryPosts, Publisher, BookList, Baners
+from main.cache import VERSION_KEY
+
+
+class HomeScreenCacheTest(TestCase):
+    """Test the cached, ETag aware home screen endpoints"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create(username='editor')
+        CategoryPosts.objects.create(name='رمان')
+        Publisher.objects.create(name='نی', is_show=True)
+
+    def test_etag_and_not_modified(self):
+        """Test a matching If-None-Match is answered with 304 from the cache"""
+        response = self.client.get('/main/categoryPosts/')
+        self.assertEqual(response.status_code, 200)
+        tag = response['ETag']
+        self.assertTrue(tag.startswith('"'))
+        with self.assertNumQueries(0):
+            response = self.client.get('/main/categoryPosts/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], tag)
+        response = self.client.get('/main/categoryPosts/', HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['name'], 'رمان')
+
+    def test_saves_expire_the_cache(self):
+        """Test saving a category, publisher, list or banner changes the response"""
+        tag = self.client.get('/main/publishers/')['ETag']
+        publisher = Publisher.objects.get()
+        publisher.name = 'چشمه'
+        publisher.save()
+        response = self.client.get('/main/publishers/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['name'], 'چشمه')
+
+        tag = self.client.get('/main/banners/')['ETag']
+        Baners.objects.create(name='banner', related_list=BookList.objects.create(name='list', user=self.user))
+        response = self.client.get('/main/banners/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['related_list'], BookList.objects.get().slug)
+
+    def test_culled_cache_keeps_version(self):
+        """Test emptying the response cache doesn't bring back responses of an older version"""
+        self.client.get('/main/publishers/')
+        Publisher.objects.filter(is_show=True).update(name='چشمه')
+        Publisher.objects.get().save()
+        self.assertEqual(self.client.get('/main/publishers/').data['results'][0]['name'], 'چشمه')
+        # What a cull of the full response cache could delete.
+        cache.delete(VERSION_KEY)
+        self.assertEqual(self.client.get('/main/publishers/').data['results'][0]['name'], 'چشمه')
+
+    def test_banners_in_one_query(self):
+        """Test banners load their related list with the same query as the page"""
+        for i in range(5):
+            Baners.objects.create(name=f'banner {i}', related_list=BookList.objects.create(name=f'list {i}', user=self.user))
+        Baners.objects.create(name='no list')
+        with self.assertNumQueries(2):
+            response = self.client.get('/main/banners/')
+        self.assertEqual(len(response.data['results']), 2)
+        with self.assertNumQueries(2):
+            response = self.client.get('/main/banners/', {'page': 3})
+        self.assertEqual(response.data['results'][1]['related_list'], None)
@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from core.models import Book, BookList, UserProfile, MainListSnapshot
+from main import snapshot
+
+
+class MainListSnapshotTest(TestCase):
+    """Test the published main book list"""
+
+    url = '/main/mainBookList/'
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.editor = User.objects.create(username='editor')
+        self.books = [Book.objects.create(title=f'Book {i}') for i in range(3)]
+        self.main = BookList.objects.create(name='main', user=self.editor)
+        self.main.books.add(self.books[2])
+        self.main.books.add(self.books[0])
+
+    def titles(self, response):
+        return [book['title'] for book in response.data['results']]
+
+    def test_first_request_publishes(self):
+        """Test the main list is published on first use"""
+        response = self.client.get(self.url)
+        self.assertEqual(self.titles(response), ['Book 2', 'Book 0'])
+        self.assertEqual(MainListSnapshot.objects.count(), 1)
+
+    def test_changes_show_after_publishing(self):
+        """Test editors republish the list and every worker serves the new one"""
+        first = snapshot.publish()
+        self.main.books.add(self.books[1])
+        self.assertEqual(self.titles(self.client.get(self.url)), ['Book 2', 'Book 0'])
+        snapshot.publish(user=self.editor)
+        # Another worker still caching the first snapshot.
+        cache.set(snapshot.CACHE_KEY, (first.pk, first.books), None)
+        self.assertEqual(self.titles(self.client.get(self.url)), ['Book 2', 'Book 0', 'Book 1'])
+
+    def test_viewer_rates_in_constant_queries(self):
+        """Test the viewer's rates are filled in for the page with one query"""
+        snapshot.publish()
+        user = User.objects.create(username='reader')
+        UserProfile.objects.create(user=user).rate_book(self.books[0], 4)
+        self.client.force_authenticate(user)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual([book['user_rate'] for book in response.data['results']], [None, 4.0])
+        # The id of the newest snapshot and the viewer's rates are read.
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_rate_shows_at_once(self):
+        """Test the cached list shows the viewer's rates of now, and only to the viewer"""
+        snapshot.publish()
+        user = User.objects.create(username='reader')
+        profile = UserProfile.objects.create(user=user, avatar=None)
+        self.client.force_authenticate(user)
+        response = self.client.get(self.url)
+        self.assertEqual([book['user_rate'] for book in response.data['results']], [None, None])
+        profile.rate_book(self.books[2], 5)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['user_rate'] for book in response.data['results']], [5.0, None])
+        self.client.force_authenticate(None)
+        self.assertEqual([book['user_rate'] for book in self.client.get(self.url).data['results']], [None, None])
@@ -4,43 +4,63 @@ from rest_framework.pagination import PageNumberPagination
 from core.models import *
 from book.serializers import MinBookSerializer
 from .serializers import *
+from book.viewer import ViewerContext
+from . import snapshot
+from .cache import CachedListMixin
 
 
-class CategoryPostsViewSet(viewsets.ModelViewSet):
+class CategoryPostsViewSet(CachedListMixin, viewsets.ModelViewSet):
     class PagesPagination(PageNumberPagination):  
         page_size = 7
         page_size_query_param = 'page_size'
 
     pagination_class = PagesPagination
-    queryset = CategoryPosts.objects.all()
+    queryset = CategoryPosts.objects.order_by('pk')
     serializer_class = CategoryPostsSerializer
     http_method_names = ['get']
 
 
-class PublicationPostsViewSet(viewsets.ModelViewSet):
+class PublicationPostsViewSet(CachedListMixin, viewsets.ModelViewSet):
     class PagesPagination(PageNumberPagination):  
         page_size = 7
         page_size_query_param = 'page_size'
 
     pagination_class = PagesPagination
-    queryset = Publisher.objects.filter(is_show=True)
+    queryset = Publisher.objects.filter(is_show=True).order_by('pk')
     serializer_class = PublisherSerializer
     http_method_names = ['get']
 
 
-class MainBookListViewSet(viewsets.ModelViewSet):
+class MainBookListViewSet(CachedListMixin, viewsets.ViewSet):
+    """
+    The current main list snapshot (see main.snapshot), with the rates of
+    the viewer filled in.
+    """
     class PagesPagination(PageNumberPagination):  
         page_size = 15
         page_size_query_param = 'page_size'
 
     pagination_class = PagesPagination
-    try: queryset = BookList.objects.get(name='main').books.all()
-    except: queryset = BookList.objects.none()
-    serializer_class = MinBookSerializer
     http_method_names = ['get']
+    # Books show the rate of the viewer.
+    per_user = True
 
+    def cache_scope(self):
+        self.snapshot = snapshot.current()
+        return self.snapshot[0]
 
-class BannersViewSet(viewsets.ModelViewSet):
-    queryset = Baners.objects.all()
+    def list_data(self, request, *args, **kwargs):
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(self.snapshot[1], request, view=self)
+        return paginator.get_paginated_response(page).data
+
+    def personalize(self, request, data):
+        books = data['results']
+        viewer = ViewerContext(request.user).load(book['id'] for book in books)
+        return dict(data, results=[dict(book, user_rate=viewer.rate(book['id'])) for book in books])
+
+
+class BannersViewSet(CachedListMixin, viewsets.ModelViewSet):
+    queryset = Baners.objects.select_related('related_list').order_by('pk')
     serializer_class = BannersSerailzer
     http_method_names = ['get']
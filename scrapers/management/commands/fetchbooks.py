@@ -5,7 +5,13 @@ from scrapers import thbook
 class Command(BaseCommand):
     help = 'Fetch data from the web'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Pages and covers fetched at once')
+        parser.add_argument('--rate', type=float, default=2.0, help='Requests per second to a host')
+        parser.add_argument('--timeout', type=float, default=10, help='Seconds to wait for a response')
+        parser.add_argument('--refresh', type=int, help='Ask again for pages fetched more than this many days ago')
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Start fetching books...'))
-        thbook.main()
+        thbook.main(workers=options['workers'], rate=options['rate'], timeout=options['timeout'], refresh=options['refresh'])
         self.stdout.write(self.style.SUCCESS('Successfully fetched data from the web'))
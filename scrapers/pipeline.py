@@ -0,0 +1,175 @@
+import queue
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Statuses worth asking again, the server may answer later.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def log_error(e):
+    print(e)
+
+
+class RateLimiter:
+    """
+    Spaces requests to the same host at least `interval` seconds apart,
+    whatever the number of threads asking. Other hosts are not delayed.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def wait(self, host):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Fetcher:
+    """
+    HTTP client shared by the workers of a crawl: one pooled session,
+    a timeout on every request, per-host rate limiting and retries with
+    exponential backoff on network errors and RETRY_STATUSES.
+    """
+
+    def __init__(self, rate=2.0, timeout=10, retries=3, backoff=0.5, pool_size=16, headers=None):
+        self.limiter = RateLimiter(1 / rate if rate else 0)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update(headers or {})
+
+    def get(self, url, **kwargs):
+        """
+        The response of a GET of `url`, or None when it still fails after
+        the retries. Responses with other error statuses are returned.
+        """
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            self.limiter.wait(host)
+            delay = self.backoff * 2 ** attempt
+            try:
+                response = self.session.get(url, timeout=self.timeout, **kwargs)
+            except requests.RequestException as e:
+                error = e
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                error = f'status {response.status_code}'
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+            if attempt < self.retries:
+                time.sleep(delay)
+        log_error(f'Error during requests to {url} : {error}')
+        return None
+
+    def close(self):
+        self.session.close()
+
+
+class Pipeline:
+    """
+    Runs items through `stages`, a list of (function, workers). Every
+    stage is a pool of threads reading the queue of the previous one and
+    calling its function on each item; what it returns goes to the next
+    stage, None drops the item. The results of the last stage are given
+    to `sink` in the calling thread, so database writes stay in one
+    thread. Queues are bounded, a slow stage holds the previous ones back.
+    """
+    DONE = object()
+
+    def __init__(self, stages, sink, queue_size=100):
+        self.stages = stages
+        self.sink = sink
+        self.queue_size = queue_size
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def count(self, name, key):
+        with self.lock:
+            counts = self.stats.setdefault(name, {'in': 0, 'out': 0, 'errors': 0})
+            counts[key] += 1
+
+    def worker(self, function, inbox, outbox, finished):
+        name = function.__name__
+        while True:
+            item = inbox.get()
+            if item is self.DONE:
+                break
+            self.count(name, 'in')
+            try:
+                result = function(item)
+            except Exception as e:
+                self.count(name, 'errors')
+                log_error(f'{name} failed on {item!r}: {e!r}')
+                continue
+            if result is not None:
+                self.count(name, 'out')
+                outbox.put(result)
+        finished()
+
+    def run(self, items):
+        """ Process every item of `items`, returns the counts of each stage. """
+        queues = [queue.Queue(self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = []
+        for i, (function, workers) in enumerate(self.stages):
+            # The last worker of a stage to finish closes the next queue.
+            next_workers = self.stages[i + 1][1] if i + 1 < len(self.stages) else 1
+            remaining = [workers]
+
+            def finished(remaining=remaining, outbox=queues[i + 1], next_workers=next_workers):
+                with self.lock:
+                    remaining[0] -= 1
+                    last = not remaining[0]
+                if last:
+                    for _ in range(next_workers):
+                        outbox.put(self.DONE)
+
+            for _ in range(workers):
+                thread = threading.Thread(
+                    target=self.worker, args=(function, queues[i], queues[i + 1], finished), daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        def feed():
+            try:
+                for item in items:
+                    queues[0].put(item)
+            except Exception as e:
+                log_error(f'Reading items failed: {e!r}')
+            finally:
+                for _ in range(self.stages[0][1]):
+                    queues[0].put(self.DONE)
+
+        threading.Thread(target=feed, daemon=True).start()
+        name = getattr(self.sink, '__name__', 'sink')
+        while True:
+            item = queues[-1].get()
+            if item is self.DONE:
+                break
+            self.count(name, 'in')
+            try:
+                if self.sink(item) is not None:
+                    self.count(name, 'out')
+            except Exception as e:
+                self.count(name, 'errors')
+                log_error(f'{name} failed on {item!r}: {e!r}')
+        for thread in threads:
+            thread.join()
+        return self.stats
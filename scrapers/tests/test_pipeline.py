@@ -0,0 +1,212 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+from PIL import Image
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.models import Book, CrawlURL
+from scrapers import thbook
+from scrapers.pipeline import Fetcher, Pipeline, RateLimiter
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+class FakeSite(BaseHTTPRequestHandler):
+    """ 30book look-alike: book pages, covers, a flaky page and a slow one. """
+    page = open(os.path.join(FIXTURES, '30book-boof-e-koor.html'), 'rb').read()
+    cover = BytesIO()
+    Image.new('RGB', (20, 30)).save(cover, 'JPEG')
+    cover = cover.getvalue()
+    hits = {}
+    etag = '"v1"'
+
+    def do_GET(self):
+        self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        if self.path.startswith('/book/') and self.headers.get('If-None-Match') == self.etag:
+            self.reply(304, 'text/html; charset=utf-8', b'')
+        elif self.path.startswith('/book/'):
+            self.reply(200, 'text/html; charset=utf-8', self.page)
+        elif self.path.startswith('/Media/Book/'):
+            self.reply(200, 'image/jpeg', self.cover)
+        elif self.path == '/flaky/' and self.hits[self.path] == 1:
+            self.reply(503, 'text/plain', b'busy')
+        elif self.path == '/flaky/':
+            self.reply(200, 'text/plain', b'ok')
+        elif self.path == '/slow/':
+            time.sleep(1)
+            self.reply(200, 'text/plain', b'late')
+        else:
+            self.reply(404, 'text/plain', b'')
+
+    def reply(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_one_request(self):
+        # The client stops waiting for the slow page before it is written.
+        try:
+            super().handle_one_request()
+        except BrokenPipeError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class PipelineTest(TestCase):
+    """Test the concurrent crawl of book pages"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSite)
+        cls.site = 'http://127.0.0.1:%d' % cls.server.server_address[1]
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        FakeSite.hits.clear()
+        self.fetcher = Fetcher(rate=0, timeout=0.3, retries=1, backoff=0)
+
+    def tearDown(self):
+        self.fetcher.close()
+
+    def test_parse_page(self):
+        """Test the info of a fixture page"""
+        url = f'{self.site}/book/1234/boof-e-koor/'
+        info = thbook.parse_30book(FakeSite.page, url)
+        self.assertEqual(info['title'].strip(), 'بوف کور')
+        self.assertEqual(info['author'], 'صادق هدایت')
+        self.assertEqual(info['publisher'], 'امیرکبیر')
+        self.assertEqual(info['isbn'], '9789640013567')
+        self.assertEqual(info['pagesCount'], '96')
+        self.assertEqual(info['coverUrl'], f'{self.site}/Media/Book/1234.jpg')
+
+    def test_retries_and_timeouts(self):
+        """Test retried statuses are asked again and slow hosts give up"""
+        self.assertEqual(self.fetcher.get(f'{self.site}/flaky/').text, 'ok')
+        self.assertEqual(FakeSite.hits['/flaky/'], 2)
+        self.assertIsNone(self.fetcher.get(f'{self.site}/slow/'))
+        self.assertEqual(self.fetcher.get(f'{self.site}/missing/').status_code, 404)
+
+    def test_rate_limit(self):
+        """Test requests to a host are spaced"""
+        limiter = RateLimiter(0.05)
+        start = time.monotonic()
+        threads = [threading.Thread(target=limiter.wait, args=('host',)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        start = time.monotonic()
+        limiter.wait('other')
+        self.assertLess(time.monotonic() - start, 0.05)
+
+    def test_errors_do_not_stop_the_pipeline(self):
+        """Test an item failing in a stage is counted and the others go on"""
+        def half(n):
+            return 10 // (n % 2)
+
+        results = []
+        stats = Pipeline([(half, 3)], results.append).run(range(10))
+        self.assertEqual(sorted(results), [10] * 5)
+        self.assertEqual(stats['half'], {'in': 10, 'out': 5, 'errors': 5})
+
+    def crawl(self, urls, **kwargs):
+        with override_settings(MEDIA_ROOT=self.media):
+            return thbook.crawl_books(urls, self.fetcher, workers=4, **kwargs)
+
+    def test_crawl_books(self):
+        """Test pages and covers are fetched and the books saved once"""
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        urls = [f'{self.site}/book/{code}/boof-e-koor/' for code in range(1, 6)] + ['', f'{self.site}/slow/']
+        stats = self.crawl(urls)
+        self.assertEqual(stats['fetch_page'], {'in': 6, 'out': 6, 'errors': 0})
+        self.assertEqual(stats['fetch_cover']['in'], 6)
+        self.assertEqual(sum(path.startswith('/Media/') for path in FakeSite.hits), 5)
+        books = Book.objects.filter(source='30book')
+        self.assertEqual(sorted(books.values_list('source_link', flat=True)), sorted(urls[:5]))
+        self.assertTrue(all(book.cover for book in books))
+        self.assertEqual(books.first().publisher.name, 'امیرکبیر')
+        slow = CrawlURL.objects.get(url=urls[-1])
+        self.assertEqual((slow.status, slow.attempts), (CrawlURL.FAILED, 1))
+
+        # Fetched pages are not asked again, failed ones are.
+        FakeSite.hits.clear()
+        self.crawl(urls)
+        self.assertEqual(set(FakeSite.hits), {'/slow/'})
+        self.assertEqual(CrawlURL.objects.get(url=urls[-1]).attempts, 2)
+
+    def test_resume_and_recrawl(self):
+        """Test an interrupted crawl goes on from its checkpoint and re-crawls ask conditionally"""
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        urls = [f'{self.site}/book/{code}/boof-e-koor/' for code in range(1, 6)]
+        book_record = thbook.book_record
+        saved = []
+
+        def crash_on_third(info):
+            if len(saved) == 2:
+                raise KeyboardInterrupt
+            saved.append(info)
+            return book_record(info)
+
+        with mock.patch.object(thbook, 'book_record', crash_on_third), self.assertRaises(KeyboardInterrupt):
+            self.crawl(urls, checkpoint_every=2)
+        self.assertEqual(CrawlURL.objects.filter(status=CrawlURL.FETCHED).exclude(book=None).count(), 2)
+
+        FakeSite.hits.clear()
+        self.crawl(urls)
+        self.assertEqual(Book.objects.count(), 5)
+        self.assertEqual(sum(path.startswith('/book/') for path in FakeSite.hits), 3)
+        self.assertFalse(CrawlURL.objects.filter(book=None).exists())
+
+        # Unchanged pages answer 304, nothing else is fetched.
+        FakeSite.hits.clear()
+        stats = self.crawl(urls, refresh_before=timezone.now())
+        self.assertEqual(stats['store']['in'], 5)
+        self.assertEqual(set(FakeSite.hits), set(f'/book/{code}/boof-e-koor/' for code in range(1, 6)))
+        self.assertEqual(Book.objects.count(), 5)
+
+    def test_recrawl_updates_changed_books(self):
+        """Test a changed page of a book we have updates the book, once"""
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        urls = [f'{self.site}/book/1/boof-e-koor/']
+        self.crawl(urls)
+        book = Book.objects.get()
+        self.assertEqual(book.title, 'بوف کور')
+        cover = book.cover.name
+
+        page = FakeSite.page.replace('بوف کور'.encode(), 'بوف کور (ویرایش دوم)'.encode())
+        with mock.patch.object(FakeSite, 'page', page), mock.patch.object(FakeSite, 'etag', '"v2"'):
+            FakeSite.hits.clear()
+            self.crawl(urls, refresh_before=timezone.now())
+            book = Book.objects.get()
+            self.assertEqual(book.title, 'بوف کور (ویرایش دوم)')
+            self.assertEqual(book.cover.name, cover)
+            self.assertFalse(any(path.startswith('/Media/') for path in FakeSite.hits))
+            self.assertEqual(list(book.authors.values_list('name', flat=True)), ['صادق هدایت'])
+
+            # Unchanged since, nothing to do.
+            self.crawl(urls, refresh_before=timezone.now())
+            self.assertEqual(Book.objects.count(), 1)
@@ -1,21 +1,28 @@
-import json, re
+import json, re, hashlib
 import time, sys, os
-from wsgiref import validate
-import requests
 from io import BytesIO
 
 from django.core.files import File
 from django.core.files.temp import NamedTemporaryFile
+from django.utils import timezone
 
-from requests import get
-from requests.exceptions import RequestException
-from contextlib import closing
+from urllib.parse import urlsplit
 from bs4 import BeautifulSoup
 
-from farsi_tools import standardize_persian_text
-import pyarabic.araby as araby
+from core.models import Book, Author, Translator, Size, CoverType, Publisher, CrawlURL
+from book.ingest import CatalogueWriter
+from scrapers.pipeline import Fetcher, Pipeline
+from utils.text import clean_persian_chars
 
-from core.models import Book, Author, Translator, Size, CoverType, Publisher
+
+# Publishers whose books are already in the database.
+EXISTED_PUBLISHERS = [
+    'بیدگل', 'کرگدن', 'پارسه', 'افق', 'تاش', 'اطراف',
+    'آریاناقلم', 'آریانا قلم', 'دف', 'کارنامه', 'نی',
+]
+
+# Fetched urls saved to CrawlURL at once.
+CHECKPOINT_EVERY = 200
 
 
 def html2text(html):
@@ -30,14 +37,10 @@ def is_good_response(resp):
     """
     Returns True if the response seems to be HTML, False otherwise.
     """
-    content_type = resp.headers['Content-Type'].lower()
+    content_type = resp.headers.get('Content-Type', '').lower()
     return (resp.status_code == 200
-            and content_type is not None
             and content_type.find('html') > -1)
 
-def log_error(e):
-    print(e)
-
 def log_actions(action):
     print(action)
     """
@@ -49,98 +52,13 @@ def log_actions(action):
         )
     log.close()
     """
-def simple_get(url):
-    """
-    Attempts to get the content at `url` by making an HTTP GET request.
-    If the content-type of response is some kind of HTML/XML, return the
-    text content, otherwise return None.
-    """
-    try:
-        with closing(get(url, stream=True)) as resp:
-            if is_good_response(resp):
-                return resp.content
-            else:
-                return None
-    except RequestException as e:
-        log_error('Error during requests to {0} : {1}'.format(url, str(e)))
-        return None
-
 
-class Crawl:
 
-    def get_next_page_url(self, page_number):
-        base_url = 'https://nashremahi.com/shop/page/{}/'.format(page_number)
-        return base_url
-
-    def log_error(self, e):
-        print(e)
-
-    def log_actions(self, action):
-        print('\x1b[6;30;42m' + action + '\x1b[0m', end='\n')
-        """
-        dir = os.path.dirname(os.path.abspath(__file__))
-        log = open(dir+"/temp/requests.log", "a")
-        log.write(
-            "{}: - {}\n".format(time.strftime("%Y-%m-%d %H:%M:%S"), action)
-            )
-        log.close()
-        """
-
-    def is_good_response(self, resp):
-        """
-        Returns True if the response seems to be HTML, False otherwise.
-        """
-        content_type = resp.headers['Content-Type'].lower()
-        return (resp.status_code == 200
-                and content_type is not None
-                and content_type.find('html') > -1)
-
-    def simple_get(self, url):
-        """
-        Attempts to get the content at `url` by making an HTTP GET request.
-        If the content-type of response is some kind of HTML/XML, return the
-        text content, otherwise return None.
-        """
-        try:
-            with closing(get(url, stream=True)) as resp:
-                if self.is_good_response(resp):
-                    return resp.content
-                else:
-                    return None
-
-        except RequestException as e:
-            self.log_error('Error during requests to {0} : {1}'.format(url, str(e)))
-            return None
-
-    def get_page_string_data(self, url):
-        """
-        Get the data of the page
-        """
-        content = self.simple_get(url)
-        # Convert the bytes response to a string
-        content = content.decode('utf-8')
-        return content
-
-    def extract_book_urls(self, url, function_name):
-        """
-        Extract the book urls from the page
-        """
-        content = self.get_page_string_data(url)
-        book_urls = function_name(content)
-        return book_urls
-
-
-
-
-def prosessPage_30book(url):
-    resp = simple_get(url)
-    if resp is not None:
-        text = html2text(resp)
-    else:
-        log_actions(
-            "No response for url: {}".format(url)
-        )
-        return None
+def parse_30book(html, url):
+    """
+    Book info of a 30book page, `html` being the page fetched from `url`.
+    """
+    text = html2text(html)
     # Remove all 2 or more new lines
     text = re.sub(r'\n{2,}', '\n', text)
     # Remove all spaaces more than one
@@ -264,7 +182,9 @@ def prosessPage_30book(url):
     # Code after book/ in url
     code = re.findall(r'book/[^/]+/', url)
     code = code[0].replace("book/", "").replace("/", "")
-    coverUrl = f"https://www.30book.com/Media/Book/{code}.jpg"
+    # Covers are served by the host of the page.
+    site = urlsplit(url)
+    coverUrl = f"{site.scheme}://{site.netloc}/Media/Book/{code}.jpg"
     info = {
         "title": title,
         "author": author,
@@ -283,191 +203,119 @@ def prosessPage_30book(url):
 
 
 
-crawl = Crawl()
-
-def collect(url):
-    if url != "":
-        info = prosessPage_30book(url)
-        if info != None:
-            return info
-        else:
-            crawl.log_actions("No info for url: {}".format(url))
+def book_record(r):
+    """
+    Catalogue record (see book.ingest.CatalogueWriter) of the info `r`
+    parsed from a page, with its cover when `r['cover']` has the image.
+    Returns None when the book is skipped.
+    """
+    if r == None or not r:
+        return None
+    validate_publisher = r.get('publisher', None)
+    validate_title = r.get('title', None)
+    if r['url'] == "":
+        return None
+    elif r['title'] == "" or validate_title == None:
+        return None
+    elif not validate_publisher or r['publisher'] in EXISTED_PUBLISHERS:
+        print('\x1b[6;30;41m' + "exist." + '\x1b[0m', end='\n')
+        return None
+    return {
+        "title": r["title"].strip(),
+        "isbn": r.get("isbn", ""),
+        "pages": r["pagesCount"],
+        "authors": r["author"],
+        "translators": r["translator"],
+        "publisher": r["publisher"],
+        "cover_type": r["coverType"],
+        "size": r["sizeType"],
+        "cover": (r["coverUrl"].split("/")[-1], r["cover"]) if r.get("cover") else None,
+        "source": "30book",
+        "source_link": r["url"],
+    }
 
 
-def clean_persian_chars(text):
-    text = text.replace("‌", " ")
-    text = standardize_persian_text(text)
-    text = araby.strip_diacritics(text)
-    return text
+def crawl_books(urls, fetcher=None, workers=8, parsers=2, refresh_before=None, checkpoint_every=CHECKPOINT_EVERY):
+    """
+    Fetch, parse and save the books of 30book `urls` concurrently.
+    Pages and covers are fetched by `workers` threads sharing `fetcher`,
+    parsed by `parsers` threads and written in batches by this thread.
+
+    What every fetch found is kept in CrawlURL and saved every
+    `checkpoint_every` urls, so an interrupted crawl goes on where it
+    stopped. Fetched pages are asked again only when fetched before
+    `refresh_before`, conditionally: unchanged pages are skipped and
+    the books of changed ones updated.
+    Returns the counts of each stage.
+    """
+    fetcher = fetcher or Fetcher()
+    CrawlURL.enqueue("30book", urls)
+    done = []
+
+    def fetch_page(row):
+        resp = fetcher.get(row.url, headers=row.conditional_headers())
+        if resp is not None and resp.status_code == 200 and not is_good_response(resp):
+            resp = None
+        content = resp.content if resp is not None and resp.status_code == 200 else None
+        changed = row.fetched(resp, content and hashlib.sha256(content).hexdigest())
+        if resp is None:
+            log_actions("No response for url: {}".format(row.url))
+        return {"row": row, "html": content if changed else None, "info": None}
+
+    def parse_page(page):
+        # Changed pages of books we have are parsed too, their book is updated.
+        if page["html"] is not None:
+            page["info"] = parse_30book(page["html"], page["row"].url)
+        return page
+
+    def fetch_cover(page):
+        info = page["info"]
+        # Covers of books we have are kept.
+        if info and page["row"].book_id is None:
+            resp = fetcher.get(info["coverUrl"])
+            info["cover"] = resp.content if resp is not None and resp.status_code == 200 else None
+        return page
+
+    def store(page):
+        row = page["row"]
+        record = book_record(page["info"]) if page["info"] else None
+        if record and row.book_id is not None:
+            log_actions("Book updated: {}".format(record["title"]))
+            writer.update(row.book_id, record)
+            record = None
+        elif record:
+            log_actions("New book added: {}".format(record["title"]))
+        done.append((row, writer.add(record) if record else None))
+        if len(done) >= checkpoint_every:
+            checkpoint()
+        return row
+
+    def checkpoint():
+        # Books are written first, their urls point to them.
+        writer.flush()
+        for row, book in done:
+            row.book_id = book.pk if book else row.book_id
+        CrawlURL.checkpoint([row for row, book in done])
+        done.clear()
+
+    # Read here, the feeding thread has no database connection of its own.
+    rows = list(CrawlURL.frontier("30book", refresh_before))
+    stages = [(fetch_page, workers), (parse_page, parsers), (fetch_cover, workers)]
+    writer = CatalogueWriter(batch_size=checkpoint_every)
+    try:
+        return Pipeline(stages, store).run(rows)
+    finally:
+        checkpoint()
+        fetcher.close()
 
 
-def main():
+def main(workers=8, rate=2.0, timeout=10, refresh=None):
     dir = os.path.dirname(os.path.abspath(__file__))
-    existed_publishers = [
-        'بیدگل', 'کرگدن', 'پارسه', 'افق', 'تاش', 'اطراف',
-        'آریاناقلم', 'آریانا قلم', 'دف', 'کارنامه', 'نی',
-    ]
     urls = open(dir + "/book-urls.txt").read().split("\n")
-    # book-urls
-    for url in urls:
-        r = collect(url)
-        print(r)
-        """
-        validate_publisher = r.get('publisher', None)
-        validate_isbn = r.get('isbn', None)
-        if not validate_publisher:
-            print('\x1b[6;30;41m' + "didn't found any publisher." + '\x1b[0m', end='\n')
-            continue
-        elif r['publisher'] in existed_publishers:
-            print('\x1b[6;30;41m' + "exist." + '\x1b[0m', end='\n')
-            continue
-        if not validate_isbn:
-            if Book.objects.filter(title=r['title'], publisher=r['publisher']).exists():
-                print('\x1b[6;30;41m' + "exist by title." + '\x1b[0m', end='\n')
-                continue
-
-        elif Book.objects.filter(isbn=r["isbn"]).count() > 0:
-            print('\x1b[6;30;41m' + "exist." + '\x1b[0m', end='\n')
-            continue
-        """
-
-
-        if r == None or not r:
-            continue
-        validate_publisher = r.get('publisher', None)
-        validate_title = r.get('title', None)
-        if r['url'] == "":
-            continue
-        elif r['title'] == "" or validate_title == None:
-            continue
-        elif not validate_publisher or r['publisher'] in existed_publishers:
-            print('\x1b[6;30;41m' + "exist." + '\x1b[0m', end='\n')
-            continue
-        elif Book.objects.filter(source_link=r['url']).exists():
-            print('\x1b[6;30;41m' + "exist By URL." + '\x1b[0m', end='\n')
-            continue
-        book = Book(
-            title=r["title"].strip(),
-            isbn=r.get('isbn', "")
-        )
-        book.save()
-        if r["pagesCount"] == None:
-            pass
-        else:
-            try: book.pages = int(r["pagesCount"])
-            except: pass
-
-        if r["translator"] == None:
-            pass
-        elif type(r["translator"]) != list:
-            r["translator"] = [r["translator"]]
-
-        if r["translator"] != None:
-            for a in r["translator"]:
-                query = Translator.objects.filter(name=a)
-                if query.count() == 0:
-                    translator = Translator(name=a)
-                    translator.save()
-                    book.translators.add(translator)
-                elif query.count() == 1:
-                    author = Translator.objects.get(name=a)
-                    book.translators.add(author)
-                elif query.count() > 1:
-                # except MultipleObjectsReturned: merge authors
-                    first = query.first()
-                    for a in query:
-                        if a.id != first.id:
-                            for b in a.books.all():
-                                b.translators.remove(a)
-                                b.translators.add(first)
-                                b.save()
-                            a.delete()
-                    book.translators.add(first)
-
-        if r["author"] == None:
-            pass
-
-        elif type(r["author"]) != list:
-            r["author"] = [r["author"]]
-
-        for a in r['author']:
-            query = Author.objects.filter(name=a)
-            if query.count() == 0:
-                author = Author(name=a)
-                author.save()
-                book.authors.add(author)
-            elif query.count() == 1:
-                author = Author.objects.get(name=a)
-                book.authors.add(author)
-            elif query.count() > 1:
-                first = query.first()
-                for a in query:
-                    if a.id != first.id:
-                        for b in a.books.all():
-                            b.authors.remove(a)
-                            b.authors.add(first)
-                            b.save()
-                        a.delete()
-                book.authors.add(first)
-
-        if r["publisher"] != None:
-            a = r["publisher"]
-            query = Publisher.objects.filter(name=a)
-            if query.count() == 0:
-                publisher = Publisher(name=a,)
-                publisher.save()
-                book.publisher = publisher
-                book.save()
-            elif query.count() == 1:
-                book.publisher = query.first()
-                book.save()
-            else:
-                first = query.first()
-                for a in query:
-                    if a.id != first.id:
-                        for b in a.books.all():
-                            b.publisher = first
-                            b.save()
-                        a.delete()
-                book.publisher = first
-                book.save()
-
-        if r["coverType"] == None:
-            pass
-        elif CoverType.objects.filter(name=r["coverType"]).count() > 0:
-            book.cover_type = CoverType.objects.get(name=r["coverType"])
-        else:
-            cover_type = CoverType(
-                name=r["coverType"],
-            )
-            cover_type.save()
-            book.cover_type = cover_type
-        
-        if r["sizeType"] == None:
-            pass
-        elif Size.objects.filter(name=r["sizeType"]).count() == 0:
-            size = Size(
-                name=r["sizeType"],
-            )
-            size.save()
-            book.size = size
-        elif Size.objects.filter(name=r["sizeType"]).count() == 1:
-            book.size = Size.objects.get(name=r["sizeType"])
-
-        try:
-            image = requests.get(r["coverUrl"], timeout=10)
-            image.raise_for_status()
-            image_file = BytesIO(image.content)
-            book.cover.save(r["coverUrl"].split("/")[-1], File(image_file))
-        except Exception as e:
-            print(e)
-            pass
-        
-        book.source = "30book"
-        book.source_link = r["url"]
-        book.save()
-        crawl.log_actions("New book added: {}".format(r["title"]))
-        # stdout r['title']
+    fetcher = Fetcher(rate=rate, timeout=timeout, pool_size=workers)
+    refresh_before = timezone.now() - timezone.timedelta(days=refresh) if refresh is not None else None
+    stats = crawl_books(urls, fetcher, workers=workers, refresh_before=refresh_before)
+    log_actions("Done: {}".format(stats))
 
     """
     # add dict to book-info.json
@@ -0,0 +1,26 @@
+import time
+import statistics
+
+
+class Rollback(Exception):
+    """ Raised to undo everything a benchmark wrote. """
+
+
+def measure(func, calls):
+    """
+    Call `func(*args)` for each args tuple in `calls`.
+    Returns the latency of every call in milliseconds.
+    """
+    timings = []
+    for args in calls:
+        start = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summary(timings):
+    """ Median and p99 of a list of milliseconds, as text. """
+    ordered = sorted(timings)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return f'median {statistics.median(ordered):7.3f}ms  p99 {p99:7.3f}ms'
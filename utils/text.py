@@ -0,0 +1,36 @@
+import re
+
+from farsi_tools import standardize_persian_text
+import pyarabic.araby as araby
+
+
+WORD_RE = re.compile(r'\w+')
+ISBN_HYPHEN_RE = re.compile(r'(?<=\w)-(?=\w)')
+
+
+def clean_persian_chars(text):
+    """
+    Replace ZWNJ with a space, Arabic yeh/kaf and digits with the Persian
+    ones and strip diacritics.
+    """
+    text = text.replace("‌", " ")
+    text = standardize_persian_text(text)
+    text = araby.strip_diacritics(text)
+    return text
+
+
+def normalize_search_text(text):
+    """
+    clean_persian_chars() plus lower case, so indexed text and queries
+    written with a different keyboard layout still match.
+    Hyphens inside words are dropped to keep ISBNs in one token.
+    """
+    if not text:
+        return ''
+    text = clean_persian_chars(str(text)).lower()
+    return ISBN_HYPHEN_RE.sub('', text)
+
+
+def search_tokens(text):
+    """ Words of the normalized `text`. """
+    return WORD_RE.findall(normalize_search_text(text))
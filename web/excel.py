@@ -0,0 +1,101 @@
+from itertools import islice
+
+from django.db.models import Q
+from openpyxl import load_workbook
+
+from core.models import Book
+from book.ingest import CatalogueWriter
+
+# Rows read, checked and written at a time.
+BATCH_SIZE = 500
+
+
+def is_text(value):
+    return type(value) == str and value.strip() != ''
+
+
+def sheet_rows(file):
+    """
+    Number of rows (None if the workbook doesn't tell) and the rows of
+    the first sheet of the .xlsx `file` as dicts keyed by the header row.
+    The workbook is opened read-only, rows are read as they are needed.
+    """
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    sheet = workbook.active
+    total = sheet.max_row - 1 if sheet.max_row else None
+
+    def rows():
+        try:
+            values = sheet.iter_rows(values_only=True)
+            header = [str(name).strip() if name is not None else '' for name in next(values, ())]
+            for row in values:
+                if any(value is not None for value in row):
+                    yield dict(zip(header, row))
+        finally:
+            workbook.close()
+
+    return total, rows()
+
+
+def book_record(row, publisher):
+    """ CatalogueWriter record of a catalogue row, None when it has no title. """
+    if not is_text(row.get('Book')):
+        return None
+    isbn = row.get('Shabak')
+    if type(isbn) == int:
+        isbn = str(isbn)
+    pages = row.get('Pages')
+    return {
+        'title': row['Book'].strip(),
+        'authors': [row['Author-Farsi']] if is_text(row.get('Author-Farsi')) else [],
+        'translators': [row['Translator']] if is_text(row.get('Translator')) else [],
+        'isbn': isbn.strip() if is_text(isbn) else None,
+        'size': row.get('QTE') if is_text(row.get('QTE')) else None,
+        'pages': pages if type(pages) in (int, str) else None,
+        'cover_type': row.get('Jeld') if is_text(row.get('Jeld')) else None,
+        'publisher': publisher,
+        # Waiting for a cover, see web.views.choose_photos.
+        'cover': '',
+    }
+
+
+def import_excel(job, batch_size=BATCH_SIZE):
+    """
+    Import the books of the workbook of the ImportJob `job`, `batch_size`
+    rows at a time: rows without a title are skipped, so are books whose
+    title or ISBN is already in the catalogue or earlier in the file.
+    Progress is saved after every batch, a failure is saved on the job.
+    """
+    titles, isbns = set(), set()
+    try:
+        with job.file.open('rb') as file, CatalogueWriter(batch_size=batch_size) as writer:
+            total, rows = sheet_rows(file)
+            job.start(total)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                records = [book_record(row, job.publisher) for row in batch]
+                records = [record for record in records if record]
+                # Only the books of this batch are looked up, the index grows with the file.
+                existing = Book.objects.filter(
+                    Q(title__in={record['title'] for record in records})
+                    | Q(isbn__in={record['isbn'] for record in records if record['isbn']})
+                ).values_list('title', 'isbn')
+                for title, isbn in existing:
+                    titles.add(title)
+                    isbns.add(isbn)
+                created = 0
+                for record in records:
+                    if record['title'] in titles or record['isbn'] and record['isbn'] in isbns:
+                        continue
+                    titles.add(record['title'])
+                    isbns.add(record['isbn'])
+                    writer.add(record)
+                    created += 1
+                writer.flush()
+                job.advance(len(batch), created, len(records) - created, len(batch) - len(records))
+    except Exception as e:
+        job.finish(error=repr(e))
+        raise
+    job.finish()
@@ -8,10 +8,10 @@ class UploadFileForm(forms.Form):
     publisher = forms.ModelChoiceField(queryset=Publisher.objects.all(), empty_label="Select a publisher")
     
     def clean_file(self):
-        # Check file is .xlsx or .xls 
+        # Check file is .xlsx, the workbook is streamed by openpyxl
         file = self.cleaned_data['file']
-        if not file.name.endswith('.xlsx') and not file.name.endswith('.xls'):
-            raise forms.ValidationError('File is not .xlsx or .xls')
+        if not file.name.endswith('.xlsx'):
+            raise forms.ValidationError('File is not .xlsx')
         return file
 
     def save(self):
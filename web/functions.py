@@ -1,11 +1,20 @@
+import io
 import os
 import re
 import json
+import mmap
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from json import encoder
+from xml.sax import make_parser
+from xml.sax.handler import feature_namespaces
+
+from pymarc import MARCReader, XmlHandler, END_OF_RECORD
 
 from core.models import BookRawData
+from book.ingest import CatalogueWriter
 
-books = []
 DIR = os.getcwd()
 DATA_DIR = DIR + '/data'
 
@@ -22,138 +31,240 @@ def write_json(new_data, filename=f'{DATA_DIR}/main.json'):
         json.dump(file_data, file, indent=4)
 
 
-# with open(f'{DATA_DIR}/metadata_bf/p1.mrk', "r") as lines:
+# Fields of a record, each a list of the values of its lines.
+FIELDS = (
+    "RAW", "ISBN", "zaban", "author", "onvan-padid_avarandeh", "vaziyat-virast", "vaziyat-nashr",
+    "tarikh-pishbini-enteshar", "moshakhasat-zaheri", "yaddasht-koli", "tarjome", "tarjome-az", "mozo",
+)
+# Invisible direction and joiner marks dropped from every line.
+INVISIBLE_CHARS = str.maketrans('', '', (
+    '\u200c\u200d\u200e\u200f\u202a\u202b\u202c\u202d\u202e\u202f'
+    '\u2060\u2061\u2062\u2063\u2064\u2066\u2067\u2068\u2069\u206a'
+))
+FA_DIGITS = str.maketrans('۰۱۲۳۴۵۶۷۸۹', '0123456789')
+ASCII_DIGITS_RE = re.compile(r'[0-9]+')
+# Bytes of a MARC file parsed at once by a worker process.
+CHUNK_SIZE = 8 * 1024 * 1024
 
-def translator(lines, database_func):
-    new_book = {"RAW": [], "ISBN": [], "zaban": [], "author":[], "onvan-padid_avarandeh": [], "vaziyat-virast": [],
-                "vaziyat-nashr": [], "tarikh-pishbini-enteshar": [], "moshakhasat-zaheri": [], "yaddasht-koli": [],
-                "tarjome": [], "tarjome-az": [], "mozo": []}
 
+def stripper(*marks):
+    """
+    Regex removing `marks` (subfield codes, indicators...) in one pass,
+    the first listed winning where several match.
+    """
+    return re.compile('|'.join(re.escape(mark) for mark in marks))
+
+
+TITLE_MARKS = stripper('1\\$a', '\\$a', '$a', '$b', '$f/ ', '$f', '$g', '=200 ', '\\', '$d', '$c', '.')
+PAGES_MARKS = stripper('1\\$a', '\\$a', '$a', '$b', '$f/ ', '$f', '$g', '=215 ', '\\', '$d', '$c', '\\\\$a', '.')
+# Tag of the lines copied to a field once stripped.
+TEXT_FIELDS = {
+    '205': ("vaziyat-virast", stripper('1\\$a', '\\$a', '$a', '$b', '$f/ ', '$f', '$g', '=205 ', '.', '\\')),
+    '210': ("vaziyat-nashr", stripper('$e', '1\\$a', '\\$a', '$a', '$b', '$f/ ', '$f', '$g', '=210 ', '\\', '$d', '$c')),
+    '211': ("tarikh-pishbini-enteshar", stripper('1\\$a', '\\$a', '$a', '$b', '$f/ ', '$f', '$g', '=211 ', '\\', '$d', '$c')),
+    '300': ("yaddasht-koli", stripper(
+        '1\\$a', '\\$a', '$a', '$b', '$f/ ', '$f', '$g', '=300 ', '\\', '$d', '$c', '\\\\$a', '.', '"',
+    )),
+    '453': ("tarjome", stripper('1\\$a', '\\$a', '$a', '$b', '$f/ ', '$f', '$g', '=453 ', '\\', '$d', '$c', '\\\\$a', '.')),
+    '454': ("tarjome-az", stripper('1\\$a', '\\$a', '$a', '$b', '$f/ ', '$f', '$g', '=454 ', '\\', '$d', '$c', '\\\\$a', '.')),
+    '606': ("mozo", stripper(
+        '1\\', '2\\', '$9', '$2nli', '$bc', '1\\$a', '\\$a', '$a', '$b', '$x', '$z', '$f/ ', '$f',
+        '$g', '=606 ', '\\', '$d', '$c', '\\\\$a', '.',
+    )),
+}
+
+
+def new_record():
+    return {field: [] for field in FIELDS}
+
+
+def parse_line(record, line):
+    """ Add what the MARC line `line` holds to `record`. """
+    tag = line[1:4]
+    if tag in TEXT_FIELDS:
+        field, marks = TEXT_FIELDS[tag]
+        record[field].append(marks.sub('', line))
+
+    elif tag == '010':
+        record["ISBN"].append("".join(ASCII_DIGITS_RE.findall(line[4:])))
+
+    elif tag == '101':
+        zaban = ''
+        if 'ara' in line: zaban = 'Arabic '
+        if 'per' in line: zaban += 'Persian '
+        if 'eng' in line: zaban += 'English '
+        record["zaban"].append(zaban)
+
+    elif tag == '200':
+        onvan_padid_avarandeh = TITLE_MARKS.sub('', line)
+        record["RAW"].append(onvan_padid_avarandeh)
+        # Title [material] / creators ; other creators
+        spliter_start = onvan_padid_avarandeh.find("[")
+        spliter_end = onvan_padid_avarandeh.find("]")
+        name_book = onvan_padid_avarandeh[:spliter_start if spliter_start > -1 else None].strip()
+        record["onvan-padid_avarandeh"].append(name_book)
+        creator_data = onvan_padid_avarandeh[spliter_end + 1:]
+        if "؛" in onvan_padid_avarandeh:
+            record["author"].append(creator_data.split("؛")[0].strip())
+        elif 'book' in onvan_padid_avarandeh:
+            record["author"].append(creator_data.split(" ")[0].strip())
+
+    elif tag == '215':
+        moshakhasat_zaheri = PAGES_MARKS.sub('', line).strip().split('ص')[0].strip()
+        record["moshakhasat-zaheri"].append(moshakhasat_zaheri.translate(FA_DIGITS))
+
+
+def extract(lines):
+    """ Record of the MARC text lines of one record, =LDR line first. """
+    record = new_record()
     for line in lines:
-        line = line.strip().encode('utf-8').decode('utf-8')
-        uni_special_char = [
-            '\u200c', '\u200d', '\u200e', '\u200f', '\u202a', '\u202b', '\u202c', '\u202d', '\u202e', '\u202f',
-            '\u2060', '\u2061', '\u2062', '\u2063', '\u2064', '\u2066', '\u2067', '\u2068', '\u2069', '\u206a',
-        ]
-        for char in uni_special_char:
-            line = line.replace(char, '')
-        
-        if '=LDR  ' in line:
-            books.append(new_book)
-            obj = database_func(new_book)
-            print(obj)
-            new_book = {"RAW": [], "ISBN": [], "zaban": [], "author":[], "onvan-padid_avarandeh": [], "vaziyat-virast": [],
-                        "vaziyat-nashr": [], "tarikh-pishbini-enteshar": [], "moshakhasat-zaheri": [],
-                        "yaddasht-koli": [],
-                        "tarjome": [], "tarjome-az": [], "mozo": []}
-
-        if '=010  ' in line:
-            ISBN = "".join(re.findall(r'\d+', str(line).replace("\n", "").replace("=010", "")))
-            specialChars = "!#$%^&*()۰۱۲۳۴۵۶۷۸۹"
-            for specialChar in specialChars:
-                ISBN = ISBN.replace(specialChar, '')
-            new_book["ISBN"].append(ISBN)
-
-        if '=101  ' in line:
-            dir_zaban = str(line).replace("\n", "")
-            zaban = ''
-            if 'ara' in dir_zaban: zaban = 'Arabic '
-            if 'per' in dir_zaban: zaban += 'Persian '
-            if 'eng' in dir_zaban: zaban += 'English '
-            new_book["zaban"].append(zaban)
-
-        if '=200  ' in line:
-            onvan_padid_avarandeh = (str(line).replace("\n", ""))
-            specialChars = ['1\$a', '\\$a', '$a', '$b', '$f/ ', '$f', '$g', '=200 ', '\\', '$d', '$c', '.',]
-            for specialChar in specialChars:
-                onvan_padid_avarandeh = onvan_padid_avarandeh.replace(specialChar, '')
-            new_book["RAW"].append(onvan_padid_avarandeh)
-            spliter_start = onvan_padid_avarandeh.find("[")
-            spliter_end = onvan_padid_avarandeh.find("]")
-
-            name_book = onvan_padid_avarandeh[:spliter_start].strip()
-            new_book["onvan-padid_avarandeh"].append(name_book)
-            
-            creator_data = onvan_padid_avarandeh[spliter_end + 1:]
-            if "؛" in onvan_padid_avarandeh:
-                new_book["author"].append(creator_data.split("؛")[0].strip())
-            elif 'book' in onvan_padid_avarandeh:
-                new_book["author"].append(creator_data.split(" ")[0].strip())                    
-            # onvan_padid_avarandeh = creator_data[0].strip()
-            # new_book["onvan-padid_avarandeh"].append(onvan_padid_avarandeh)
-            # new_book["author"].append(creator_data[1].split("؛")[0].strip())
-
-        if '=205  ' in line:
-            vaziyat_virast = str(line).replace("\n", "")
-            specialChars = ['1\$a', '\\$a', '$a', '$b', '$f/ ', '$f', '$g', '=205 ', '.', '\\']
-            for specialChar in specialChars:
-                vaziyat_virast = vaziyat_virast.replace(specialChar, '')
-            new_book["vaziyat-virast"].append(vaziyat_virast)
-
-        if '=210  ' in line:
-            vaziyat_nashr = (str(line).replace("\n", ""))
-            specialChars = ['$e', '1\$a', '\\$a', '$a', '$b', '$f/ ', '$f', '$g', '=210 ', '\\', '$d', '$c']
-            for specialChar in specialChars:
-                vaziyat_nashr = vaziyat_nashr.replace(specialChar, '')
-            new_book["vaziyat-nashr"].append(vaziyat_nashr)
-
-        if '=211  ' in line:
-            tarikh_pishbini_enteshar = (str(line).replace("\n", ""))
-            specialChars = ['1\$a', '\\$a', '$a', '$b', '$f/ ', '$f', '$g', '=211 ', '\\', '$d', '$c']
-            for specialChar in specialChars:
-                tarikh_pishbini_enteshar = tarikh_pishbini_enteshar.replace(specialChar, '')
-            new_book["tarikh-pishbini-enteshar"].append(tarikh_pishbini_enteshar)
-
-        if '=215  ' in line:
-            moshakhasat_zaheri = (str(line).replace("\n", ""))
-            specialChars = ['1\$a', '\\$a', '$a', '$b', '$f/ ', '$f', '$g', '=215 ', '\\', '$d', '$c', '\\\\$a', '.']
-            for specialChar in specialChars:
-                moshakhasat_zaheri = moshakhasat_zaheri.replace(specialChar, '')
-            moshakhasat_zaheri = moshakhasat_zaheri.strip().split('ص')[0].strip()
-            # Fa number to english number
-            fa_numbers = ['۰', '۱', '۲', '۳', '۴', '۵', '۶', '۷', '۸', '۹']
-            for key, number in enumerate(fa_numbers):
-                moshakhasat_zaheri = moshakhasat_zaheri.replace(number, str(key))
-            new_book["moshakhasat-zaheri"].append(moshakhasat_zaheri)
-
-        if '=300  ' in line:
-            yaddasht_koli = (str(line).replace("\n", ""))
-            specialChars = ['1\$a', '\\$a', '$a', '$b', '$f/ ', '$f', '$g', '=300 ', '\\', '$d', '$c', '\\\\$a', '.',
-                            '"']
-            for specialChar in specialChars:
-                yaddasht_koli = yaddasht_koli.replace(specialChar, '')
-            new_book["yaddasht-koli"].append(yaddasht_koli)
-
-        if '=453  ' in line:
-            tarjome = (str(line).replace("\n", ""))
-            specialChars = ['1\$a', '\\$a', '$a', '$b', '$f/ ', '$f', '$g', '=453 ', '\\', '$d', '$c', '\\\\$a', '.']
-            for specialChar in specialChars:
-                tarjome = tarjome.replace(specialChar, '')
-            new_book["tarjome"].append(tarjome)
-
-        if '=454  ' in line:
-            tarjome_az = (str(line).replace("\n", ""))
-            specialChars = ['1\$a', '\\$a', '$a', '$b', '$f/ ', '$f', '$g', '=454 ', '\\', '$d', '$c', '\\\\$a', '.']
-            for specialChar in specialChars:
-                tarjome_az = tarjome_az.replace(specialChar, '')
-            new_book["tarjome-az"].append(tarjome_az)
-
-        if '=606  ' in line:
-            mozo = (str(line).replace("\n", ""))
-            specialChars = ['1\\', '2\\', '$9', '$2nli', '$bc', '1\$a', '\\$a', '$a', '$b', '$x', '$z', '$f/ ', '$f',
-                            '$g', '=606 ', '\\', '$d', '$c', '\\\\$a', '.']
-            for specialChar in specialChars:
-                mozo = mozo.replace(specialChar, '')
-            new_book["mozo"].append(mozo)
+        line = line.strip().translate(INVISIBLE_CHARS)
+        if line.startswith('=') and not line.startswith('=LDR  '):
+            parse_line(record, line)
+    return record
+
+
+def split_mrk(lines):
+    """ Lines of each record of MARC text `lines`, a record starts at its =LDR line. """
+    record = None
+    for line in lines:
+        if line.strip().translate(INVISIBLE_CHARS).startswith('=LDR  '):
+            if record is not None:
+                yield record
+            record = []
+        if record is not None:
+            record.append(line)
+    if record is not None:
+        yield record
+
+
+def parse_records(lines):
+    """
+    Records of the MARC text (.mrk) `lines`, yielded one at a time so a
+    file of any size is read in constant memory.
+    """
+    for record in split_mrk(lines):
+        yield extract(record)
+
+
+def read_mrk(file):
+    yield from split_mrk(io.TextIOWrapper(file, encoding='utf-8'))
+
 
+def read_iso2709(file):
+    """ Records of binary MARC, as MARC text lines. """
+    for record in MARCReader(file, to_unicode=True, force_utf8=True, permissive=True):
+        if record is None:
+            continue
+        yield str(record).splitlines()
 
+
+def read_marcxml(file):
+    """ Records of MARCXML as MARC text lines, the file is parsed as it is read. """
+    records = []
+    handler = XmlHandler()
+    handler.process_record = records.append
+    parser = make_parser()
+    parser.setContentHandler(handler)
+    parser.setFeature(feature_namespaces, 1)
+    for data in iter(lambda: file.read(64 * 1024), b''):
+        parser.feed(data)
+        for record in records:
+            yield str(record).splitlines()
+        records.clear()
+    parser.close()
+    for record in records:
+        yield str(record).splitlines()
+
+
+# Readers of each MARC format, from a binary file to the MARC text lines of each record.
+READERS = {
+    'mrk': read_mrk,
+    'iso2709': read_iso2709,
+    'marcxml': read_marcxml,
+}
+EXTENSIONS = {
+    '.mrk': 'mrk',
+    '.mrc': 'iso2709',
+    '.marc': 'iso2709',
+    '.iso': 'iso2709',
+    '.xml': 'marcxml',
+}
+# What starts a record in the formats that can be split in byte ranges.
+RECORD_STARTS = {
+    'mrk': b'\n=LDR  ',
+    'iso2709': END_OF_RECORD.encode(),
+}
+
+
+def marc_format(path):
+    """ Format of the MARC file `path` told by its extension, mrk if unknown. """
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'mrk')
+
+
+def read_records(path, format=None):
+    """ Records of the MARC file `path`, in any of READERS formats, one at a time. """
+    with open(path, 'rb') as file:
+        for lines in READERS[format or marc_format(path)](file):
+            yield extract(lines)
+
+
+def translator(lines, database_func):
+    """ Call `database_func` with each record of `lines`, returns the number of records. """
+    count = 0
+    for record in parse_records(lines):
+        database_func(record)
+        count += 1
+    return count
+
+
+def record_chunks(path, count, format='mrk'):
+    """
+    About `count` (start, end) byte ranges of the MARC file `path`,
+    each starting at a record so it holds whole records.
     """
-    for book in books:
-        write_json(book)
-        json_object = json.dumps(book, indent=4, ensure_ascii=False).encode('utf8')
-        print(json_object.decode())
-        print("\n" * 2)
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        size = len(data)
+        starts = [0]
+        for i in range(1, count):
+            position = data.find(RECORD_STARTS[format], max(starts[-1], size * i // count))
+            if position == -1:
+                break
+            starts.append(position + 1)
+    ends = starts[1:] + [size]
+    return [(start, end) for start, end in zip(starts, ends) if end > start]
+
+
+def parse_chunk(path, start, end, format='mrk'):
+    """ Records of the bytes `start` to `end` of the MARC file `path`. """
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        chunk = data[start:end]
+    if format == 'mrk':
+        return list(parse_records(chunk.decode('utf-8').splitlines()))
+    return [extract(lines) for lines in READERS[format](io.BytesIO(chunk))]
+
+
+def parallel_records(path, workers, chunk_size=CHUNK_SIZE, format=None):
     """
+    Records of the MARC file `path` in file order, chunks of about
+    `chunk_size` bytes being parsed by `workers` processes. Only a few
+    chunks per worker are in flight, memory stays bounded.
+    MARCXML can't be split, it is read by this process.
+    """
+    format = format or marc_format(path)
+    if format not in RECORD_STARTS:
+        yield from read_records(path, format)
+        return
+    count = max(workers, os.path.getsize(path) // chunk_size + 1)
+    chunks = iter(record_chunks(path, count, format))
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque(pool.submit(parse_chunk, path, *chunk, format) for chunk in islice(chunks, workers * 2))
+        while pending:
+            records = pending.popleft().result()
+            for chunk in islice(chunks, 1):
+                pending.append(pool.submit(parse_chunk, path, *chunk, format))
+            yield from records
+
 
 class Translator:
 
@@ -161,11 +272,69 @@ class Translator:
         DIR = os.getcwd()
         self.DATA_DIR = DIR + '/static/raw_data/p1.mrk'
 
-    def add(self):
-        
-        def add_obj(data):
-            return BookRawData.objects.create(data=data)
+    def add(self, path=None, batch_size=1000, workers=1, format=None):
+        """
+        Import the records of the MARC file `path` (see READERS for the
+        formats) as BookRawData, returns their number. With several
+        `workers` the file is parsed by as many processes, this one
+        writing the records.
+        """
+        path = path or self.DATA_DIR
+        with CatalogueWriter(batch_size=batch_size) as writer:
+            if workers > 1:
+                records = parallel_records(path, workers, format=format)
+            else:
+                records = read_records(path, format)
+            count = 0
+            for record in records:
+                writer.add_raw(record)
+                count += 1
+            return count
+
 
-        with open(self.DATA_DIR, "r") as lines:
-            translator(lines, add_obj)
-            return True
+def first(data, key):
+    """ First value of `key` of a raw record, stripped. """
+    values = data.get(key) or ['']
+    return str(values[0]).strip()
+
+
+def raw_book_fields(data):
+    """ Book fields of the raw record `data`, what editors start from. """
+    isbn = first(data, 'ISBN')
+    pages = first(data, 'moshakhasat-zaheri')
+    return {
+        'title': first(data, 'onvan-padid_avarandeh'),
+        'subtitle': '',
+        'author': first(data, 'author'),
+        'translator': first(data, 'translator'),
+        'publisher': '',
+        'pages': int(pages) if pages.isdigit() else 0,
+        'isbn': isbn if isbn.isdigit() else '',
+        'language': first(data, 'zaban'),
+        'label': ', '.join(data.get('mozo') or []).strip(),
+    }
+
+
+def accept_raw_books(records):
+    """
+    Make books of the BookRawData `records` as they were parsed, in one
+    batch, and take them out of the queue. Records without a title are
+    left for an editor. Returns the number accepted.
+    """
+    books = {}
+    with CatalogueWriter(batch_size=len(records) + 1) as writer:
+        for record in records:
+            fields = raw_book_fields(record.data)
+            if not fields['title']:
+                continue
+            books[record.pk] = writer.add({
+                'title': fields['title'],
+                'authors': [fields['author']],
+                'translators': [fields['translator']],
+                'isbn': fields['isbn'],
+                'pages': fields['pages'],
+                'language': fields['language'],
+                'label': fields['label'][:255],
+                'raw_data': record.data,
+            })
+    return BookRawData.accept(books)
@@ -0,0 +1,48 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from web.functions import Translator, parse_records, parallel_records
+from utils.benchmark import Rollback
+
+FIXTURE = os.path.join(os.path.dirname(__file__), '..', '..', 'tests', 'fixtures', 'records.mrk')
+
+
+class Command(BaseCommand):
+    help = 'Measure MARC records parsed and imported per second with 1 to 8 worker processes (nothing is kept)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=300000)
+        parser.add_argument('--workers', nargs='+', type=int, default=[1, 2, 4, 8])
+
+    def handle(self, *args, **options):
+        with tempfile.NamedTemporaryFile('w', suffix='.mrk') as dump:
+            with open(FIXTURE) as fixture:
+                sample = fixture.read()
+            # The fixture holds 3 records.
+            for i in range(options['records'] // 3):
+                dump.write(sample.replace('بوف‌ کور', f'بوف کور {i}') + '\n')
+            dump.flush()
+            self.stdout.write(self.style.SUCCESS(
+                f'{options["records"]} records, {os.path.getsize(dump.name) // 2 ** 20}MB, {os.cpu_count()} cores'
+            ))
+            for workers in options['workers']:
+                start = time.perf_counter()
+                if workers > 1:
+                    count = sum(1 for record in parallel_records(dump.name, workers))
+                else:
+                    with open(dump.name) as lines:
+                        count = sum(1 for record in parse_records(lines))
+                parsed = count / (time.perf_counter() - start)
+                try:
+                    with transaction.atomic():
+                        start = time.perf_counter()
+                        count = Translator().add(dump.name, workers=workers)
+                        imported = count / (time.perf_counter() - start)
+                        raise Rollback
+                except Rollback:
+                    pass
+                self.stdout.write(f'  {workers} workers  parse {parsed:8.0f} records/s  import {imported:8.0f} records/s')
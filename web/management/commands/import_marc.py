@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from web.functions import Translator, READERS
+
+
+class Command(BaseCommand):
+    help = 'Import the records of a MARC file (.mrk, ISO 2709 .mrc or MARCXML .xml) as raw books to review'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Defaults to static/raw_data/p1.mrk')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Records written per query')
+        parser.add_argument('--workers', type=int, default=1, help='Processes parsing the file')
+        parser.add_argument('--format', choices=list(READERS), help='Defaults to the one of the file extension')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = Translator().add(
+            options['path'], batch_size=options['batch_size'], workers=options['workers'], format=options['format'],
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {count} records in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.0f} records/s)'
+        ))
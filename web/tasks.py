@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from core.models import ImportJob
+from web.excel import import_excel
+
+
+@shared_task
+def import_catalogue(job_id):
+    import_excel(ImportJob.objects.get(pk=job_id))
@@ -0,0 +1,98 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from openpyxl import Workbook
+
+from core.models import Book, Publisher, ImportJob
+from web.excel import import_excel, sheet_rows
+
+HEADER = ('Book', 'Author-Farsi', 'Translator', 'Shabak', 'QTE', 'Pages', 'Jeld')
+
+
+def workbook(rows):
+    book = Workbook()
+    sheet = book.active
+    sheet.append(HEADER)
+    for row in rows:
+        sheet.append(row)
+    data = BytesIO()
+    book.save(data)
+    return SimpleUploadedFile('catalogue.xlsx', data.getvalue())
+
+
+class ExcelImportTest(TestCase):
+    """Test importing catalogue workbooks"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.publisher = Publisher.objects.create(name='نی')
+        Book.objects.create(title='بوف کور')
+        Book.objects.create(title='سمفونی مردگان', isbn='9789643112345')
+
+    def test_sheet_rows(self):
+        """Test rows are read as dicts and empty rows skipped"""
+        total, rows = sheet_rows(workbook([('بوف کور', 'صادق هدایت'), (None, None), ('کلیله و دمنه',)]))
+        rows = list(rows)
+        self.assertEqual(total, 3)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['Author-Farsi'], 'صادق هدایت')
+        self.assertEqual(rows[1]['Book'], 'کلیله و دمنه')
+
+    def test_import(self):
+        """Test rows are imported in batches, duplicates and rows without title skipped"""
+        job = ImportJob.objects.create(file=workbook([
+            ('صد سال تنهایی', 'مارکز', 'بهمن فرزانه', 9789643051234, 'رقعی', 450, 'شومیز'),
+            ('بوف کور', 'صادق هدایت'),
+            ('مردگان', None, None, '9789643112345'),
+            (None, 'بی‌نام'),
+            ('کلیله و دمنه', None, None, None, None, '96'),
+            ('صد سال تنهایی', 'مارکز'),
+        ]), publisher=self.publisher)
+        import_excel(job, batch_size=2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertEqual((job.rows, job.processed, job.created, job.duplicates, job.invalid), (6, 6, 2, 3, 1))
+        self.assertEqual(job.progress, 100)
+        book = Book.objects.get(title='صد سال تنهایی')
+        self.assertEqual(book.isbn, '9789643051234')
+        self.assertEqual(book.pages, 450)
+        self.assertEqual(book.publisher, self.publisher)
+        self.assertEqual(list(book.authors.values_list('name', flat=True)), ['مارکز'])
+        self.assertEqual(Book.objects.get(title='کلیله و دمنه').pages, 96)
+
+    def test_failure(self):
+        """Test a failed import is saved on the job"""
+        job = ImportJob.objects.create(
+            file=SimpleUploadedFile('catalogue.xlsx', b'not a workbook'), publisher=self.publisher,
+        )
+        with self.assertRaises(Exception):
+            import_excel(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.FAILED)
+        self.assertTrue(job.error)
+
+    def test_upload(self):
+        """Test the upload starts a background job and shows its progress"""
+        user = User.objects.create_user('staff', password='password', is_staff=True)
+        self.client.force_login(user)
+        with mock.patch('web.views.import_catalogue.delay') as delay:
+            response = self.client.post(reverse('web:upload_file'), {
+                'file': workbook([('بوف کور',)]), 'publisher': self.publisher.pk,
+            })
+        job = ImportJob.objects.get()
+        delay.assert_called_once_with(job.pk)
+        self.assertRedirects(response, reverse('web:import_job', args=[job.pk]))
+        self.assertEqual(job.user, user)
+        response = self.client.get(reverse('web:import_job', args=[job.pk]))
+        self.assertContains(response, 'Pending')
+        self.assertContains(response, 'http-equiv="refresh"')
@@ -0,0 +1,98 @@
+import os
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.models import BookRawData
+from web.functions import parse_records, translator, record_chunks, parallel_records, read_records, marc_format
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+FIXTURE = os.path.join(FIXTURES, 'records.mrk')
+# The records of FIXTURE in the other formats.
+ISO2709 = os.path.join(FIXTURES, 'records.mrc')
+MARCXML = os.path.join(FIXTURES, 'records.xml')
+
+
+class MarcTest(TestCase):
+    """Test reading MARC text records"""
+
+    def test_parse_records(self):
+        """Test every record is read, the first and the last included"""
+        with open(FIXTURE) as lines:
+            records = list(parse_records(lines))
+        self.assertEqual([record['onvan-padid_avarandeh'] for record in records], [
+            ['بوف کور'], ['صد سال تنهاییگابریل گارسیا مارکز؛ ترجمه بهمن فرزانه'], ['کلیله و دمنه'],
+        ])
+        first = records[0]
+        self.assertEqual(first['ISBN'], ['9789643051234'])
+        self.assertEqual(first['author'], ['صادق هدایت'])
+        self.assertEqual(first['moshakhasat-zaheri'], ['96'])
+        self.assertEqual(first['zaban'], ['Persian '])
+        self.assertEqual(first['yaddasht-koli'], [' کتاب حاضر نخستین بار در سال ۱۳۱۵ منتشر شده است'])
+        self.assertEqual(records[1]['mozo'], [' 1داستانهای کلمبیاییقرن ۲۰م', ' 1داستانهای اسپانیایی'])
+        self.assertEqual(records[1]['tarjome-az'], [' Cien años de soledad'])
+        self.assertEqual(records[2]['zaban'], ['Arabic '])
+
+    def test_streaming(self):
+        """Test records are yielded before the rest of the file is read"""
+        read = []
+
+        def lines():
+            with open(FIXTURE) as file:
+                for line in file:
+                    read.append(line)
+                    yield line
+
+        records = parse_records(lines())
+        next(records)
+        self.assertLess(len(read), 15)
+        self.assertEqual(translator([], print), 0)
+
+    def test_chunks(self):
+        """Test chunks hold whole records and parallel parsing keeps the file order"""
+        with open(FIXTURE, 'rb') as file:
+            data = file.read()
+        for count in (1, 2, 3, 10):
+            chunks = record_chunks(FIXTURE, count)
+            self.assertEqual(chunks[0][0], 0)
+            self.assertEqual(chunks[-1][1], len(data))
+            self.assertTrue(all(data[start:end].startswith(b'=LDR  ') for start, end in chunks))
+        self.assertEqual(len(record_chunks(FIXTURE, 10)), 3)
+        with open(FIXTURE) as lines:
+            self.assertEqual(list(parallel_records(FIXTURE, 2, chunk_size=100)), list(parse_records(lines)))
+
+    def test_formats(self):
+        """Test ISO 2709 and MARCXML files give the records of the MARC text file"""
+        with open(FIXTURE) as lines:
+            records = list(parse_records(lines))
+        self.assertEqual(list(read_records(FIXTURE)), records)
+        self.assertEqual(list(read_records(ISO2709)), records)
+        self.assertEqual(list(read_records(MARCXML)), records)
+        self.assertEqual(marc_format(ISO2709), 'iso2709')
+        self.assertEqual(marc_format(MARCXML), 'marcxml')
+
+        with open(ISO2709, 'rb') as file:
+            data = file.read()
+        chunks = record_chunks(ISO2709, 3, 'iso2709')
+        self.assertEqual(len(chunks), 3)
+        self.assertTrue(all(data[start:end].endswith(b'\x1d') for start, end in chunks))
+        self.assertEqual(list(parallel_records(ISO2709, 2, chunk_size=100)), records)
+        self.assertEqual(list(parallel_records(MARCXML, 2, chunk_size=100)), records)
+
+    def test_import(self):
+        """Test records are written in batches"""
+        out = StringIO()
+        with CaptureQueriesContext(connection) as captured:
+            call_command('import_marc', FIXTURE, '--batch-size', '2', stdout=out)
+        self.assertEqual(len([query for query in captured if query['sql'].startswith('INSERT')]), 2)
+        self.assertIn('Imported 3 records', out.getvalue())
+        self.assertEqual(BookRawData.objects.count(), 3)
+        self.assertEqual(BookRawData.objects.first().data['ISBN'], ['9789643051234'])
+        call_command('import_marc', FIXTURE, '--workers', '2', stdout=out)
+        self.assertEqual(BookRawData.objects.count(), 6)
+        call_command('import_marc', MARCXML, stdout=out)
+        call_command('import_marc', ISO2709, '--format', 'iso2709', stdout=out)
+        self.assertEqual(BookRawData.objects.count(), 12)
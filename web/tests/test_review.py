@@ -0,0 +1,100 @@
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Book, BookRawData
+from book.ingest import CatalogueWriter
+
+
+def raw(title, **data):
+    return {'onvan-padid_avarandeh': [title] if title else [], 'author': ['صادق هدایت'], 'ISBN': ['964'], **data}
+
+
+class ReviewQueueTest(TestCase):
+    """Test the review queue of raw records"""
+
+    def setUp(self):
+        cache.delete(BookRawData.REMAINING_KEY)
+        self.editor = User.objects.create_user('editor', password='password', is_staff=True)
+        self.other = User.objects.create_user('other', password='password', is_staff=True)
+        BookRawData.objects.bulk_create([BookRawData(data=raw(f'کتاب {i}')) for i in range(5)])
+        self.ids = list(BookRawData.objects.order_by('pk').values_list('pk', flat=True))
+
+    def test_claims(self):
+        """Test editors get distinct batches and move through them by id"""
+        self.assertEqual(BookRawData.claim(self.editor, size=2), 2)
+        self.assertEqual(BookRawData.next_for(self.other).pk, self.ids[2])
+        self.assertEqual(BookRawData.next_for(self.editor).pk, self.ids[0])
+        self.assertEqual(BookRawData.next_for(self.editor, self.ids[0]).pk, self.ids[1])
+        # Back to the first after the last.
+        self.assertEqual(BookRawData.next_for(self.editor, self.ids[1]).pk, self.ids[0])
+        self.assertEqual(BookRawData.objects.get(pk=self.ids[1]).previous_for(self.editor).pk, self.ids[0])
+
+        BookRawData.objects.filter(claimed_by=self.editor).update(claimed_until=timezone.now() - BookRawData.CLAIM_TIMEOUT)
+        self.assertEqual(BookRawData.next_for(self.editor).pk, self.ids[0])
+
+    def test_remaining(self):
+        """Test the number of records left is counted once then kept up to date"""
+        self.assertEqual(BookRawData.remaining(), 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(BookRawData.remaining(), 5)
+        BookRawData.reject(self.ids[:2])
+        BookRawData.accept({self.ids[2]: Book.objects.create(title='کتاب 2')})
+        with CatalogueWriter() as writer:
+            writer.add_raw(raw('کتاب 5'))
+        self.assertEqual(BookRawData.remaining(), 3)
+        self.assertEqual(BookRawData.objects.filter(is_active=True).count(), 3)
+        self.assertEqual(BookRawData.objects.get(pk=self.ids[2]).book.title, 'کتاب 2')
+
+    def test_remaining_expires(self):
+        """Test the cached count is counted again, changes of other processes show up"""
+        self.assertEqual(BookRawData.remaining(), 5)
+        # A change the cache of this process didn't see.
+        BookRawData.objects.filter(pk=self.ids[0]).update(is_active=False)
+        self.assertEqual(BookRawData.remaining(), 5)
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=time.time() + BookRawData.REMAINING_TIMEOUT + 1):
+            self.assertEqual(BookRawData.remaining(), 4)
+
+    def test_review(self):
+        """Test accepting and rejecting records one by one"""
+        self.client.force_login(self.editor)
+        response = self.client.get(reverse('web:next_raw_book'))
+        self.assertRedirects(response, reverse('web:create_book_obj_view', args=[self.ids[0]]))
+        response = self.client.get(reverse('web:create_book_obj_view', args=[self.ids[0]]))
+        self.assertContains(response, 'کتاب 0')
+
+        response = self.client.post(reverse('web:create_book_obj_view', args=[self.ids[0]]), {
+            'title': 'کتاب صفر', 'author': 'صادق هدایت', 'translator': '', 'publisher': 'نی',
+        })
+        self.assertRedirects(response, reverse('web:next_raw_book') + f'?after={self.ids[0]}', target_status_code=302)
+        response = self.client.get(response.url)
+        self.assertRedirects(response, reverse('web:create_book_obj_view', args=[self.ids[1]]))
+        record = BookRawData.objects.get(pk=self.ids[0])
+        self.assertFalse(record.is_active)
+        self.assertEqual(record.book.title, 'کتاب صفر')
+
+        self.client.post(reverse('web:reject_raw_book', args=[self.ids[1]]))
+        self.assertFalse(BookRawData.objects.get(pk=self.ids[1]).is_active)
+        # Reviewed records and those of other editors are passed over.
+        response = self.client.get(reverse('web:create_book_obj_view', args=[self.ids[1]]))
+        self.assertRedirects(response, reverse('web:next_raw_book') + f'?after={self.ids[1]}', fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('web:index')).context['count'], 3)
+
+    def test_batch(self):
+        """Test accepting and rejecting a batch at once"""
+        BookRawData.objects.filter(pk=self.ids[4]).update(data=raw(''))
+        self.client.force_login(self.editor)
+        response = self.client.get(reverse('web:review_batch'))
+        self.assertEqual(len(response.context['records']), 5)
+        self.client.post(reverse('web:review_batch'), {'action': 'accept', 'ids': self.ids[:2] + self.ids[4:]})
+        self.client.post(reverse('web:review_batch'), {'action': 'reject', 'ids': self.ids[2:3]})
+        self.assertEqual(list(Book.objects.order_by('title').values_list('title', flat=True)), ['کتاب 0', 'کتاب 1'])
+        self.assertEqual(Book.objects.get(title='کتاب 0').authors.get().name, 'صادق هدایت')
+        # A record without a title is left for an editor.
+        self.assertEqual(list(BookRawData.objects.filter(is_active=True).values_list('pk', flat=True)), self.ids[3:])
+        self.assertEqual(BookRawData.remaining(), 2)
@@ -5,7 +5,11 @@ app_name = 'web'
 
 urlpatterns = [
     path('', views.index, name='index'),
-    path('books/<str:number>/', views.create_book_obj_view, name='create_book_obj_view'),
-    path('upload-excel/', views.upload_file, name='index'),
+    path('books/next/', views.next_raw_book, name='next_raw_book'),
+    path('books/batch/', views.review_batch, name='review_batch'),
+    path('books/<int:number>/', views.create_book_obj_view, name='create_book_obj_view'),
+    path('books/<int:number>/reject/', views.reject_raw_book, name='reject_raw_book'),
+    path('upload-excel/', views.upload_file, name='upload_file'),
+    path('upload-excel/<int:pk>/', views.import_job, name='import_job'),
     path('choose-photos/', views.choose_photos, name='choose_photos'),
 ]
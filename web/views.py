@@ -1,13 +1,13 @@
 import os
-import pandas as pd
 
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.http import HttpResponse
 from django.urls import reverse
 
 from web.forms import *
-from web.functions import translator
-from core.models import BookRawData, Translator, Author, Book, CoverType, Size, Publisher
+from web.functions import translator, raw_book_fields, accept_raw_books
+from web.tasks import import_catalogue
+from core.models import BookRawData, Translator, Author, Book, CoverType, Size, Publisher, ImportJob
 
 
 def upload_file(request):
@@ -18,64 +18,25 @@ def upload_file(request):
     elif request.method == 'POST':
         form = UploadFileForm(request.POST, request.FILES)
         if form.is_valid():
-            form.save()
-            file = request.FILES['file']
-            df = pd.read_excel(file)
-            data = df.to_dict(orient='records')
-            for row in data:
-                name = row.get('Book')
-                if name != None and name != '' and type(name) == str:
-                    name = name.strip()
-                    if Book.objects.filter(title=name).exists():
-                        continue
-                    else:
-                        book = Book.objects.create(title=name)
-
-                author = row.get('Author-Farsi')
-                if author != None and author != '' and type(author) == str:
-                    author = author.strip()
-                    author = Author.objects.get_or_create(name=author)[0]
-                    book.authors.add(author)
-
-                translator = row.get('Translator')
-                if translator != None and translator != '' and type(translator) == str:
-                    translator = translator.strip()
-                    translator = Translator.objects.get_or_create(name=translator)[0]
-                    book.translators.add(translator)
-
-                shabak = row.get('Shabak')
-                if shabak != None and shabak != '' and type(shabak) == str:
-                    shabak = shabak.strip()
-                    book.isbn = shabak
-
-                qte = row.get('QTE')
-                if qte != None and qte != '' and type(qte) == str:
-                    qte = qte.strip()
-                    qte = Size.objects.get_or_create(name=qte)[0]
-                    book.size = qte
-
-                pages = row.get('Pages')
-                if pages != None and pages != '' and type(pages) == int or type(pages) == str:
-                    book.pages = pages
-
-                jeld = row.get('Jeld')
-                if jeld != None and jeld != '' and type(jeld) == str:
-                    jeld = jeld.strip()
-                    jeld = CoverType.objects.get_or_create(name=jeld)[0]
-                    book.cover_type = jeld
-
-                publisher = Publisher.objects.get(name=form.cleaned_data['publisher'])
-                book.publisher = publisher                
-                book.cover = ''
-
-                book.save()
-
-            return HttpResponse('OK')
+            # Large catalogues are imported in the background, see web.excel.import_excel.
+            job = ImportJob.objects.create(
+                file=form.save(), publisher=form.cleaned_data['publisher'], user=request.user,
+            )
+            import_catalogue.delay(job.pk)
+            return redirect(reverse('web:import_job', args=[job.pk]))
     else:
         form = UploadFileForm()
     return render(request, 'web/upload_file.html', {'form': form})
 
 
+def import_job(request, pk):
+    if not request.user.is_staff:
+        return HttpResponse("You are not authorized to upload files")
+
+    job = get_object_or_404(ImportJob, pk=pk)
+    return render(request, 'web/import_job.html', {'job': job})
+
+
 def choose_photos(request):
     if not request.user.is_staff:
         return HttpResponse("You are not authorized to upload files")
@@ -87,69 +48,44 @@ def choose_photos(request):
 def index(request):
     if not request.user.is_staff:
         return redirect(reverse('admin:login'))
-    count = BookRawData.objects.filter(is_active=True).count()
+    count = BookRawData.remaining()
     return render(request, 'web/index.html', {'count': count})
 
 
-def create_book_obj_view(request, number=0):
+def next_raw_book(request):
+    """ The next record of the editor's batch after the `after` record id. """
     if not request.user.is_staff:
         return redirect(reverse('admin:login'))
 
+    after = request.GET.get('after', '')
+    raw_book = BookRawData.next_for(request.user, int(after) if after.isdigit() else 0)
+    if raw_book is None:
+        return redirect(reverse('web:index'))
+    return redirect(reverse('web:create_book_obj_view', args=[raw_book.pk]))
+
+
+def create_book_obj_view(request, number):
+    if not request.user.is_staff:
+        return redirect(reverse('admin:login'))
+
+    # `number` is the id of the record, reviewed records and those of
+    # other editors are passed over.
+    raw_book = BookRawData.objects.filter(pk=number, is_active=True).first()
+    if raw_book is None or raw_book.held_by_other(request.user):
+        return redirect(reverse('web:next_raw_book') + f'?after={number}')
+
     if request.method == 'GET':
         form_book = BookForm()
-        raw_books = BookRawData.objects.filter(is_active=True)
-        if number:
-            raw_book = raw_books[int(number)]
-        data = {}
-
-        data['raw_book'] = raw_book.data.get('RAW', '')
-        try:
-            data['isbn']= int(raw_book.data.get('ISBN', '')[0].strip())
-        except IndexError:
-            data['isbn'] = ''
-        except:
-            data['isbn'] = ''
-        try:
-            data['title']= raw_book.data.get('onvan-padid_avarandeh', '')[0].strip()
-        except:
-            data['title'] = ''
-        
-        data['subtitle']= ''
-        
-        try:
-            data['author']= raw_book.data.get('author', '')[0].strip()
-        except:
-            data['author'] = ''
-        try:
-            data['translator']= raw_book.data.get('translator', '')[0].strip()
-        except:
-            data['translator'] = ''
-        data['publisher']= ''
-        data['pages']= raw_book.data.get('moshakhasat-zaheri', '')
-        try:
-            data['pages'] = int(data['pages'][0].strip())
-        except:
-            data['pages'] = 0
-        try:
-            data['language']= raw_book.data.get('zaban', '')[0].strip()
-        except:
-            data['language'] = ''
+        data = {'raw_book': raw_book.data.get('RAW', '')}
+        data.update(raw_book_fields(raw_book.data))
+        del data['label']
         data['org'] = raw_book.data
-
-        context = {
-            'form_book': form_book,
-            'raw_book': raw_book.data,
-            'data': data,
-            'next': int(number) + 1,
-            'prev': int(number) - 1,
-        }
-        return render(request, 'web/create_book_obj.html', context)
+        return render(request, 'web/create_book_obj.html', review_context(request, raw_book, form_book, data))
 
     elif request.method == 'POST':
         form_book = BookForm(request.POST)
         if form_book.is_valid():
-            raw_book = BookRawData.objects.filter(is_active=True)[int(number)-1]
-            label = ', '.join(raw_book.data['mozo'])
+            label = ', '.join(raw_book.data.get('mozo', []))
             book = Book.objects.create(
                 raw_data=raw_book.data,
                 label=label.strip(),
@@ -164,9 +100,50 @@ def create_book_obj_view(request, number=0):
             book.authors.add(form_book.cleaned_data['author'])
             book.translators.add(form_book.cleaned_data['translator'])
             book.save()
-            raw_book.is_active = False
-            raw_book.save()
-            return redirect(reverse('web:create_book_obj_view', args=[int(number)]))
+            BookRawData.accept({raw_book.pk: book})
+            return redirect(reverse('web:next_raw_book') + f'?after={raw_book.pk}')
         else:
-            return render(request, 'web/create_book_obj.html', {'form_book': form_book, 'next': int(number) + 1, 'prev': int(number) - 1})
-    # return render(request, 'create_book_obj.html', {'raw_book': raw_book})
+            return render(request, 'web/create_book_obj.html', review_context(request, raw_book, form_book, {}))
+
+
+def review_context(request, raw_book, form_book, data):
+    previous = raw_book.previous_for(request.user)
+    return {
+        'form_book': form_book,
+        'raw_book': raw_book.data,
+        'raw_id': raw_book.pk,
+        'data': data,
+        'prev': previous.pk if previous else None,
+        'count': BookRawData.remaining(),
+    }
+
+
+def reject_raw_book(request, number):
+    if not request.user.is_staff:
+        return redirect(reverse('admin:login'))
+
+    if request.method == 'POST':
+        BookRawData.reject([number])
+    return redirect(reverse('web:next_raw_book') + f'?after={number}')
+
+
+def review_batch(request):
+    """ The editor's batch of records at once, to accept or reject many. """
+    if not request.user.is_staff:
+        return redirect(reverse('admin:login'))
+
+    if request.method == 'POST':
+        ids = [int(pk) for pk in request.POST.getlist('ids') if pk.isdigit()]
+        records = BookRawData.claimed(request.user).filter(pk__in=ids)
+        if request.POST.get('action') == 'accept':
+            accept_raw_books(list(records))
+        elif request.POST.get('action') == 'reject':
+            BookRawData.reject(records.values_list('pk', flat=True))
+        return redirect(reverse('web:review_batch'))
+
+    if not BookRawData.claimed(request.user).exists():
+        BookRawData.claim(request.user)
+    records = [
+        (record.pk, raw_book_fields(record.data)) for record in BookRawData.claimed(request.user)
+    ]
+    return render(request, 'web/review_batch.html', {'records': records, 'count': BookRawData.remaining()})